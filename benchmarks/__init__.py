@@ -0,0 +1,118 @@
+"""
+Micro-benchmarks of the plugin's hot paths.
+
+Run the whole suite from the repository root and compare it with stored
+baselines::
+
+    python -m benchmarks
+    python -m benchmarks --save  # after intended changes
+
+or a single module, e.g.::
+
+    python -m benchmarks.bench_convert
+"""
+import json
+import os
+import sys
+import timeit
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+#: Modules providing ``get_benchmarks()``, run by ``python -m benchmarks``
+MODULES = ("bench_convert", "bench_signature", "bench_processor", "bench_import")
+
+
+def setup_django():
+    for path in (ROOT, os.path.join(ROOT, "example")):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    import django
+
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """
+    Run benchmarks against a throw-away test database.
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, number=None, repeat=5):
+    """
+    Return best time of a single ``func()`` call in seconds.
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def calibrate():
+    """
+    Time a fixed pure-Python workload, used to scale baselines recorded
+    on a different machine.
+    """
+    data = {"products": [{"name": f"p{i}", "quantity": i} for i in range(50)]}
+    return measure(
+        lambda: sorted(json.loads(json.dumps(data))["products"], key=str), repeat=20
+    )
+
+
+def load_baselines(path=BASELINES):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baselines(results, calibration, path=BASELINES):
+    with open(path, "w") as f:
+        json.dump(
+            {"calibration": calibration, "results": results},
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+        f.write("\n")
+
+
+def compare(results, calibration, baselines, tolerance=0.5):
+    """
+    Return ``{name: (seconds, expected_seconds)}`` of benchmarks slower than
+    their scaled baseline by more than ``tolerance``. Benchmarks of legacy
+    implementations are kept for reference only and never compared.
+    """
+    scale = calibration / baselines["calibration"]
+    regressions = {}
+    for name, seconds in results.items():
+        baseline = baselines["results"].get(name)
+        if baseline is None or name.endswith("_legacy"):
+            continue
+        expected = baseline * scale
+        if seconds > expected * (1 + tolerance):
+            regressions[name] = (seconds, expected)
+    return regressions
+
+
+def report(results, expected=None):
+    width = max(len(name) for name in results)
+    for name, seconds in results.items():
+        line = f"{name:<{width}}  {seconds * 1e6:12.2f} us"
+        if expected and name in expected:
+            change = seconds / expected[name] - 1
+            line += f"  {change:+8.1%}"
+        print(line)
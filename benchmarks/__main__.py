@@ -0,0 +1,92 @@
+"""
+Run all benchmarks and compare them with ``benchmarks/baselines.json``.
+Exits with status 1 when a benchmark got slower than its baseline.
+"""
+import argparse
+import logging
+import sys
+from importlib import import_module
+
+from . import (
+    MODULES,
+    calibrate,
+    compare,
+    load_baselines,
+    measure,
+    report,
+    save_baselines,
+    setup_django,
+    test_database,
+)
+
+
+def run(pattern=None):
+    results = {}
+    with test_database():
+        for module_name in MODULES:
+            module = import_module(f"{__package__}.{module_name}")
+            for name, func in module.get_benchmarks().items():
+                if pattern is None or pattern in name:
+                    results[name] = measure(func)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "-k", dest="pattern", help="Run only benchmarks with names containing it."
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="Store results as new baselines."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed slowdown against baselines (default: 0.5).",
+    )
+    args = parser.parse_args(argv)
+
+    setup_django()
+    logging.disable(logging.CRITICAL)
+    calibration = calibrate()
+    results = run(args.pattern)
+    # machine might have been busy at start, keep the quieter measurement
+    calibration = min(calibration, calibrate())
+
+    if args.save:
+        baselines = load_baselines() or {"results": {}}
+        calibration_scale = calibration / baselines.get("calibration", calibration)
+        stored = {
+            name: seconds / calibration_scale
+            for name, seconds in baselines["results"].items()
+        }
+        stored.update(results)
+        save_baselines(stored, calibration)
+        report(results)
+        return 0
+
+    baselines = load_baselines()
+    if baselines is None:
+        report(results)
+        print("No baselines stored, run with --save first.")
+        return 0
+
+    scale = calibration / baselines["calibration"]
+    expected = {
+        name: baselines["results"][name] * scale
+        for name in results
+        if name in baselines["results"]
+    }
+    report(results, expected)
+    regressions = compare(results, calibration, baselines, args.tolerance)
+    for name, (seconds, expected_seconds) in regressions.items():
+        print(
+            f"REGRESSION {name}: {seconds * 1e6:.2f} us, "
+            f"expected at most {expected_seconds * (1 + args.tolerance) * 1e6:.2f} us"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Amount conversion: :meth:`Client._centify` / :meth:`Client._normalize` against
+the previous implementation that deep-copied data at every recursion level.
+"""
+import json
+from copy import deepcopy
+from decimal import Decimal
+
+from . import measure, report, setup_django
+
+CONVERTABLES = {"amount", "total", "available", "unitPrice", "totalAmount"}
+
+
+def legacy_centify(data):
+    data = deepcopy(data)
+    if hasattr(data, "items"):
+        return {
+            k: str(int(v * 100)) if k in CONVERTABLES else legacy_centify(v)
+            for k, v in data.items()
+        }
+    elif isinstance(data, list):
+        return [legacy_centify(v) for v in data]
+    return data
+
+
+def legacy_normalize(data):
+    data = deepcopy(data)
+    if hasattr(data, "items"):
+        return {
+            k: Decimal(v) / 100 if k in CONVERTABLES else legacy_normalize(v)
+            for k, v in data.items()
+        }
+    elif isinstance(data, list):
+        return [legacy_normalize(v) for v in data]
+    return data
+
+
+def make_order(products=200):
+    return {
+        "extOrderId": "a1b2c3",
+        "customerIp": "127.0.0.1",
+        "merchantPosId": "300746",
+        "description": "Large order",
+        "currencyCode": "PLN",
+        "totalAmount": Decimal("1234.56"),
+        "buyer": {
+            "email": "john.doe@example.com",
+            "delivery": {"street": "Main", "city": "Warsaw", "postalCode": "00-001"},
+        },
+        "products": [
+            {
+                "name": f"Product {i}",
+                "unitPrice": Decimal("12.34"),
+                "quantity": 1,
+                "virtual": False,
+            }
+            for i in range(products)
+        ],
+    }
+
+
+def make_order_info(orders=20, products=20):
+    return {
+        "orders": [
+            {
+                "orderId": f"WZHF5FFDRJ140731GUEST{i:06d}",
+                "extOrderId": str(i),
+                "status": "COMPLETED",
+                "currencyCode": "PLN",
+                "totalAmount": "123456",
+                "buyer": {"email": "john.doe@example.com", "language": "pl"},
+                "products": [
+                    {"name": f"Product {j}", "unitPrice": "1234", "quantity": "1"}
+                    for j in range(products)
+                ],
+            }
+            for i in range(orders)
+        ],
+        "status": {"statusCode": "SUCCESS", "statusDesc": "Request processing"},
+    }
+
+
+def get_benchmarks():
+    setup_django()
+    from getpaid_payu.base import ApiRequest, BaseClient
+
+    order = make_order()
+    order_info = make_order_info()
+    encoded_info = json.dumps(order_info).encode()
+    client = BaseClient("https://example.com/", 1, "key", 1, "secret")
+    request = ApiRequest("GET", "/", Exception, "")
+
+    assert BaseClient._centify(order) == legacy_centify(order)
+    assert BaseClient._normalize(order_info) == legacy_normalize(order_info)
+
+    return {
+        "centify_order_legacy": lambda: legacy_centify(order),
+        "centify_order": lambda: BaseClient._centify(order),
+        "normalize_order_info_legacy": lambda: legacy_normalize(
+            json.loads(encoded_info)
+        ),
+        "normalize_order_info": lambda: BaseClient._normalize(json.loads(encoded_info)),
+        "decode_order_info": lambda: client._decode(request, encoded_info),
+    }
+
+
+def main():
+    report({name: measure(func) for name, func in get_benchmarks().items()})
+
+
+if __name__ == "__main__":
+    main()
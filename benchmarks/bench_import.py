@@ -0,0 +1,44 @@
+"""
+Import of the processor, which ``django.setup()`` does for every process:
+it should not pull in the HTTP stack. Plugin modules are imported afresh on
+every call and the loaded ones are put back afterwards.
+"""
+import sys
+from importlib import import_module
+
+from . import measure, report, setup_django
+
+PACKAGE = "getpaid_payu"
+#: Registered with Django, importing it again would register models twice
+KEEP = {"getpaid_payu.models"}
+
+
+def plugin_modules():
+    return [
+        name
+        for name in sys.modules
+        if (name == PACKAGE or name.startswith(f"{PACKAGE}.")) and name not in KEEP
+    ]
+
+
+def fresh_import(name: str):
+    loaded = {module: sys.modules.pop(module) for module in plugin_modules()}
+    try:
+        import_module(name)
+    finally:
+        for module in plugin_modules():
+            del sys.modules[module]
+        sys.modules.update(loaded)
+
+
+def get_benchmarks():
+    setup_django()
+    return {"import_processor": lambda: fresh_import(f"{PACKAGE}.processor")}
+
+
+def main():
+    report({name: measure(func) for name, func in get_benchmarks().items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Processor and client paths run for every payment: building ``new_order``
+payloads, paywall context, POST form signing, callback handling and
+OAuth token refresh. PayU API is replaced by ``requests_mock``, so no network
+access is needed. Requires a database (see :func:`benchmarks.test_database`).
+"""
+import json
+import uuid
+
+from . import measure, report, setup_django, test_database
+
+SECOND_KEY = "b6ca15b0d1020e8094d9b5f8d163db54"
+API_URL = "https://secure.snd.payu.com/"
+
+
+def mocked_session():
+    import requests
+    import requests_mock
+
+    adapter = requests_mock.Adapter()
+    adapter.register_uri(
+        "POST",
+        f"{API_URL}pl/standard/user/oauth/authorize",
+        json={
+            "access_token": "7524f96e-2d22-45da-bc64-778a61cbfc26",
+            "token_type": "bearer",
+            "expires_in": 43199,
+            "grant_type": "client_credentials",
+        },
+    )
+    adapter.register_uri(
+        "POST",
+        f"{API_URL}api/v2_1/orders",
+        json={
+            "status": {"statusCode": "SUCCESS"},
+            "redirectUri": "https://paywall.example.com/url",
+            "orderId": "WZHF5FFDRJ140731GUEST000P01",
+            "extOrderId": "a1b2c3",
+        },
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+def signed_callback(rf, data):
+    import hashlib
+
+    from django.urls import reverse
+
+    encoded = json.dumps(data)
+    signature = hashlib.md5(f"{encoded}{SECOND_KEY}".encode()).hexdigest()
+    return rf.post(
+        reverse("getpaid:payu:callback"),
+        content_type="application/json",
+        data=encoded,
+        HTTP_OPENPAYU_SIGNATURE=f"sender=checkout;signature={signature};algorithm=MD5",
+    )
+
+
+def get_benchmarks():
+    setup_django()
+    from django.db import transaction
+    from django.test import RequestFactory
+
+    from getpaid_payu.client import Client
+    from getpaid_payu.tokens import LocalTokenStore
+    from getpaid_payu.views import CallbackView
+    from tests.factories import PaymentFactory
+
+    rf = RequestFactory()
+    payment = PaymentFactory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    payment.save()
+    processor = payment.processor
+    context = processor.get_paywall_context(request=rf.get("/"))
+    form_data = {
+        "customerIp": "127.0.0.1",
+        "merchantPosId": "300746",
+        "extOrderId": payment.get_unique_id(),
+        "description": payment.description,
+        "totalAmount": "12345",
+        "currencyCode": "PLN",
+        "continueUrl": "https://example.com/continue/",
+        "notifyUrl": "https://example.com/payments/payu/callback/",
+        "buyer.email": "john.doe@example.com",
+        "buyer.language": "pl",
+    }
+    for i in range(10):
+        form_data[f"products[{i}].name"] = f"Product {i}"
+        form_data[f"products[{i}].unitPrice"] = "1234"
+        form_data[f"products[{i}].quantity"] = "1"
+    client = Client(
+        api_url=API_URL,
+        pos_id=300746,
+        second_key=SECOND_KEY,
+        oauth_id=300746,
+        oauth_secret="2ee86a66e5d97e3fadc400c9f19b065d",
+        token_store=LocalTokenStore(),
+        session=mocked_session(),
+    )
+    callback = signed_callback(
+        rf, {"order": {"extOrderId": payment.get_unique_id(), "status": "CANCELED"}}
+    )
+    view = CallbackView.as_view()
+
+    def handle_callback():
+        with transaction.atomic():
+            assert view(callback).status_code == 200
+            transaction.set_rollback(True)
+
+    def refresh_token():
+        client._token = None
+        client.token_store.clear()
+        client._get_token()
+
+    return {
+        "new_order_request": lambda: client._new_order_request(**context),
+        "new_order": lambda: client.new_order(**context),
+        "get_paywall_context": lambda: processor.get_paywall_context(
+            request=rf.get("/")
+        ),
+        "prepare_form_data": lambda: processor.prepare_form_data(dict(form_data)),
+        "handle_callback": handle_callback,
+        "token_refresh": refresh_token,
+        "token_cached": client._get_token,
+    }
+
+
+def main():
+    setup_django()
+    with test_database():
+        report({name: measure(func) for name, func in get_benchmarks().items()})
+
+
+if __name__ == "__main__":
+    main()
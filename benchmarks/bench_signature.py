@@ -0,0 +1,92 @@
+"""
+Notification signature verification: :class:`SignatureVerifier` against
+the previous implementation that decoded the body, re-encoded it with the key
+and looked the hash up on every call.
+"""
+import hashlib
+import json
+
+from . import measure, report, setup_django
+
+SECOND_KEY = "b6ca15b0d1020e8094d9b5f8d163db54"
+
+
+def legacy_check_signature(body: bytes, header: str, second_key: str) -> bool:
+    payu_header = {k: v for k, v in [i.split("=") for i in header.split(";")]}
+    algo_name = payu_header.get("algorithm", "MD5")
+    signature = payu_header.get("signature")
+    algorithm = getattr(hashlib, algo_name.replace("-", "").lower())
+    expected = algorithm(f"{body.decode('utf-8')}{second_key}".encode("utf-8"))
+    return expected.hexdigest() == signature
+
+
+def make_notification(products: int) -> bytes:
+    return json.dumps(
+        {
+            "order": {
+                "orderId": "LDLW5N7MF4140324GUEST000P01",
+                "extOrderId": "a1b2c3",
+                "orderCreateDate": "2012-12-31T12:00:00",
+                "notifyUrl": "http://tempuri.org/notify",
+                "customerIp": "127.0.0.1",
+                "merchantPosId": "300746",
+                "description": "My order description",
+                "currencyCode": "PLN",
+                "totalAmount": "200",
+                "buyer": {
+                    "email": "john.doe@example.org",
+                    "phone": "111111111",
+                    "firstName": "John",
+                    "lastName": "Doe",
+                    "language": "pl",
+                },
+                "payMethod": {"type": "PBL"},
+                "products": [
+                    {"name": f"Product {i}", "unitPrice": "200", "quantity": "1"}
+                    for i in range(products)
+                ],
+                "status": "COMPLETED",
+            },
+            "localReceiptDateTime": "2016-03-02T12:58:14.828+01:00",
+            "properties": [{"name": "PAYMENT_ID", "value": "151471228"}],
+        }
+    ).encode()
+
+
+def sign(body: bytes, algorithm: str) -> str:
+    hasher = hashlib.new(algorithm.replace("-", "").lower(), body + SECOND_KEY.encode())
+    return (
+        f"sender=checkout;signature={hasher.hexdigest()};"
+        f"algorithm={algorithm};content=DOCUMENT"
+    )
+
+
+def get_benchmarks():
+    setup_django()
+    from getpaid_payu.signature import get_verifier
+
+    verifier = get_verifier(SECOND_KEY, 300746)
+    benchmarks = {}
+    # ~1 kB typical notification, ~10 kB and ~100 kB for large baskets
+    for products in (1, 150, 1500):
+        body = make_notification(products)
+        for algorithm in ("MD5", "SHA-256"):
+            header = sign(body, algorithm)
+            assert legacy_check_signature(body, header, SECOND_KEY)
+            assert verifier.verify(body, header)
+            name = f"{algorithm}_{len(body) / 1024:.0f}kB"
+            benchmarks[
+                f"verify_{name}_legacy"
+            ] = lambda b=body, h=header: legacy_check_signature(b, h, SECOND_KEY)
+            benchmarks[f"verify_{name}"] = lambda b=body, h=header: verifier.verify(
+                b, h
+            )
+    return benchmarks
+
+
+def main():
+    report({name: measure(func) for name, func in get_benchmarks().items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,13 @@
-from .processor import PaymentProcessor  # noqa
-
 default_app_config = "getpaid_payu.apps.GetpaidPayUAppConfig"
 
 __version__ = "0.2.1"
+
+
+def __getattr__(name):
+    # Importing the package stays cheap, e.g. for the simulator or tools
+    # using only types; the processor is loaded on first use.
+    if name == "PaymentProcessor":
+        from .processor import PaymentProcessor
+
+        return PaymentProcessor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,8 +5,17 @@ from django.utils.translation import gettext_lazy as _
 class GetpaidPayUAppConfig(AppConfig):
     name = "getpaid_payu"
     verbose_name = _("PayU")
+    default_auto_field = "django.db.models.AutoField"
 
     def ready(self):
         from getpaid.registry import registry
 
+        from . import processor  # noqa: F401, registry looks it up on the module
+
         registry.register(self.module)
+
+        processor_class = registry[self.name]
+        if processor_class.get_backend_setting("warm_up", False):
+            from .warmup import start_warm_up
+
+            start_warm_up(processor_class)
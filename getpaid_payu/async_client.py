@@ -0,0 +1,291 @@
+"""
+Asyncio flavour of :class:`~getpaid_payu.client.Client` for ASGI deployments.
+
+Requires ``httpx`` (``pip install django-getpaid-payu[async]``).
+"""
+import asyncio
+import logging
+import time
+import weakref
+from decimal import Decimal
+from typing import Hashable, List, Optional, Sequence, Tuple, Union
+
+from getpaid.exceptions import GetPaidException
+
+from .base import ApiRequest, ApiResponse, BaseClient
+from .instrumentation import CallInfo, Instrumentation
+from .resilience import CircuitBreaker, RetryPolicy
+from .sessions import get_async_session
+from .tokens import BaseTokenStore, Token
+from .types import (
+    BuyerData,
+    CancellationResponse,
+    ChargeResponse,
+    Currency,
+    OrderTransactionsResponse,
+    PaymentResponse,
+    PaymethodsResponse,
+    ProductData,
+    RefundResponse,
+    RefundsResponse,
+    RetrieveOrderInfoResponse,
+)
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+_refresh_locks = weakref.WeakKeyDictionary()
+
+
+def _get_refresh_lock(key: Hashable) -> asyncio.Lock:
+    locks = _refresh_locks.setdefault(asyncio.get_running_loop(), {})
+    if key not in locks:
+        locks[key] = asyncio.Lock()
+    return locks[key]
+
+
+class AsyncClient(BaseClient):
+    """
+    Same API as :class:`~getpaid_payu.client.Client`, with coroutine methods.
+
+    Tokens are shared with sync clients through the token store. Within an
+    event loop concurrent coroutines wait for a single token refresh, which
+    also takes the store's refresh lock, so with a shared store only one
+    process refreshes at a time. Token store calls may block, so they run in
+    the loop's default executor. The client holds no connections and can be
+    shared between event loops, each of which gets its own pool.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        pos_id: int,
+        second_key: str,
+        oauth_id: int,
+        oauth_secret: str,
+        token_store: Optional[BaseTokenStore] = None,
+        session: Optional["httpx.AsyncClient"] = None,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        pool_size: Optional[int] = None,
+        instruments: Optional[Sequence[Instrumentation]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        token_refresh_fraction: Optional[float] = None,
+    ):
+        if httpx is None:
+            raise ImportError(
+                "AsyncClient requires httpx: pip install django-getpaid-payu[async]"
+            )
+        super().__init__(
+            api_url=api_url,
+            pos_id=pos_id,
+            second_key=second_key,
+            oauth_id=oauth_id,
+            oauth_secret=oauth_secret,
+            token_store=token_store,
+            timeout=timeout,
+            pool_size=pool_size,
+            instruments=instruments,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
+            token_refresh_fraction=token_refresh_fraction,
+        )
+        self._session = session
+
+    @property
+    def session(self) -> "httpx.AsyncClient":
+        if self._session is not None:
+            return self._session
+        return get_async_session(self.pool_size)
+
+    def _httpx_timeout(self) -> "httpx.Timeout":
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            return httpx.Timeout(read, connect=connect)
+        return httpx.Timeout(self.timeout)
+
+    async def _get_token(self, call: Optional[CallInfo] = None) -> Token:
+        token = self._token
+        if token is not None and not token.is_expiring():
+            self.token_store.record("hit")
+            return token
+        loop = asyncio.get_running_loop()
+        async with _get_refresh_lock(self._token_key):
+            return await loop.run_in_executor(None, self._shared_token, loop, call)
+
+    def _shared_token(
+        self, loop: asyncio.AbstractEventLoop, call: Optional[CallInfo]
+    ) -> Token:
+        """
+        Return the stored token, refreshing it under the store's refresh lock.
+        Runs in an executor thread; the authorization request is sent on
+        ``loop``, which is not blocked meanwhile.
+        """
+        token = self._cached_token()
+        if token is None:
+            with self.token_store.refresh_lock(self._token_key):
+                token = self.token_store.get(self._token_key)
+                if token is None or token.is_expiring():
+                    authorization = asyncio.run_coroutine_threadsafe(
+                        self._call(self._authorize_request()), loop
+                    )
+                    token = self._store_token(authorization.result())
+                    if call is not None:
+                        call.token_refresh = True
+                self._token = token
+        return token
+
+    async def _call(self, request: ApiRequest) -> ApiResponse:
+        call = self._start_call(request)
+        start = time.perf_counter()
+        try:
+            self._enter_circuit(request)
+            try:
+                return await self._send(request, call)
+            finally:
+                self._exit_circuit(call.status_code)
+        finally:
+            self._finish_call(call, start)
+
+    async def _send(self, request: ApiRequest, call: CallInfo) -> ApiResponse:
+        attempt = 0
+        reauthorized = False
+        while True:
+            headers = dict(request.headers or {})
+            token = None
+            if request.auth:
+                token = await self._get_token(call)
+                headers["Authorization"] = token.value
+            response = exception = call.status_code = None
+            sent = time.perf_counter()
+            try:
+                response = await self.session.request(
+                    request.method,
+                    request.url,
+                    headers=headers,
+                    content=request.body,
+                    data=request.form,
+                    follow_redirects=request.follow_redirects,
+                    timeout=self._httpx_timeout(),
+                )
+            except httpx.HTTPError as e:
+                exception = e
+            elapsed = time.perf_counter() - sent
+            if response is not None:
+                call.status_code = response.status_code
+
+            if token is not None and call.status_code == 401 and not reauthorized:
+                self._invalidate_token(token)
+                reauthorized = True
+                call.retries += 1
+                continue
+            connected = not isinstance(
+                exception, (httpx.ConnectError, httpx.ConnectTimeout)
+            )
+            if self._is_ambiguous(request, response, connected):
+                effect = await self._look_up(request, exception)
+                if effect is not None:
+                    return effect
+            delay = self._retry_delay(request, attempt, response)
+            if delay is None:
+                break
+            attempt += 1
+            call.retries += 1
+            await asyncio.sleep(delay)
+
+        if exception is not None:
+            raise request.failure(
+                request.message, context={"raw_response": None, "exception": exception},
+            )
+        return self._response(request, response, elapsed)
+
+    async def _look_up(
+        self, request: ApiRequest, exception: Optional[Exception]
+    ) -> Optional[ApiResponse]:
+        """
+        See :meth:`Client._look_up`.
+        """
+        try:
+            return self._effect_response(await self._call(request.lookup))
+        except GetPaidException as e:
+            raise self._unknown_outcome(request, exception or e) from e
+
+    async def new_order(
+        self,
+        amount: Union[Decimal, float],
+        currency: Currency,
+        order_id: Union[str, int],
+        description: Optional[str] = None,
+        customer_ip: Optional[str] = None,
+        buyer: Optional[BuyerData] = None,
+        products: Optional[List[ProductData]] = None,
+        notify_url: Optional[str] = None,
+        continue_url: Optional[str] = None,
+        **kwargs,
+    ) -> PaymentResponse:
+        """
+        Register new Order within API. See :meth:`Client.new_order`.
+        """
+        return await self._call(
+            self._new_order_request(
+                amount=amount,
+                currency=currency,
+                order_id=order_id,
+                description=description,
+                customer_ip=customer_ip,
+                buyer=buyer,
+                products=products,
+                notify_url=notify_url,
+                continue_url=continue_url,
+                **kwargs,
+            )
+        )
+
+    async def refund(
+        self,
+        order_id: str,
+        amount: Optional[Union[Decimal, float]] = None,
+        description: Optional[str] = None,
+        ext_refund_id: Optional[str] = None,
+        **kwargs,
+    ) -> RefundResponse:
+        return await self._call(
+            self._refund_request(
+                order_id,
+                amount=amount,
+                description=description,
+                ext_refund_id=ext_refund_id,
+                **kwargs,
+            )
+        )
+
+    async def get_refunds(self, order_id: str, **kwargs) -> RefundsResponse:
+        return await self._call(self._refunds_request(order_id, **kwargs))
+
+    async def cancel_order(self, order_id: str, **kwargs) -> CancellationResponse:
+        return await self._call(self._cancel_order_request(order_id, **kwargs))
+
+    async def capture(self, order_id: str, **kwargs) -> ChargeResponse:
+        return await self._call(self._capture_request(order_id, **kwargs))
+
+    async def get_order_info(
+        self, order_id: str, **kwargs
+    ) -> RetrieveOrderInfoResponse:
+        return await self._call(self._order_info_request(order_id, **kwargs))
+
+    async def get_order_transactions(
+        self, order_id: str, **kwargs
+    ) -> OrderTransactionsResponse:
+        return await self._call(self._order_transactions_request(order_id, **kwargs))
+
+    async def get_shop_info(self, shop_id: str, **kwargs):
+        return await self._call(self._shop_info_request(shop_id, **kwargs))
+
+    async def get_paymethods(
+        self, lang: Optional[str] = None, **kwargs
+    ) -> PaymethodsResponse:
+        return await self._call(self._paymethods_request(lang, **kwargs))
@@ -0,0 +1,547 @@
+"""
+Transport-independent part of PayU clients.
+
+Both :class:`~getpaid_payu.client.Client` and
+:class:`~getpaid_payu.async_client.AsyncClient` describe API calls with
+:class:`ApiRequest` built here, and differ only in how they are sent.
+"""
+import json
+import logging
+import sys
+import time
+from decimal import Decimal
+from typing import (
+    AbstractSet,
+    Any,
+    Callable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+from urllib.parse import urlencode, urljoin
+
+from django.core.serializers.json import DjangoJSONEncoder
+from getpaid.exceptions import (
+    ChargeFailure,
+    CommunicationError,
+    CredentialsError,
+    GetPaidException,
+    LockFailure,
+    RefundFailure,
+)
+from getpaid.types import ItemInfo
+
+from .instrumentation import CallInfo, Instrumentation
+from .resilience import CircuitBreaker, CircuitOpenError, OutcomeUnknown, RetryPolicy
+from .sessions import DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+from .tokens import DEFAULT_REFRESH_FRACTION, BaseTokenStore, Token, default_token_store
+from .types import BuyerData, Currency, OrderStatus, ProductData, ResponseStatus
+
+logger = logging.getLogger(__name__)
+
+
+def to_cents(value: Union[Decimal, int, float]) -> str:
+    return str(int(value * 100))
+
+
+def from_cents(value: Union[str, int]) -> Decimal:
+    return Decimal(value) / 100
+
+
+def convert_amounts(data: Any, keys: AbstractSet[str], convert: Callable) -> Any:
+    """
+    Return ``data`` with ``convert`` applied to values of given keys at any depth.
+
+    New dicts and lists are built while traversing, so input is never modified
+    and nothing is copied more than once. Other values are shared.
+    """
+    if type(data) is dict or hasattr(data, "items"):
+        return {
+            k: convert(v) if k in keys else convert_amounts(v, keys, convert)
+            for k, v in data.items()
+        }
+    elif isinstance(data, list):
+        return [convert_amounts(v, keys, convert) for v in data]
+    return data
+
+
+class ApiRequest(NamedTuple):
+    method: str
+    url: str
+    failure: Type[GetPaidException]  #: Raised on connection error or bad status
+    message: str  #: Message of raised exception
+    ok_statuses: Tuple[int, ...] = (200,)
+    headers: Optional[dict] = None
+    body: Optional[str] = None  #: Encoded JSON payload
+    form: Optional[dict] = None  #: Form-encoded payload
+    auth: bool = True  #: Whether to send ``Authorization`` header
+    follow_redirects: bool = True
+    normalize: bool = True  #: Whether to convert amounts in response
+    endpoint: str = ""  #: Name of the operation reported to instrumentation
+    idempotent: bool = False  #: Whether failed attempts may be simply repeated
+    #: Request telling whether a failed attempt took effect, which makes
+    #: retrying non-idempotent requests safe
+    lookup: Optional["ApiRequest"] = None
+
+
+class ApiResponse(dict):
+    """
+    Decoded body of API response, with amounts already normalized.
+    Each call returns its own instance, so clients can be shared safely.
+    """
+
+    def __init__(
+        self,
+        body: dict,
+        status_code: int,
+        headers: Mapping[str, str],
+        elapsed: float,
+        raw: Any = None,
+    ):
+        super().__init__(body)
+        self.status_code = status_code
+        self.headers = headers
+        self.elapsed = elapsed  #: Duration of the request in seconds
+        self.raw = raw  #: Response object of the underlying HTTP library
+
+    def __repr__(self):
+        return f"<ApiResponse {self.status_code} {dict.__repr__(self)}>"
+
+
+class BaseClient:
+    _convertables = {
+        "amount",
+        "total",
+        "available",
+        "unitPrice",
+        "totalAmount",
+        "minAmount",
+        "maxAmount",
+    }
+
+    def __init__(
+        self,
+        api_url: str,
+        pos_id: int,
+        second_key: str,
+        oauth_id: int,
+        oauth_secret: str,
+        token_store: Optional[BaseTokenStore] = None,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        pool_size: Optional[int] = None,
+        instruments: Optional[Sequence[Instrumentation]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        token_refresh_fraction: Optional[float] = None,
+    ):
+        self.api_url = api_url
+        self.pos_id = pos_id
+        self.second_key = second_key
+        self.oauth_id = oauth_id
+        self.oauth_secret = oauth_secret
+        if token_store is None:
+            token_store = default_token_store
+        self.token_store = token_store
+        self._token_key = (api_url, oauth_id)
+        self._token = None
+        self.token_refresh_fraction = token_refresh_fraction or DEFAULT_REFRESH_FRACTION
+        self.timeout = timeout if timeout is not None else DEFAULT_TIMEOUT
+        self.pool_size = pool_size or DEFAULT_POOL_SIZE
+        self.instruments = list(instruments or ())
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+
+    def _cached_token(self) -> Optional[Token]:
+        """
+        Return a token that is still valid without refreshing it, if possible.
+        """
+        token = self._token
+        if token is not None and not token.is_expiring():
+            self.token_store.record("hit")
+            return token
+        token = self.token_store.get(self._token_key)
+        if token is None or token.is_expiring():
+            self.token_store.record("miss")
+            return None
+        self.token_store.record("hit")
+        self._token = token
+        return token
+
+    def _store_token(self, data: dict) -> Token:
+        token = Token.create(
+            value=f"{data['token_type'].capitalize()} {data['access_token']}",
+            expires_in=int(data["expires_in"]),
+            refresh_fraction=self.token_refresh_fraction,
+        )
+        self.token_store.set(self._token_key, token)
+        self.token_store.record("refresh")
+        self._token = token
+        return token
+
+    def _invalidate_token(self, token: Token) -> None:
+        """
+        Forget a token rejected by PayU, unless it was replaced meanwhile.
+        """
+        if self._token == token:
+            self._token = None
+        stored = self.token_store.get(self._token_key)
+        if stored is not None and stored.value == token.value:
+            self.token_store.delete(self._token_key)
+
+    def _enter_circuit(self, request: ApiRequest) -> None:
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            raise request.failure(
+                request.message,
+                context={
+                    "raw_response": None,
+                    "exception": CircuitOpenError("PayU API is unavailable"),
+                },
+            )
+
+    def _exit_circuit(self, status_code: Optional[int]) -> None:
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(status_code is not None and status_code < 500)
+
+    def _retry_delay(
+        self, request: ApiRequest, attempt: int, response: Any
+    ) -> Optional[float]:
+        """
+        Return seconds to wait before repeating failed ``attempt`` (counted
+        from 0), or ``None`` if it must not be repeated. ``response`` is
+        ``None`` after a connection error.
+
+        Ambiguous failures of requests with a ``lookup`` are checked with it
+        before that.
+        """
+        policy = self.retry_policy
+        if policy is None or attempt >= policy.retries:
+            return None
+        if not request.idempotent and request.lookup is None:
+            return None
+        status_code = response.status_code if response is not None else None
+        if status_code in request.ok_statuses or not policy.is_transient(status_code):
+            return None
+        retry_after = (
+            response.headers.get("Retry-After") if response is not None else None
+        )
+        return policy.delay(attempt, retry_after)
+
+    @staticmethod
+    def _is_ambiguous(request: ApiRequest, response: Any, connected: bool) -> bool:
+        """
+        Tell whether a failed attempt of a request with a ``lookup`` may have
+        been carried out anyway, i.e. it timed out after connecting or PayU
+        failed to answer.
+        """
+        return (
+            request.lookup is not None
+            and connected
+            and (response is None or response.status_code >= 500)
+        )
+
+    @staticmethod
+    def _unknown_outcome(request: ApiRequest, exception: Exception) -> OutcomeUnknown:
+        return OutcomeUnknown(
+            f"{request.message}: outcome unknown",
+            context={"raw_response": None, "exception": exception},
+        )
+
+    @staticmethod
+    def _effect_response(lookup: ApiResponse) -> Optional[ApiResponse]:
+        """
+        Build response of order creation from the order found by its lookup,
+        or return ``None`` if there is no such order.
+        """
+        orders = lookup.get("orders") if lookup.status_code == 200 else None
+        if not orders:
+            return None
+        order = orders[0]
+        body = {
+            "status": {"statusCode": ResponseStatus.SUCCESS},
+            "orderId": order.get("orderId", ""),
+            "extOrderId": order.get("extOrderId", ""),
+        }
+        if order.get("redirectUri"):
+            body["redirectUri"] = order["redirectUri"]
+        return ApiResponse(
+            body,
+            status_code=lookup.status_code,
+            headers=lookup.headers,
+            elapsed=lookup.elapsed,
+            raw=lookup.raw,
+        )
+
+    def _start_call(self, request: ApiRequest) -> CallInfo:
+        call = CallInfo(request.endpoint, request.method, request.url)
+        for instrument in self.instruments:
+            try:
+                instrument.before_request(call)
+            except Exception:
+                logger.exception(f"Instrumentation {instrument!r} failed")
+        return call
+
+    def _finish_call(self, call: CallInfo, start: float) -> None:
+        call.duration = time.perf_counter() - start
+        call.exception = call.exception or sys.exc_info()[1]
+        for instrument in self.instruments:
+            try:
+                instrument.after_request(call)
+            except Exception:
+                logger.exception(f"Instrumentation {instrument!r} failed")
+
+    def _headers(self, **kwargs) -> dict:
+        data = {"Content-Type": "application/json"}
+        data.update(kwargs)
+        return data
+
+    @classmethod
+    def _centify(cls, data: Union[ItemInfo, dict, list, Decimal, int, float, str]):
+        """
+        Traverse through given object and convert all values of 'amount'
+        fields and all keys to PayU format.
+        :param data: Converted data
+        """
+        return convert_amounts(data, cls._convertables, to_cents)
+
+    @classmethod
+    def _normalize(cls, data: Union[ItemInfo, dict, list, Decimal, int, float, str]):
+        """
+        Traverse through given object and convert all values of 'amount'
+        fields to normal and all PayU-specific keys to standard ones.
+        :param data: Converted data
+        """
+        return convert_amounts(data, cls._convertables, from_cents)
+
+    @classmethod
+    def _normalize_object(cls, obj: dict) -> dict:
+        """
+        JSON ``object_hook`` doing the job of :meth:`_normalize` while the
+        response is being decoded, sparing another pass over it.
+        """
+        for key in cls._convertables.intersection(obj):
+            obj[key] = from_cents(obj[key])
+        return obj
+
+    # Request builders
+
+    def _authorize_request(self) -> ApiRequest:
+        return ApiRequest(
+            endpoint="authorize",
+            method="POST",
+            url=urljoin(self.api_url, "/pl/standard/user/oauth/authorize"),
+            failure=CredentialsError,
+            message="Cannot authenticate.",
+            form={
+                "grant_type": "client_credentials",
+                "client_id": self.oauth_id,
+                "client_secret": self.oauth_secret,
+            },
+            auth=False,
+            normalize=False,
+            idempotent=True,
+        )
+
+    def _new_order_request(
+        self,
+        amount: Union[Decimal, float],
+        currency: Currency,
+        order_id: Union[str, int],
+        description: Optional[str] = None,
+        customer_ip: Optional[str] = None,
+        buyer: Optional[BuyerData] = None,
+        products: Optional[List[ProductData]] = None,
+        notify_url: Optional[str] = None,
+        continue_url: Optional[str] = None,
+        **kwargs,
+    ) -> ApiRequest:
+        data = self._centify(
+            {
+                "extOrderId": order_id,
+                "customerIp": customer_ip if customer_ip else "127.0.0.1",
+                "merchantPosId": str(self.pos_id),
+                "description": description if description else "Payment order",
+                "currencyCode": currency.upper(),
+                "totalAmount": amount,
+                "products": products
+                if products
+                else [{"name": "Total order", "unitPrice": amount, "quantity": 1}],
+            }
+        )
+
+        if notify_url:
+            data["notifyUrl"] = notify_url
+
+        if continue_url:
+            data["continueUrl"] = continue_url
+
+        if buyer:
+            data["buyer"] = buyer
+
+        data["settings"] = {"invoiceDisabled": "true"}
+
+        headers = self._headers(**kwargs)
+        data.update(kwargs)
+        encoded = json.dumps(data, cls=DjangoJSONEncoder)
+
+        logger.info(f"PayU request: {encoded}")
+
+        return ApiRequest(
+            endpoint="new_order",
+            method="POST",
+            url=urljoin(self.api_url, "/api/v2_1/orders"),
+            failure=LockFailure,
+            message="Error creating order",
+            ok_statuses=(200, 201, 302),
+            headers=headers,
+            body=encoded,
+            follow_redirects=False,
+            lookup=self._order_by_ext_id_request(order_id),
+        )
+
+    def _refund_request(
+        self,
+        order_id: str,
+        amount: Optional[Union[Decimal, float]] = None,
+        description: Optional[str] = None,
+        ext_refund_id: Optional[str] = None,
+        **kwargs,
+    ) -> ApiRequest:
+        data = {"description": description if description else "Refund"}
+        if amount:
+            data["amount"] = amount
+        if ext_refund_id:
+            data["extRefundId"] = ext_refund_id
+        encoded = json.dumps(
+            {"refund": self._centify(data), "orderId": order_id}, cls=DjangoJSONEncoder
+        )
+        return ApiRequest(
+            endpoint="refund",
+            method="POST",
+            url=urljoin(self.api_url, f"/api/v2_1/orders/{order_id}/refunds"),
+            failure=RefundFailure,
+            message="Error creating refund",
+            headers=self._headers(**kwargs),
+            body=encoded,
+            # PayU rejects a repeated extRefundId, so no refund is made twice
+            idempotent=bool(ext_refund_id),
+        )
+
+    def _refunds_request(self, order_id: str, **kwargs) -> ApiRequest:
+        return ApiRequest(
+            endpoint="refunds",
+            method="GET",
+            url=urljoin(self.api_url, f"/api/v2_1/orders/{order_id}/refunds"),
+            failure=CommunicationError,
+            message="Error getting refunds",
+            headers=self._headers(**kwargs),
+            idempotent=True,
+        )
+
+    def _cancel_order_request(self, order_id: str, **kwargs) -> ApiRequest:
+        return ApiRequest(
+            endpoint="cancel_order",
+            method="DELETE",
+            url=urljoin(self.api_url, f"/api/v2_1/orders/{order_id}"),
+            failure=GetPaidException,
+            message="Error cancelling order",
+            headers=self._headers(**kwargs),
+        )
+
+    def _capture_request(self, order_id: str, **kwargs) -> ApiRequest:
+        data = {"orderId": order_id, "orderStatus": OrderStatus.COMPLETED}
+        return ApiRequest(
+            endpoint="capture",
+            method="PUT",
+            url=urljoin(self.api_url, f"/api/v2_1/orders/{order_id}/status"),
+            failure=ChargeFailure,
+            message="Error charging locked payment",
+            headers=self._headers(**kwargs),
+            body=json.dumps(data, cls=DjangoJSONEncoder),
+        )
+
+    def _order_info_request(self, order_id: str, **kwargs) -> ApiRequest:
+        return ApiRequest(
+            endpoint="order_info",
+            method="GET",
+            url=urljoin(self.api_url, f"/api/v2_1/orders/{order_id}"),
+            failure=CommunicationError,
+            message="Error getting order info",
+            headers=self._headers(**kwargs),
+            idempotent=True,
+        )
+
+    def _order_by_ext_id_request(
+        self, ext_order_id: Union[str, int], **kwargs
+    ) -> ApiRequest:
+        return ApiRequest(
+            endpoint="order_by_ext_id",
+            method="GET",
+            url=urljoin(self.api_url, f"/api/v2_1/orders/ext/{ext_order_id}"),
+            failure=CommunicationError,
+            message="Error getting order info",
+            ok_statuses=(200, 404),
+            headers=self._headers(**kwargs),
+            idempotent=True,
+        )
+
+    def _order_transactions_request(self, order_id: str, **kwargs) -> ApiRequest:
+        return ApiRequest(
+            endpoint="order_transactions",
+            method="GET",
+            url=urljoin(self.api_url, f"/api/v2_1/orders/{order_id}/transactions"),
+            failure=CommunicationError,
+            message="Error getting order transactions",
+            headers=self._headers(**kwargs),
+            idempotent=True,
+        )
+
+    def _shop_info_request(self, shop_id: str, **kwargs) -> ApiRequest:
+        return ApiRequest(
+            endpoint="shop_info",
+            method="GET",
+            url=urljoin(self.api_url, f"/api/v2_1/shops/{shop_id}"),
+            failure=CommunicationError,
+            message="Error getting shop info",
+            headers=self._headers(**kwargs),
+            idempotent=True,
+        )
+
+    def _paymethods_request(self, lang: Optional[str] = None, **kwargs) -> ApiRequest:
+        url = urljoin(self.api_url, "/api/v2_1/paymethods")
+        if lang:
+            url = f"{url}?{urlencode({'lang': lang})}"
+        return ApiRequest(
+            endpoint="paymethods",
+            method="GET",
+            url=url,
+            failure=CommunicationError,
+            message="Error getting payment methods",
+            headers=self._headers(**kwargs),
+            idempotent=True,
+        )
+
+    def _decode(self, request: ApiRequest, content: bytes) -> Any:
+        if request.normalize:
+            return json.loads(content, object_hook=self._normalize_object)
+        return json.loads(content)
+
+    def _response(
+        self, request: ApiRequest, response: Any, elapsed: float
+    ) -> ApiResponse:
+        """
+        Wrap HTTP library response or raise ``request.failure``.
+        """
+        if response.status_code not in request.ok_statuses:
+            raise request.failure(request.message, context={"raw_response": response})
+        return ApiResponse(
+            self._decode(request, response.content),
+            status_code=response.status_code,
+            headers=response.headers,
+            elapsed=elapsed,
+            raw=response,
+        )
@@ -0,0 +1,202 @@
+"""
+Caching of slowly changing PayU data, like payment methods or shop info.
+
+:class:`TTLCache` keeps values in process memory in front of Django's cache
+framework, so most reads cost neither a PayU call nor a cache round-trip,
+while all workers share what any of them fetched. Expired values are still
+served for ``stale_ttl`` seconds while they are refreshed in the background
+(stale-while-revalidate), so requests never wait for PayU once a value has
+been fetched.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def _start_thread(func: Callable[[], Any]) -> None:
+    threading.Thread(target=func, daemon=True).start()
+
+
+class TTLCache:
+    """
+    :param name: Namespace of keys in Django cache
+    :param ttl: Seconds a fetched value is fresh
+    :param stale_ttl: Seconds an expired value is still served while it is
+        refreshed in the background
+    :param cache_alias: Django cache shared by workers, ``None`` to keep
+        values in process memory only
+    :param local_ttl: Seconds a value is kept in process memory without
+        checking Django cache, where it may have been invalidated; ``ttl``
+        by default
+    :param submit: Callable running background refreshes, a new thread by
+        default
+    """
+
+    key_prefix = "getpaid_payu:"
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = 600,
+        stale_ttl: float = 0,
+        cache_alias: Optional[str] = "default",
+        local_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.time,
+        submit: Callable[[Callable[[], Any]], Any] = _start_thread,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.cache_alias = cache_alias
+        self.local_ttl = ttl if local_ttl is None else local_ttl
+        self.clock = clock
+        self.submit = submit
+        self._local: Dict[Hashable, Tuple[Any, float]] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._refreshing = set()
+        self._guard = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias] if self.cache_alias else None
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counts of ``hit``, ``stale``, ``miss``, ``refresh`` and ``error`` events.
+        """
+        with self._guard:
+            return dict(self._stats)
+
+    def record(self, event: str) -> None:
+        with self._guard:
+            self._stats[event] += 1
+
+    def _cache_key(self, key: Hashable) -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}{self.name}:{digest}"
+
+    def _lock(self, key: Hashable) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _entry(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        entry = self._local.get(key)
+        if entry is not None and self.clock() - entry[1] < self.local_ttl:
+            return entry
+        cache = self.cache
+        if cache is None:
+            return entry
+        entry = cache.get(self._cache_key(key))
+        if entry is None:
+            self._local.pop(key, None)
+        else:
+            self._local[key] = entry
+        return entry
+
+    def get(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """
+        Return value cached under ``key``, calling ``fetch()`` to get it
+        if there is none. Concurrent misses in a process fetch once.
+        """
+        entry = self._entry(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = self.clock() - fetched_at
+            if age < self.ttl:
+                self.record("hit")
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.record("stale")
+                self.refresh_later(key, fetch)
+                return value
+        self.record("miss")
+        with self._lock(key):
+            entry = self._entry(key)
+            if entry is not None and self.clock() - entry[1] < self.ttl:
+                return entry[0]
+            return self.refresh(key, fetch)
+
+    def refresh(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """
+        Fetch and store a new value right away.
+        """
+        value = fetch()
+        self.set(key, value)
+        self.record("refresh")
+        return value
+
+    def refresh_later(self, key: Hashable, fetch: Callable[[], Any]) -> None:
+        """
+        Refresh value in the background, unless it is already being refreshed.
+        Errors are logged and the stale value is kept.
+        """
+        with self._guard:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def task():
+            try:
+                with self._lock(key):
+                    self.refresh(key, fetch)
+            except Exception:
+                self.record("error")
+                logger.exception(f"Refreshing {self.name} {key!r} failed")
+            finally:
+                with self._guard:
+                    self._refreshing.discard(key)
+
+        self.submit(task)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        entry = (value, self.clock())
+        self._local[key] = entry
+        cache = self.cache
+        if cache is not None:
+            cache.set(
+                self._cache_key(key),
+                entry,
+                timeout=max(math.ceil(self.ttl + self.stale_ttl), 1),
+            )
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Forget value in this process and in Django cache. Other processes
+        notice it within ``local_ttl``.
+        """
+        self._local.pop(key, None)
+        cache = self.cache
+        if cache is not None:
+            cache.delete(self._cache_key(key))
+
+    def clear(self) -> None:
+        """
+        Forget values kept in process memory.
+        """
+        self._local.clear()
+
+
+_caches: Dict[Tuple, TTLCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_ttl_cache(name: str, **options) -> TTLCache:
+    """
+    Return process-wide cache with given name and options, creating it
+    on first use.
+    """
+    key = (name, tuple(sorted(options.items())))
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = TTLCache(name, **options)
+        return _caches[key]
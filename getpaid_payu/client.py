@@ -1,54 +1,51 @@
-import json
 import logging
-from copy import deepcopy
+import threading
+import time
+from datetime import datetime, timezone
 from decimal import Decimal
-from functools import wraps
-from typing import Any, Callable, List, Optional, Union
-from urllib.parse import urljoin
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from django.core.serializers.json import DjangoJSONEncoder
-
-import pendulum
 import requests
-from getpaid.exceptions import (
-    ChargeFailure,
-    CommunicationError,
-    CredentialsError,
-    GetPaidException,
-    LockFailure,
-    RefundFailure,
-)
-from getpaid.types import ItemInfo
+from getpaid.exceptions import GetPaidException
+from urllib3.exceptions import NewConnectionError
 
+from .base import ApiRequest, ApiResponse, BaseClient
+from .concurrency import RateLimiter, bounded_map
+from .instrumentation import CallInfo, Instrumentation
+from .resilience import CircuitBreaker, RetryPolicy
+from .sessions import get_session
+from .tokens import BaseTokenStore, Token
 from .types import (
     BuyerData,
     CancellationResponse,
     ChargeResponse,
     Currency,
-    OrderStatus,
+    OrderTransactionsResponse,
     PaymentResponse,
+    PaymethodsResponse,
     ProductData,
     RefundResponse,
+    RefundsResponse,
     RetrieveOrderInfoResponse,
 )
 
 logger = logging.getLogger(__name__)
 
 
-def ensure_auth(func: Callable) -> Callable:
-    @wraps(func)
-    def _f(self, *args, **kwargs):
-        if self.token_expiration < pendulum.now().add(seconds=-5):
-            self._authorize()
-        return func(self, *args, **kwargs)
-
-    return _f
-
+def _connected(exception: Optional[Exception]) -> bool:
+    """
+    Whether the request may have reached PayU, i.e. the connection did not
+    time out, was not refused and the host name was resolved.
+    """
+    if isinstance(exception, requests.ConnectTimeout):
+        return False
+    if isinstance(exception, requests.ConnectionError) and exception.args:
+        reason = getattr(exception.args[0], "reason", exception.args[0])
+        return not isinstance(reason, NewConnectionError)
+    return True
 
-class Client:
-    last_response = None
-    _convertables = {"amount", "total", "available", "unitPrice", "totalAmount"}
 
+class Client(BaseClient):
     def __init__(
         self,
         api_url: str,
@@ -56,73 +53,172 @@ class Client:
         second_key: str,
         oauth_id: int,
         oauth_secret: str,
+        token_store: Optional[BaseTokenStore] = None,
+        session: Optional[requests.Session] = None,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        pool_size: Optional[int] = None,
+        instruments: Optional[Sequence[Instrumentation]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        token_refresh_fraction: Optional[float] = None,
     ):
-        self.api_url = api_url
-        self.pos_id = pos_id
-        self.second_key = second_key
-        self.oauth_id = oauth_id
-        self.oauth_secret = oauth_secret
-        self._authorize()
-
-    def _authorize(self):
-        url = urljoin(self.api_url, "/pl/standard/user/oauth/authorize")
-        self.last_response = requests.post(
-            url,
-            data={
-                "grant_type": "client_credentials",
-                "client_id": self.oauth_id,
-                "client_secret": self.oauth_secret,
-            },
+        super().__init__(
+            api_url=api_url,
+            pos_id=pos_id,
+            second_key=second_key,
+            oauth_id=oauth_id,
+            oauth_secret=oauth_secret,
+            token_store=token_store,
+            timeout=timeout,
+            pool_size=pool_size,
+            instruments=instruments,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
+            token_refresh_fraction=token_refresh_fraction,
         )
-        if self.last_response.status_code == 200:
-            data = self.last_response.json()
-            self.token = f"{data['token_type'].capitalize()} {data['access_token']}"
-            self.token_expiration = pendulum.now().add(seconds=int(data["expires_in"]))
-        else:
-            raise CredentialsError(
-                "Cannot authenticate.", context={"raw_response": self.last_response}
-            )
+        if session is None:
+            session = get_session(self.pool_size)
+        self.session = session
+        self._local = threading.local()
+
+    @property
+    def last_response(self) -> Optional[requests.Response]:
+        """
+        Last HTTP response received in current thread.
+        Prefer ``raw`` attribute of the returned :class:`ApiResponse`.
+        """
+        return getattr(self._local, "last_response", None)
 
-    def _headers(self, **kwargs):
-        data = {"Authorization": self.token, "Content-Type": "application/json"}
-        data.update(kwargs)
-        return data
+    @property
+    def token(self) -> str:
+        return self._get_token().value
 
-    @classmethod
-    def _centify(cls, data: Union[ItemInfo, dict, list, Decimal, int, float, str]):
+    @property
+    def token_expiration(self) -> datetime:
+        expires_at, _ = self._get_token().to_timestamps()
+        return datetime.fromtimestamp(expires_at, tz=timezone.utc)
+
+    def _get_token(self, call: Optional[CallInfo] = None) -> Token:
+        """
+        Return a valid token, authorizing only if the shared one is missing
+        or about to expire. Concurrent callers wait for a single refresh.
         """
-        Traverse through given object and convert all values of 'amount'
-        fields and all keys to PayU format.
-        :param data: Converted data
+        token = self._cached_token()
+        if token is None:
+            with self.token_store.refresh_lock(self._token_key):
+                token = self.token_store.get(self._token_key)
+                if token is None or token.is_expiring():
+                    token = self._authorize()
+                    if call is not None:
+                        call.token_refresh = True
+                self._token = token
+        return token
+
+    def _authorize(self) -> Token:
+        return self._store_token(self._call(self._authorize_request()))
+
+    def warm_up(self, connections: int = 1) -> None:
         """
-        data = deepcopy(data)
-        if hasattr(data, "items"):
-            return {
-                k: str(int(v * 100)) if k in cls._convertables else cls._centify(v)
-                for k, v in data.items()
-            }
-        elif isinstance(data, list):
-            return [cls._centify(v) for v in data]
-        return data
-
-    @classmethod
-    def _normalize(cls, data: Union[ItemInfo, dict, list, Decimal, int, float, str]):
+        Obtain a token and open up to ``connections`` pooled connections to
+        PayU, so that following calls skip OAuth, DNS and TLS setup.
+        With ``connections`` below 1 only the token is obtained.
         """
-        Traverse through given object and convert all values of 'amount'
-        fields to normal and all PayU-specific keys to standard ones.
-        :param data: Converted data
+        self._get_token()
+        if connections < 1:
+            return
+        for _, _, exception in bounded_map(
+            lambda _: self.session.head(
+                self.api_url, timeout=self.timeout, allow_redirects=False
+            ),
+            range(connections),
+            max_workers=connections,
+        ):
+            if exception is not None:
+                raise exception
+
+    def _call(self, request: ApiRequest) -> ApiResponse:
+        """
+        Send request through the pooled session and return its decoded body.
+
+        Transient failures are retried according to ``retry_policy`` and
+        a request rejected because of an expired token is sent once more
+        with a new one.
         """
-        data = deepcopy(data)
-        if hasattr(data, "items"):
-            return {
-                k: Decimal(v) / 100 if k in cls._convertables else cls._normalize(v)
-                for k, v in data.items()
-            }
-        elif isinstance(data, list):
-            return [cls._normalize(v) for v in data]
-        return data
-
-    @ensure_auth
+        call = self._start_call(request)
+        start = time.perf_counter()
+        try:
+            self._enter_circuit(request)
+            try:
+                return self._send(request, call)
+            finally:
+                self._exit_circuit(call.status_code)
+        finally:
+            self._finish_call(call, start)
+
+    def _send(self, request: ApiRequest, call: CallInfo) -> ApiResponse:
+        attempt = 0
+        reauthorized = False
+        while True:
+            headers = dict(request.headers or {})
+            token = None
+            if request.auth:
+                token = self._get_token(call)
+                headers["Authorization"] = token.value
+            response = exception = call.status_code = None
+            self._local.last_response = None
+            sent = time.perf_counter()
+            try:
+                response = self.session.request(
+                    request.method,
+                    request.url,
+                    headers=headers,
+                    data=request.body if request.body is not None else request.form,
+                    allow_redirects=request.follow_redirects,
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                exception = e
+            elapsed = time.perf_counter() - sent
+            self._local.last_response = response
+            if response is not None:
+                call.status_code = response.status_code
+
+            if token is not None and call.status_code == 401 and not reauthorized:
+                self._invalidate_token(token)
+                reauthorized = True
+                call.retries += 1
+                continue
+            if self._is_ambiguous(request, response, _connected(exception)):
+                effect = self._look_up(request, exception)
+                if effect is not None:
+                    return effect
+            delay = self._retry_delay(request, attempt, response)
+            if delay is None:
+                break
+            attempt += 1
+            call.retries += 1
+            time.sleep(delay)
+
+        if exception is not None:
+            raise request.failure(
+                request.message, context={"raw_response": None, "exception": exception},
+            )
+        return self._response(request, response, elapsed)
+
+    def _look_up(
+        self, request: ApiRequest, exception: Optional[Exception]
+    ) -> Optional[ApiResponse]:
+        """
+        Check with ``request.lookup`` whether a failed request was carried out
+        by PayU anyway and return its outcome, or ``None`` if it was not.
+
+        :raises OutcomeUnknown: if that cannot be checked
+        """
+        try:
+            return self._effect_response(self._call(request.lookup))
+        except GetPaidException as e:
+            raise self._unknown_outcome(request, exception or e) from e
+
     def new_order(
         self,
         amount: Union[Decimal, float],
@@ -147,110 +243,93 @@ class Client:
         :param products: List of products being bought (see :class:`Product`), defaults to amount + description
         :param notify_url: Callback url
         :param kwargs: Additional params that will first be consumed by headers, with leftovers passed on to order request
-        :return: JSON response from API
+        :return: JSON response from API as :class:`~getpaid_payu.base.ApiResponse`
         """
-        url = urljoin(self.api_url, "/api/v2_1/orders")
-        data = self._centify(
-            {
-                "extOrderId": order_id,
-                "customerIp": customer_ip if customer_ip else "127.0.0.1",
-                "merchantPosId": str(self.pos_id),
-                "description": description if description else "Payment order",
-                "currencyCode": currency.upper(),
-                "totalAmount": amount,
-                "products": products
-                if products
-                else [{"name": "Total order", "unitPrice": amount, "quantity": 1}],
-            }
-        )
-
-        if notify_url:
-            data["notifyUrl"] = notify_url
-
-        if continue_url:
-            data["continueUrl"] = continue_url
-
-        if buyer:
-            data["buyer"] = buyer
-
-        data["settings"] = {
-            "invoiceDisabled": "true"
-        }
-
-        headers = self._headers(**kwargs)
-        data.update(kwargs)
-        encoded = json.dumps(data, cls=DjangoJSONEncoder)
-
-        logger.info(f"PayU request: {encoded}")
-
-        self.last_response = requests.post(
-            url, headers=headers, data=encoded, allow_redirects=False
-        )
-        if self.last_response.status_code in [200, 201, 302]:
-            return self._normalize(self.last_response.json())
-        raise LockFailure(
-            "Error creating order", context={"raw_response": self.last_response}
+        return self._call(
+            self._new_order_request(
+                amount=amount,
+                currency=currency,
+                order_id=order_id,
+                description=description,
+                customer_ip=customer_ip,
+                buyer=buyer,
+                products=products,
+                notify_url=notify_url,
+                continue_url=continue_url,
+                **kwargs,
+            )
         )
 
-    @ensure_auth
     def refund(
         self,
         order_id: str,
         amount: Optional[Union[Decimal, float]] = None,
         description: Optional[str] = None,
+        ext_refund_id: Optional[str] = None,
         **kwargs,
     ) -> RefundResponse:
-        url = urljoin(self.api_url, f"/api/v2_1/orders/{order_id}/refunds")
-        data = {"description": description if description else "Refund"}
-        if amount:
-            data["amount"] = amount
-        encoded = json.dumps(
-            {"refund": self._centify(data), "orderId": order_id}, cls=DjangoJSONEncoder
-        )
-        self.last_response = requests.post(
-            url, headers=self._headers(**kwargs), data=encoded,
-        )
-        if self.last_response.status_code == 200:
-            return self._normalize(self.last_response.json())
-        raise RefundFailure(
-            "Error creating refund", context={"raw_response": self.last_response}
+        return self._call(
+            self._refund_request(
+                order_id,
+                amount=amount,
+                description=description,
+                ext_refund_id=ext_refund_id,
+                **kwargs,
+            )
         )
 
-    @ensure_auth
+    def get_refunds(self, order_id: str, **kwargs) -> RefundsResponse:
+        """
+        Get refunds of the order.
+
+        :param order_id: Order ID assigned by PayU
+        """
+        return self._call(self._refunds_request(order_id, **kwargs))
+
     def cancel_order(self, order_id: str, **kwargs) -> CancellationResponse:
-        url = urljoin(self.api_url, f"/api/v2_1/orders/{order_id}")
-        self.last_response = requests.delete(url, headers=self._headers(**kwargs))
-        if self.last_response.status_code == 200:
-            return self._normalize(self.last_response.json())
-        raise GetPaidException(
-            "Error cancelling order", context={"raw_response": self.last_response}
-        )
+        return self._call(self._cancel_order_request(order_id, **kwargs))
 
-    @ensure_auth
     def capture(self, order_id: str, **kwargs) -> ChargeResponse:
-        url = urljoin(self.api_url, f"/api/v2_1/orders/{order_id}/status")
-        data = {"orderId": order_id, "orderStatus": OrderStatus.COMPLETED}
-        self.last_response = requests.put(url, headers=self._headers(**kwargs))
-        if self.last_response.status_code == 200:
-            return self._normalize(self.last_response.json())
-        raise ChargeFailure(
-            "Error charging locked payment",
-            context={"raw_response": self.last_response},
-        )
+        return self._call(self._capture_request(order_id, **kwargs))
 
-    @ensure_auth
     def get_order_info(self, order_id: str, **kwargs) -> RetrieveOrderInfoResponse:
-        url = urljoin(self.api_url, f"/api/v2_1/orders/{order_id}")
-        self.last_response = requests.get(url, headers=self._headers(**kwargs))
-        if self.last_response.status_code == 200:
-            return self._normalize(self.last_response.json())
-        raise CommunicationError(context={"raw_response": self.last_response})
+        return self._call(self._order_info_request(order_id, **kwargs))
 
-    @ensure_auth
-    def get_order_transactions(self, order_id: str, **kwargs):
-        raise NotImplementedError
+    def get_order_transactions(
+        self, order_id: str, **kwargs
+    ) -> OrderTransactionsResponse:
+        """
+        Get card or transfer transaction details of the order.
+
+        :param order_id: Order ID assigned by PayU
+        """
+        return self._call(self._order_transactions_request(order_id, **kwargs))
+
+    def iter_order_transactions(
+        self,
+        order_ids: Iterable[str],
+        workers: int = 10,
+        rate: Optional[float] = None,
+        **kwargs,
+    ) -> Iterator[Tuple[str, Optional[OrderTransactionsResponse], Optional[Exception]]]:
+        """
+        Get transactions of many orders concurrently and yield
+        ``(order_id, response, exception)`` as the calls complete.
+
+        Order IDs are consumed lazily and at most ``workers`` calls are in
+        flight, so any number of orders can be processed in flat memory.
+        Connections come from the pooled session, which should keep at least
+        ``workers`` connections (see ``pool_size``).
+
+        :param rate: Limit of calls per second
+        """
+        return bounded_map(
+            lambda order_id: self.get_order_transactions(order_id, **kwargs),
+            order_ids,
+            max_workers=workers,
+            rate_limiter=RateLimiter(rate, burst=workers) if rate else None,
+        )
 
-    @ensure_auth
     def get_shop_info(self, shop_id: str, **kwargs):
         """
         Get own shop info
@@ -259,13 +338,15 @@ class Client:
         :param kwargs:
         :return:
         """
-        url = urljoin(self.api_url, f"/api/v2_1/shops/{shop_id}")
-        self.last_response = requests.get(url, headers=self._headers(**kwargs))
-        if self.last_response.status_code == 200:
-            return self._normalize(self.last_response.json())
-        raise CommunicationError(
-            "Error getting shop info", context={"raw_response": self.last_response}
-        )
+        return self._call(self._shop_info_request(shop_id, **kwargs))
 
-    def get_paymethods(self, lang: Optional[str] = None):
-        raise NotImplementedError
+    def get_paymethods(
+        self, lang: Optional[str] = None, **kwargs
+    ) -> PaymethodsResponse:
+        """
+        Get payment methods available for the POS.
+
+        :param lang: Language of method names, e.g. ``"pl"``
+        :return: JSON response from API, with ``payByLinks`` listing methods
+        """
+        return self._call(self._paymethods_request(lang, **kwargs))
@@ -0,0 +1,92 @@
+"""
+Helpers for running many PayU calls concurrently without flooding the API.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """
+    Token bucket letting through ``rate`` calls per second on average and up to
+    ``burst`` calls at once. Safe to share between threads; callers are served
+    in the order they arrived.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Wait until a call may be made and return the number of seconds waited.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # Tokens are reserved up front, so waiting callers do not race.
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            self.sleep(delay)
+        return delay
+
+
+def bounded_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int = 10,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> Iterator[Tuple[T, R, BaseException]]:
+    """
+    Call ``func`` for each item in a thread pool, with at most ``max_workers``
+    calls in flight, and yield ``(item, result, exception)`` as they complete.
+
+    Items are consumed lazily, so ``items`` can be an arbitrarily long iterator
+    and memory use stays flat. Exceptions are yielded instead of raised.
+    With ``rate_limiter`` every call waits for its turn first.
+    """
+    if rate_limiter is not None:
+        unlimited = func
+
+        def func(item):
+            rate_limiter.acquire()
+            return unlimited(item)
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        def submit():
+            for item in items:
+                pending[executor.submit(func, item)] = item
+                if len(pending) >= max_workers:
+                    break
+
+        submit()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                exception = future.exception()
+                result = None if exception else future.result()
+                yield item, result, exception
+            submit()
@@ -0,0 +1,189 @@
+"""
+Instrumentation of PayU API calls.
+
+Clients call :meth:`Instrumentation.before_request` and
+:meth:`Instrumentation.after_request` of every configured instrumentation
+around each API call, passing :class:`CallInfo`. Adapters for Prometheus
+(``pip install prometheus-client``) and StatsD (``pip install statsd``) are
+provided; configure them with ``instrumentation`` backend setting.
+"""
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class CallInfo:
+    """
+    Details of a single API call, filled in as the call progresses.
+    """
+
+    __slots__ = (
+        "endpoint",
+        "method",
+        "url",
+        "status_code",
+        "duration",
+        "retries",
+        "token_refresh",
+        "exception",
+    )
+
+    def __init__(self, endpoint: str, method: str, url: str):
+        self.endpoint = endpoint  #: Name of the API operation, e.g. ``new_order``
+        self.method = method
+        self.url = url
+        self.status_code: Optional[int] = None  #: ``None`` if no response came
+        self.duration: Optional[float] = None  #: Seconds, including retries
+        self.retries = 0
+        self.token_refresh = False  #: Whether OAuth token was refreshed for it
+        self.exception: Optional[BaseException] = None
+
+    @property
+    def status(self) -> str:
+        """
+        Status code as label, ``"error"`` for calls without response.
+        """
+        return str(self.status_code) if self.status_code is not None else "error"
+
+    def __repr__(self):
+        return (
+            f"<CallInfo {self.endpoint} {self.status} "
+            f"{self.duration if self.duration is not None else '-'}s>"
+        )
+
+
+class Instrumentation:
+    """
+    Base class of instrumentations. Hooks must not raise; exceptions are
+    logged and ignored so that they never break payments.
+    """
+
+    def before_request(self, call: CallInfo) -> None:
+        pass
+
+    def after_request(self, call: CallInfo) -> None:
+        pass
+
+
+class LoggingInstrumentation(Instrumentation):
+    """
+    Log every call with its duration.
+    """
+
+    def __init__(self, level: int = logging.INFO):
+        self.level = level
+
+    def after_request(self, call: CallInfo) -> None:
+        logger.log(
+            self.level,
+            f"PayU {call.endpoint} {call.status} in {call.duration:.3f}s",
+            extra={
+                "endpoint": call.endpoint,
+                "status_code": call.status_code,
+                "duration": call.duration,
+                "retries": call.retries,
+                "token_refresh": call.token_refresh,
+            },
+        )
+
+
+class PrometheusInstrumentation(Instrumentation):
+    """
+    Export ``<namespace>_requests_total``, ``<namespace>_request_duration_seconds``,
+    ``<namespace>_request_retries_total`` and ``<namespace>_token_refreshes_total``
+    labelled with endpoint (and status).
+    """
+
+    def __init__(self, namespace: str = "payu", registry=None, buckets=None):
+        from prometheus_client import REGISTRY, Counter, Histogram
+
+        registry = registry if registry is not None else REGISTRY
+        histogram_options = {"buckets": buckets} if buckets else {}
+        self.requests = Counter(
+            "requests_total",
+            "PayU API calls",
+            ["endpoint", "status"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self.duration = Histogram(
+            "request_duration_seconds",
+            "Duration of PayU API calls",
+            ["endpoint"],
+            namespace=namespace,
+            registry=registry,
+            **histogram_options,
+        )
+        self.retries = Counter(
+            "request_retries_total",
+            "Retried PayU API calls",
+            ["endpoint"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self.token_refreshes = Counter(
+            "token_refreshes_total",
+            "PayU API calls that needed OAuth token refresh",
+            ["endpoint"],
+            namespace=namespace,
+            registry=registry,
+        )
+
+    def after_request(self, call: CallInfo) -> None:
+        self.requests.labels(call.endpoint, call.status).inc()
+        self.duration.labels(call.endpoint).observe(call.duration)
+        if call.retries:
+            self.retries.labels(call.endpoint).inc(call.retries)
+        if call.token_refresh:
+            self.token_refreshes.labels(call.endpoint).inc()
+
+
+class StatsDInstrumentation(Instrumentation):
+    """
+    Send ``<prefix>.<endpoint>.duration`` timings and
+    ``<prefix>.<endpoint>.status.<status>``, ``<prefix>.<endpoint>.retries``,
+    ``<prefix>.<endpoint>.token_refresh`` counters.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8125,
+        prefix: str = "payu",
+        client=None,
+    ):
+        if client is None:
+            from statsd import StatsClient
+
+            client = StatsClient(host, port)
+        self.client = client
+        self.prefix = prefix
+
+    def after_request(self, call: CallInfo) -> None:
+        key = f"{self.prefix}.{call.endpoint}"
+        self.client.timing(f"{key}.duration", call.duration * 1000)
+        self.client.incr(f"{key}.status.{call.status}")
+        if call.retries:
+            self.client.incr(f"{key}.retries", call.retries)
+        if call.token_refresh:
+            self.client.incr(f"{key}.token_refresh")
+
+
+_instances: Dict[Tuple, Instrumentation] = {}
+_instances_lock = threading.Lock()
+
+
+def get_instrumentation(path: str, **options) -> Instrumentation:
+    """
+    Return shared instance of instrumentation class given by dotted path.
+    Metrics may be registered only once per process, hence the sharing.
+    """
+    key = (path, tuple(sorted(options.items())))
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = import_string(path)(**options)
+        return _instances[key]
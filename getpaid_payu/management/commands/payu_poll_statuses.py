@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from getpaid_payu.poller import StatusPoller
+
+
+class Command(BaseCommand):
+    help = "Fetch statuses of pending PayU payments (PULL confirmation method)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default="getpaid_payu")
+        parser.add_argument("--page-size", type=int, default=500)
+        parser.add_argument(
+            "--workers", type=int, default=10, help="Concurrent PayU calls."
+        )
+        parser.add_argument(
+            "--min-interval",
+            type=float,
+            default=60,
+            help="Minimal seconds between polls of a payment.",
+        )
+        parser.add_argument(
+            "--max-interval",
+            type=float,
+            default=3600,
+            help="Maximal seconds between polls of a payment.",
+        )
+        parser.add_argument(
+            "--backoff-factor",
+            type=float,
+            default=0.1,
+            help="Poll interval as a fraction of payment's age.",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=None,
+            metavar="SECONDS",
+            help="Keep polling, sleeping given number of seconds between runs.",
+        )
+
+    def handle(self, *args, **options):
+        poller = StatusPoller(
+            backend=options["backend"],
+            page_size=options["page_size"],
+            max_workers=options["workers"],
+            min_interval=options["min_interval"],
+            max_interval=options["max_interval"],
+            backoff_factor=options["backoff_factor"],
+        )
+        while True:
+            start = time.monotonic()
+            stats = poller.run()
+            self.stdout.write(
+                f"polled: {stats['polled']}, updated: {stats['updated']}, "
+                f"failed: {stats['failed']}, skipped: {stats['skipped']} "
+                f"in {time.monotonic() - start:.2f}s"
+            )
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from getpaid_payu.outbox import NotificationWorker
+
+
+class Command(BaseCommand):
+    help = "Apply PayU notifications queued by callback view (callback_mode=queue)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Give up on a notification after that many failures.",
+        )
+        parser.add_argument(
+            "--loop",
+            type=float,
+            default=None,
+            metavar="SECONDS",
+            help="Keep processing, sleeping given number of seconds between runs.",
+        )
+
+    def handle(self, *args, **options):
+        worker = NotificationWorker(
+            batch_size=options["batch_size"], max_attempts=options["max_attempts"]
+        )
+        while True:
+            start = time.monotonic()
+            stats = worker.run()
+            self.stdout.write(
+                f"processed: {stats['processed']}, applied: {stats['applied']}, "
+                f"failed: {stats['failed']}, skipped: {stats['skipped']} "
+                f"in {time.monotonic() - start:.2f}s"
+            )
+            if options["loop"] is None:
+                break
+            time.sleep(options["loop"])
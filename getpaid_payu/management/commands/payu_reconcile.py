@@ -0,0 +1,105 @@
+import datetime
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from getpaid_payu.reconcile import Reconciler, ReportWriter
+
+
+def _start_of_day(value: str) -> datetime.datetime:
+    date = parse_date(value)
+    if date is None:
+        raise CommandError(f"Invalid date: {value}")
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare statuses of PayU payments with their PayU orders and report "
+        "(optionally fix) mismatches. Checks payments created yesterday by default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default="getpaid_payu")
+        parser.add_argument(
+            "--since",
+            metavar="YYYY-MM-DD",
+            help="Check payments created that day or later.",
+        )
+        parser.add_argument(
+            "--until",
+            metavar="YYYY-MM-DD",
+            help="Check payments created before that day.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--workers", type=int, default=10, help="Concurrent PayU calls."
+        )
+        parser.add_argument(
+            "--rate", type=float, default=None, help="Maximum PayU calls per second."
+        )
+        parser.add_argument(
+            "--output", default="-", help="Report file, standard output by default."
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            default=None,
+            help="Report format, guessed from --output extension (default: csv).",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="File keeping progress, to resume an interrupted run.",
+        )
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Fix mismatched payments with the same transitions as status polling.",
+        )
+
+    def get_filters(self, options) -> dict:
+        if options["since"] is None and options["until"] is None:
+            today = timezone.localdate()
+            options["since"] = (today - datetime.timedelta(days=1)).isoformat()
+            options["until"] = today.isoformat()
+        filters = {}
+        if options["since"]:
+            filters["created_on__gte"] = _start_of_day(options["since"])
+        if options["until"]:
+            filters["created_on__lt"] = _start_of_day(options["until"])
+        return filters
+
+    def handle(self, *args, **options):
+        reconciler = Reconciler(
+            backend=options["backend"],
+            filters=self.get_filters(options),
+            chunk_size=options["chunk_size"],
+            max_workers=options["workers"],
+            rate=options["rate"],
+            apply=options["apply"],
+            checkpoint=options["checkpoint"],
+        )
+        output = options["output"]
+        report_format = options["format"] or (
+            "jsonl" if output.endswith((".jsonl", ".json")) else "csv"
+        )
+        start = time.monotonic()
+        if output == "-":
+            stats = reconciler.run(ReportWriter(sys.stdout, report_format))
+        else:
+            # A resumed run appends to the report of the interrupted one.
+            resuming = reconciler.load_checkpoint() is not None
+            mode = "a" if resuming else "w"
+            with open(output, mode, newline="") as stream:
+                header = not resuming or os.path.getsize(output) == 0
+                stats = reconciler.run(ReportWriter(stream, report_format, header))
+        self.stderr.write(
+            f"checked: {stats['checked']}, mismatched: {stats['mismatched']}, "
+            f"fixed: {stats['fixed']}, failed: {stats['failed']} "
+            f"in {time.monotonic() - start:.2f}s"
+        )
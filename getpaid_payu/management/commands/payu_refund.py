@@ -0,0 +1,103 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from getpaid_payu.refunds import BulkRefunder
+
+from .payu_reconcile import _start_of_day
+
+
+class Command(BaseCommand):
+    help = (
+        "Refund many PayU payments in full, concurrently. Payments are given "
+        "by a file of their ids or by creation dates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default="getpaid_payu")
+        parser.add_argument(
+            "--file",
+            help="File with ids of payments to refund, one per line ('-' for stdin).",
+        )
+        parser.add_argument(
+            "--since",
+            metavar="YYYY-MM-DD",
+            help="Refund payments created that day or later.",
+        )
+        parser.add_argument(
+            "--until",
+            metavar="YYYY-MM-DD",
+            help="Refund payments created before that day.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument(
+            "--workers", type=int, default=10, help="Concurrent PayU calls."
+        )
+        parser.add_argument(
+            "--rate", type=float, default=None, help="Maximum PayU calls per second."
+        )
+        parser.add_argument("--description", default=None, help="Refund description.")
+        parser.add_argument(
+            "--prefix",
+            default="refund",
+            help="Prefix of extRefundId; use a new one to refund the same payments "
+            "again.",
+        )
+        parser.add_argument(
+            "--progress",
+            default=None,
+            help="JSON Lines file recording every payment, to resume an "
+            "interrupted run.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list payments that would be refunded.",
+        )
+
+    def get_payments(self, refunder: BulkRefunder, options):
+        if options["file"]:
+            if options["since"] or options["until"]:
+                raise CommandError("Use either --file or --since/--until.")
+            if options["file"] == "-":
+                return sys.stdin
+            return open(options["file"])
+        if not (options["since"] or options["until"]):
+            raise CommandError("Give payments with --file or --since/--until.")
+        queryset = refunder.get_queryset()
+        if options["since"]:
+            queryset = queryset.filter(created_on__gte=_start_of_day(options["since"]))
+        if options["until"]:
+            queryset = queryset.filter(created_on__lt=_start_of_day(options["until"]))
+        return queryset
+
+    def handle(self, *args, **options):
+        refunder = BulkRefunder(
+            backend=options["backend"],
+            chunk_size=options["chunk_size"],
+            max_workers=options["workers"],
+            rate=options["rate"],
+            description=options["description"],
+            prefix=options["prefix"],
+            progress=options["progress"],
+            dry_run=options["dry_run"],
+        )
+        payments = self.get_payments(refunder, options)
+        start = time.monotonic()
+        try:
+            stats = refunder.run(payments)
+        finally:
+            if hasattr(payments, "close") and payments is not sys.stdin:
+                payments.close()
+        elapsed = time.monotonic() - start
+        if options["dry_run"]:
+            self.stdout.write(
+                f"refundable: {stats['refundable']}, skipped: {stats['skipped']}"
+            )
+            return
+        self.stdout.write(
+            f"refunded: {stats['refunded']}, failed: {stats['failed']}, "
+            f"skipped: {stats['skipped']} in {elapsed:.2f}s "
+            f"({stats['refunded'] / elapsed if elapsed else 0:.1f}/s)"
+        )
@@ -0,0 +1,81 @@
+# Generated by Django 3.2.25 on 2026-10-16 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="PayUNotification",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "key",
+                    models.CharField(
+                        blank=True, db_index=True, max_length=255, verbose_name="key"
+                    ),
+                ),
+                ("body", models.TextField(verbose_name="body")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "pending"),
+                            ("processing", "processing"),
+                            ("done", "done"),
+                            ("failed", "failed"),
+                        ],
+                        default="pending",
+                        max_length=20,
+                        verbose_name="status",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="attempts"
+                    ),
+                ),
+                ("last_error", models.TextField(blank=True, verbose_name="last error")),
+                (
+                    "created_on",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created on"),
+                ),
+                (
+                    "claimed_on",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="claimed on"
+                    ),
+                ),
+                (
+                    "processed_on",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="processed on"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "PayU notification",
+                "verbose_name_plural": "PayU notifications",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="payunotification",
+            index=models.Index(
+                fields=["status", "id"], name="getpaid_pay_status_ee7996_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class NotificationStatus:
+    PENDING = "pending"
+    PROCESSING = "processing"  #: Claimed by a worker
+    DONE = "done"
+    FAILED = "failed"
+
+    choices = [
+        (PENDING, _("pending")),
+        (PROCESSING, _("processing")),
+        (DONE, _("done")),
+        (FAILED, _("failed")),
+    ]
+
+
+class PayUNotification(models.Model):
+    """
+    Verified PayU notification waiting to be applied by
+    ``manage.py payu_process_notifications`` (``callback_mode = "queue"``).
+    """
+
+    key = models.CharField(_("key"), max_length=255, blank=True, db_index=True)
+    body = models.TextField(_("body"))
+    status = models.CharField(
+        _("status"),
+        max_length=20,
+        choices=NotificationStatus.choices,
+        default=NotificationStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(_("attempts"), default=0)
+    last_error = models.TextField(_("last error"), blank=True)
+    created_on = models.DateTimeField(_("created on"), auto_now_add=True)
+    claimed_on = models.DateTimeField(_("claimed on"), null=True, blank=True)
+    processed_on = models.DateTimeField(_("processed on"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("PayU notification")
+        verbose_name_plural = _("PayU notifications")
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"{self.key or self.pk} ({self.status})"
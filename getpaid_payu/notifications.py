@@ -0,0 +1,74 @@
+"""
+Handling of repeated PayU notifications.
+
+PayU sends several notifications per order and retries each of them until it
+gets ``200 OK``. Notifications that were already applied are recognized by
+their key and acknowledged without loading the Payment.
+"""
+from typing import Optional
+
+import swapper
+from django.core.cache import caches
+
+
+def is_well_formed(data) -> bool:
+    """
+    Check that decoded notification is an order or refund notification.
+    """
+    if not isinstance(data, dict):
+        return False
+    if "refund" in data:
+        return isinstance(data["refund"], dict)
+    return isinstance(data.get("order"), dict)
+
+
+def notification_key(data: dict) -> Optional[str]:
+    """
+    Identify notification by PayU order id, status and refund id (if any).
+    """
+    if "refund" in data:
+        refund = data.get("refund") or {}
+        parts = (data.get("orderId"), refund.get("status"), refund.get("refundId"))
+    else:
+        order = data.get("order") or {}
+        parts = (order.get("orderId"), order.get("status"), None)
+    if not all(parts[:2]):
+        return None
+    return ":".join(str(part) for part in parts if part is not None)
+
+
+class NotificationDeduplicator:
+    """
+    Remembers applied notifications in Django cache for ``ttl`` seconds.
+    """
+
+    key_prefix = "getpaid_payu:notification:"
+
+    def __init__(self, cache_alias: str = "default", ttl: int = 24 * 3600):
+        self.cache_alias = cache_alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def is_applied(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        return self.cache.get(f"{self.key_prefix}{key}") is not None
+
+    def mark_applied(self, key: Optional[str]) -> None:
+        if key is not None:
+            self.cache.set(f"{self.key_prefix}{key}", True, timeout=self.ttl)
+
+
+def payment_lookup(data: dict) -> dict:
+    """
+    Return Payment lookup kwargs for decoded notification.
+    """
+    external_id = data.get("order", {}).get("extOrderId")
+    if external_id:
+        Payment = swapper.load_model("getpaid", "Payment")
+        return {Payment.UNIQUE_ID_FIELD: external_id}
+    # refund notifications carry PayU's orderId only
+    return {"external_id": data.get("orderId")}
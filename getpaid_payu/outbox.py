@@ -0,0 +1,165 @@
+"""
+Applying queued PayU notifications (``callback_mode = "queue"``).
+
+In queue mode :class:`~getpaid_payu.views.CallbackView` only verifies the
+signature, stores the notification as :class:`~getpaid_payu.models.PayUNotification`
+and answers ``OK`` right away. :class:`NotificationWorker` applies stored
+notifications in batches, so slow ``Payment`` signal handlers no longer keep
+PayU waiting. Several workers can run at once: each claims a batch of rows in
+a short transaction (skipping rows locked by another worker on databases
+supporting ``SKIP LOCKED``) and then applies every notification in its own
+transaction, with the Payment row locked.
+"""
+import json
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import List, Optional
+
+import swapper
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import NotificationStatus, PayUNotification
+from .notifications import payment_lookup
+from .processor import PaymentProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationWorker:
+    """
+    :param batch_size: Number of notifications claimed at once
+    :param max_attempts: Failed notifications are retried until they fail
+        that many times, then they are marked as ``failed``
+    :param claim_timeout: Seconds after which notifications claimed by
+        a worker that did not finish them, e.g. was killed, are claimed again
+    """
+
+    def __init__(
+        self, batch_size: int = 100, max_attempts: int = 5, claim_timeout: int = 600
+    ):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.deduplicator = PaymentProcessor.get_deduplicator()
+
+    def get_queryset(self):
+        """
+        Notifications waiting to be applied, including the abandoned ones.
+        """
+        abandoned = timezone.now() - timedelta(seconds=self.claim_timeout)
+        return PayUNotification.objects.filter(
+            Q(status=NotificationStatus.PENDING)
+            | Q(status=NotificationStatus.PROCESSING, claimed_on__lt=abandoned)
+        ).order_by("pk")
+
+    def claim(self, after: int = 0) -> List[PayUNotification]:
+        """
+        Mark a batch of waiting notifications with ``pk`` greater than
+        ``after`` as processed by this worker and return them, oldest first.
+        """
+        with transaction.atomic():
+            batch = list(
+                self.get_queryset()
+                .filter(pk__gt=after)
+                .select_for_update(skip_locked=True)[: self.batch_size]
+            )
+            PayUNotification.objects.filter(pk__in=[n.pk for n in batch]).update(
+                status=NotificationStatus.PROCESSING, claimed_on=timezone.now()
+            )
+        return batch
+
+    def is_duplicate(self, notification: PayUNotification) -> bool:
+        """
+        Tell whether a notification with the same key was already applied,
+        synchronously or by a worker.
+        """
+        key = notification.key
+        if not key:
+            return False
+        if self.deduplicator is not None and self.deduplicator.is_applied(key):
+            return True
+        return (
+            PayUNotification.objects.filter(key=key, status=NotificationStatus.DONE)
+            .exclude(pk=notification.pk)
+            .exists()
+        )
+
+    def apply(self, notification: PayUNotification) -> bool:
+        """
+        Apply the notification unless it is a duplicate, which is checked
+        again with the Payment locked, when concurrent duplicates are settled.
+
+        :return: Whether the notification was applied
+        """
+        data = json.loads(notification.body)
+        Payment = swapper.load_model("getpaid", "Payment")
+        payment = Payment.objects.select_for_update().get(**payment_lookup(data))
+        if self.is_duplicate(notification):
+            return False
+        payment.processor.apply_notification(data)
+        if self.deduplicator is not None:
+            key = notification.key or None
+            transaction.on_commit(lambda: self.deduplicator.mark_applied(key))
+        return True
+
+    def process(self, notification: PayUNotification, stats: Counter) -> None:
+        """
+        Apply a claimed notification and record the outcome, in a transaction
+        of its own.
+        """
+        fields = ["status", "attempts", "last_error", "processed_on"]
+        try:
+            if self.is_duplicate(notification):
+                applied = False
+                notification.status = NotificationStatus.DONE
+                notification.processed_on = timezone.now()
+                notification.save(update_fields=fields)
+            else:
+                with transaction.atomic():
+                    applied = self.apply(notification)
+                    notification.status = NotificationStatus.DONE
+                    notification.processed_on = timezone.now()
+                    notification.save(update_fields=fields)
+        except Exception as e:
+            logger.exception(
+                "Cannot apply PayU notification",
+                extra={"notification_id": notification.pk},
+            )
+            notification.attempts += 1
+            notification.last_error = repr(e)
+            notification.processed_on = None
+            if notification.attempts >= self.max_attempts:
+                notification.status = NotificationStatus.FAILED
+            else:
+                notification.status = NotificationStatus.PENDING
+            notification.save(update_fields=fields)
+            stats["failed"] += 1
+        else:
+            stats["applied" if applied else "skipped"] += 1
+
+    def process_batch(self, stats: Counter, after: int = 0) -> Optional[int]:
+        """
+        Claim and apply a batch of waiting notifications with ``pk`` greater
+        than ``after``.
+
+        :return: ``pk`` of the last notification in batch, ``None`` if none left.
+        """
+        batch = self.claim(after)
+        for notification in batch:
+            self.process(notification, stats)
+        stats["processed"] += len(batch)
+        return batch[-1].pk if batch else None
+
+    def run(self) -> Counter:
+        """
+        Process all waiting notifications. Notifications failing in this run
+        are retried in the next one.
+        """
+        stats = Counter()
+        last = 0
+        while last is not None:
+            last = self.process_batch(stats, after=last)
+        return stats
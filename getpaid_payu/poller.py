@@ -0,0 +1,196 @@
+"""
+Batched status polling for ``confirmation_method = "PULL"``.
+
+Instead of calling ``fetch_and_update_status()`` for every Payment one by one,
+:class:`StatusPoller` walks pending PayU payments page by page, fetches their
+statuses concurrently and applies resulting callbacks in one transaction
+per page. Payments are polled less often as they get older.
+"""
+import logging
+from collections import Counter, defaultdict
+from typing import Iterator, List, Optional
+
+import swapper
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django_fsm import ConcurrentTransition, TransitionNotAllowed, can_proceed
+from getpaid.exceptions import GetPaidException
+from getpaid.types import PaymentStatus as ps
+from getpaid.types import PaymentStatusResponse
+
+from .concurrency import bounded_map
+
+logger = logging.getLogger(__name__)
+
+
+def apply_status_report(
+    payment, report: PaymentStatusResponse
+) -> PaymentStatusResponse:
+    """
+    Run callback proposed by ``fetch_payment_status`` and save the Payment,
+    just like ``Payment.fetch_and_update_status()`` does.
+    """
+    callback_name = report.get("callback")
+    if not callback_name:
+        return report
+    callback = getattr(payment, callback_name)
+    try:
+        if can_proceed(callback):
+            report["callback_result"] = callback(amount=report.get("amount", None))
+            payment.save()
+            report["saved"] = True
+        else:
+            logger.debug(
+                f"Cannot run fetch+update callback {callback_name}.",
+                extra={
+                    "payment_id": payment.id,
+                    "payment_status": payment.status,
+                    "callback": callback_name,
+                },
+            )
+    except (GetPaidException, TransitionNotAllowed, ConcurrentTransition) as e:
+        report["exception"] = e
+    return report
+
+
+class StatusPoller:
+    """
+    :param backend: Payment backend to poll
+    :param page_size: Number of payments loaded from database at once
+    :param max_workers: Maximum number of concurrent PayU calls
+    :param min_interval: Minimal time between polls of a payment, in seconds
+    :param max_interval: Maximal time between polls of a payment, in seconds
+    :param backoff_factor: Poll interval as a fraction of payment's age
+    :param cache_alias: Cache used to remember when payments are due
+    """
+
+    pending_statuses = (ps.PREPARED, ps.PRE_AUTH, ps.IN_CHARGE)
+    key_prefix = "getpaid_payu:poll:"
+
+    def __init__(
+        self,
+        backend: str = "getpaid_payu",
+        page_size: int = 500,
+        max_workers: int = 10,
+        min_interval: float = 60,
+        max_interval: float = 3600,
+        backoff_factor: float = 0.1,
+        cache_alias: str = "default",
+    ):
+        self.backend = backend
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.cache = caches[cache_alias]
+
+    def get_queryset(self):
+        Payment = swapper.load_model("getpaid", "Payment")
+        return (
+            Payment.objects.filter(
+                backend=self.backend, status__in=self.pending_statuses
+            )
+            .exclude(external_id="")
+            .order_by("created_on", "pk")
+        )
+
+    def iter_pages(self) -> Iterator[List]:
+        """
+        Yield pending payments in pages, using keyset pagination so that
+        payments changing status meanwhile do not shift the pages.
+        """
+        queryset = self.get_queryset()
+        last = None
+        while True:
+            page_qs = queryset
+            if last is not None:
+                page_qs = page_qs.filter(
+                    Q(created_on__gt=last.created_on)
+                    | Q(created_on=last.created_on, pk__gt=last.pk)
+                )
+            page = list(page_qs[: self.page_size])
+            if not page:
+                return
+            yield page
+            if len(page) < self.page_size:
+                return
+            last = page[-1]
+
+    def get_interval(self, payment, now=None) -> float:
+        now = now or timezone.now()
+        age = (now - payment.created_on).total_seconds()
+        interval = max(self.min_interval, age * self.backoff_factor)
+        return min(self.max_interval, interval)
+
+    def _cache_key(self, payment) -> str:
+        return f"{self.key_prefix}{payment.pk}"
+
+    def due_payments(self, page: List) -> List:
+        """
+        Filter out payments that were polled recently.
+        """
+        keys = {self._cache_key(payment): payment for payment in page}
+        scheduled = self.cache.get_many(list(keys))
+        return [payment for key, payment in keys.items() if key not in scheduled]
+
+    def fetch(self, payment):
+        return payment.processor.client.get_order_info(payment.external_id)
+
+    def poll_page(self, page: List, stats: Optional[Counter] = None) -> Counter:
+        stats = stats if stats is not None else Counter()
+        due = self.due_payments(page)
+        stats["skipped"] += len(page) - len(due)
+        for payment in due:
+            payment.processor  # build processor and client outside worker threads
+
+        reports = []
+        for payment, response, exception in bounded_map(
+            self.fetch, due, self.max_workers
+        ):
+            stats["polled"] += 1
+            if exception is not None:
+                stats["failed"] += 1
+                logger.warning(
+                    "Cannot fetch PayU order status",
+                    extra={"payment_id": payment.id, "exception": exception},
+                )
+                continue
+            try:
+                report = payment.processor.get_status_report(response)
+            except (IndexError, AttributeError):
+                # no order data in response
+                stats["failed"] += 1
+                continue
+            reports.append((payment, report))
+
+        with transaction.atomic():
+            for payment, report in reports:
+                apply_status_report(payment, report)
+                if report.get("saved"):
+                    stats["updated"] += 1
+
+        self.schedule(due)
+        return stats
+
+    def schedule(self, payments: List) -> None:
+        """
+        Remember not to poll given payments until their interval passes.
+        """
+        now = timezone.now()
+        step = max(int(self.min_interval), 1)
+        by_interval = defaultdict(dict)
+        for payment in payments:
+            # round down to whole steps so that keys can be stored in batches
+            interval = int(self.get_interval(payment, now)) // step * step or step
+            by_interval[interval][self._cache_key(payment)] = True
+        for interval, keys in by_interval.items():
+            self.cache.set_many(keys, timeout=interval)
+
+    def run(self) -> Counter:
+        stats = Counter()
+        for page in self.iter_pages():
+            self.poll_page(page, stats)
+        return stats
@@ -0,0 +1,168 @@
+"""
+Several PayU points of sale (POS) served by one backend.
+
+Besides the POS configured with top-level ``pos_id``, ``second_key``,
+``oauth_id`` and ``oauth_secret`` settings, more of them can be given in
+``pos`` backend setting, e.g. one per currency or per brand.
+:class:`PosRegistry` resolves the POS of a Payment, keeps one client per POS
+for the lifetime of the process and finds the ``second_key`` of a notification
+by its ``merchantPosId``.
+"""
+import threading
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, Tuple
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .signature import SignatureVerifier, get_verifier
+
+#: Name of the POS configured with top-level settings
+DEFAULT_POS = "default"
+CREDENTIALS = ("pos_id", "second_key", "oauth_id", "oauth_secret")
+
+
+class PosConfig(NamedTuple):
+    name: str
+    pos_id: Optional[int]
+    second_key: Optional[str]
+    oauth_id: Optional[int]
+    oauth_secret: Optional[str]
+    currencies: Tuple[str, ...] = ()  #: Currencies this POS is used for
+
+    @classmethod
+    def from_settings(cls, name: str, options: dict) -> "PosConfig":
+        return cls(
+            name=name,
+            currencies=tuple(c.upper() for c in options.get("currencies", ())),
+            **{key: options.get(key) for key in CREDENTIALS},
+        )
+
+
+class PosRegistry:
+    """
+    :param pos: Configured POS by name
+    :param default: Name of POS used when no other one matches
+    :param client_factory: Callable building client of given POS
+    :param async_client_factory: Callable building async client of given POS
+    :param resolver: Callable returning name of POS of given Payment, or
+        ``None`` to fall back to other rules
+    :param order_attribute: Attribute of Payment's order holding POS name
+
+    The POS of a Payment is chosen by ``resolver``, then ``order_attribute``,
+    then Payment's currency and finally the default one.
+    """
+
+    def __init__(
+        self,
+        pos: Dict[str, PosConfig],
+        default: str,
+        client_factory: Callable[[PosConfig], object],
+        resolver: Optional[Callable] = None,
+        order_attribute: Optional[str] = None,
+        async_client_factory: Optional[Callable[[PosConfig], object]] = None,
+    ):
+        if default not in pos:
+            raise ImproperlyConfigured(
+                f"Default PayU POS {default!r} is not configured"
+            )
+        self.pos = pos
+        self.default = pos[default]
+        self.client_factory = client_factory
+        self.resolver = resolver
+        self.order_attribute = order_attribute
+        self.async_client_factory = async_client_factory
+        self._by_pos_id = {str(p.pos_id): p for p in pos.values()}
+        self._by_currency = {c: p for p in pos.values() for c in p.currencies}
+        self._clients: Dict[str, object] = {}
+        self._async_clients: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.pos)
+
+    def __iter__(self) -> Iterator[PosConfig]:
+        return iter(self.pos.values())
+
+    def get(self, name: str) -> PosConfig:
+        try:
+            return self.pos[name]
+        except KeyError:
+            raise ImproperlyConfigured(f"PayU POS {name!r} is not configured")
+
+    def by_pos_id(self, pos_id) -> Optional[PosConfig]:
+        return self._by_pos_id.get(str(pos_id))
+
+    def resolve(self, payment) -> PosConfig:
+        """
+        Return POS of the Payment.
+        """
+        if len(self.pos) == 1:
+            return self.default
+        if self.resolver is not None:
+            name = self.resolver(payment)
+            if name:
+                return self.get(name)
+        if self.order_attribute:
+            name = getattr(payment.order, self.order_attribute, None)
+            if name:
+                return self.get(name)
+        currency = (payment.currency or "").upper()
+        return self._by_currency.get(currency, self.default)
+
+    def for_notification(self, data: dict) -> Optional[PosConfig]:
+        """
+        Return POS named by ``merchantPosId`` of an order notification.
+        Refund notifications do not carry it.
+        """
+        pos_id = (data.get("order") or {}).get("merchantPosId")
+        return self.by_pos_id(pos_id) if pos_id is not None else None
+
+    def get_client(self, pos: PosConfig):
+        """
+        Return client of the POS, building it on first use.
+        """
+        return self._get_or_build(self._clients, self.client_factory, pos)
+
+    def get_async_client(self, pos: PosConfig):
+        """
+        Return async client of the POS, building it on first use.
+        """
+        return self._get_or_build(self._async_clients, self.async_client_factory, pos)
+
+    def _get_or_build(self, clients: dict, factory: Callable, pos: PosConfig):
+        client = clients.get(pos.name)
+        if client is None:
+            with self._lock:
+                client = clients.get(pos.name)
+                if client is None:
+                    client = clients[pos.name] = factory(pos)
+        return client
+
+    def get_verifier(self, pos: PosConfig) -> SignatureVerifier:
+        return get_verifier(pos.second_key, pos.pos_id)
+
+
+_registries: Dict[type, PosRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_pos_registry(processor_class) -> PosRegistry:
+    """
+    Return process-wide registry of given processor class, creating it
+    with its ``create_pos_registry()`` on first use.
+    """
+    registry = _registries.get(processor_class)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(processor_class)
+            if registry is None:
+                registry = processor_class.create_pos_registry()
+                _registries[processor_class] = registry
+    return registry
+
+
+@receiver(setting_changed)
+def _reset_registries(setting, **kwargs):
+    if setting in ("GETPAID_BACKEND_SETTINGS", "GETPAID"):
+        _registries.clear()
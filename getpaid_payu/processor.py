@@ -5,27 +5,39 @@ Settings:
     client_id
     client_secret
 """
-import hashlib
 import json
 import logging
-from collections import OrderedDict
+from decimal import Decimal
+from typing import TYPE_CHECKING, List, Optional
 from urllib.parse import urljoin
 
+import swapper
+from asgiref.sync import sync_to_async
 from django import http
+from django.conf import settings
 from django.db.transaction import atomic
 from django.http import HttpResponse
-from django.template.response import TemplateResponse
-from django.utils.http import urlencode
+from django.utils.module_loading import import_string
 from django_fsm import can_proceed
 from getpaid import adapter
 from getpaid.exceptions import LockFailure
-from getpaid.post_forms import PaymentHiddenInputsPostForm
 from getpaid.processor import BaseProcessor
 from getpaid.types import BackendMethod as bm
 from getpaid.types import PaymentStatusResponse
 
-from .client import Client
-from .types import Currency, OrderStatus, RefundStatus, ResponseStatus
+from .caching import TTLCache, get_ttl_cache
+from .instrumentation import Instrumentation, get_instrumentation
+from .notifications import NotificationDeduplicator, payment_lookup
+from .pos import CREDENTIALS, DEFAULT_POS, PosConfig, PosRegistry, get_pos_registry
+from .resilience import CircuitBreaker, OutcomeUnknown, RetryPolicy, get_circuit_breaker
+from .signature import SignatureVerifier
+
+if TYPE_CHECKING:  # the HTTP stack is loaded once a client is needed
+    from .async_client import AsyncClient
+    from .base import ApiResponse
+    from .client import Client
+    from .tokens import BaseTokenStore
+    from .types import PayByLinkData, PaymethodsResponse
 
 logger = logging.getLogger(__name__)
 
@@ -33,20 +45,44 @@ logger = logging.getLogger(__name__)
 class PaymentProcessor(BaseProcessor):
     slug = "payu"
     display_name = "PayU"
-    accepted_currencies = [c.value for c in Currency]
+    #: Values of :class:`~getpaid_payu.types.Currency`, not imported at startup
+    accepted_currencies = [
+        "BGN",
+        "CHF",
+        "CZK",
+        "DKK",
+        "EUR",
+        "GBP",
+        "HRK",
+        "HUF",
+        "NOK",
+        "PLN",
+        "RON",
+        "RUB",
+        "SEK",
+        "UAH",
+        "USD",
+    ]
     ok_statuses = [200, 201, 302]
     method = "REST"  #: Supported modes: REST, POST (not recommended!)
     sandbox_url = "https://secure.snd.payu.com/"
     production_url = "https://secure.payu.com/"
     confirmation_method = "PUSH"  #: PUSH - paywall will send POST request to your server; PULL - you need to check the payment status
-    post_form_class = PaymentHiddenInputsPostForm
+    post_form_class = "getpaid.post_forms.PaymentHiddenInputsPostForm"
     post_template_name = "getpaid_payu/payment_post_form.html"
-    client_class = Client
+    client_class = "getpaid_payu.client.Client"
+    async_client_class = "getpaid_payu.async_client.AsyncClient"
     _token = None
-    _token_expires = None
+    _pos = None
 
     # Specifics
 
+    def get_form_class(self, **kwargs):
+        form_class = super().get_form_class(**kwargs)
+        if isinstance(form_class, str):
+            form_class = import_string(form_class)
+        return form_class
+
     def validate_config(self, config):
         """
         validate config, raise exception on error e.g.
@@ -65,26 +101,292 @@ class PaymentProcessor(BaseProcessor):
                     )
                 )
 
+    @classmethod
+    def get_backend_setting(cls, name: str, default=None):
+        """
+        Like :meth:`get_setting`, but usable before a Payment is loaded.
+        """
+        path = cls.__module__.rpartition(".")[0]
+        config = getattr(settings, "GETPAID_BACKEND_SETTINGS", {}).get(path, {})
+        value = config.get(name, default)
+        if value is None:
+            value = getattr(settings, "GETPAID", {}).get(name, None)
+        return value
+
+    @classmethod
+    def get_deduplicator(cls) -> Optional[NotificationDeduplicator]:
+        if not cls.get_backend_setting("deduplicate_notifications", True):
+            return None
+        return NotificationDeduplicator(
+            cache_alias=cls.get_backend_setting("notification_cache", "default"),
+            ttl=cls.get_backend_setting("notification_ttl", 24 * 3600),
+        )
+
+    @classmethod
+    def get_paywall_baseurl(cls, **kwargs) -> str:
+        """
+        Use ``sandbox_url`` / ``production_url`` settings if given, e.g. to
+        point the plugin at :mod:`getpaid_payu.testing.simulator`.
+        """
+        baseurl = super().get_paywall_baseurl(**kwargs)
+        if baseurl == cls.sandbox_url:
+            return cls.get_backend_setting("sandbox_url") or baseurl
+        return cls.get_backend_setting("production_url") or baseurl
+
+    @classmethod
+    def create_pos_registry(cls) -> PosRegistry:
+        """
+        Build registry of POS configured in backend settings.
+        """
+        configured = cls.get_backend_setting("pos") or {}
+        pos = {}
+        if cls.get_backend_setting("pos_id") or not configured:
+            pos[DEFAULT_POS] = PosConfig.from_settings(
+                DEFAULT_POS, {key: cls.get_backend_setting(key) for key in CREDENTIALS}
+            )
+        for name, options in configured.items():
+            pos[name] = PosConfig.from_settings(name, options)
+        resolver = cls.get_backend_setting("pos_resolver")
+        if isinstance(resolver, str):
+            resolver = import_string(resolver)
+        return PosRegistry(
+            pos,
+            default=cls.get_backend_setting("default_pos", DEFAULT_POS),
+            client_factory=cls.create_client,
+            resolver=resolver,
+            order_attribute=cls.get_backend_setting("pos_order_attribute"),
+            async_client_factory=cls.create_async_client,
+        )
+
+    @classmethod
+    def get_pos_registry(cls) -> PosRegistry:
+        return get_pos_registry(cls)
+
+    def get_pos(self) -> PosConfig:
+        """
+        POS handling the Payment.
+        """
+        if self._pos is None:
+            self._pos = self.get_pos_registry().resolve(self.payment)
+        return self._pos
+
+    def get_client(self) -> "Client":
+        """
+        Client of Payment's POS, shared by all processors in the process.
+        """
+        return self.get_pos_registry().get_client(self.get_pos())
+
     def get_client_params(self) -> dict:
+        return self.get_backend_client_params(self.get_pos())
+
+    @classmethod
+    def get_backend_client_params(cls, pos: Optional[PosConfig] = None) -> dict:
+        """
+        Client params taken from backend settings only, usable without a Payment.
+        Default POS is used unless ``pos`` is given.
+        """
+        if pos is None:
+            pos = cls.get_pos_registry().default
         return {
-            "api_url": self.get_paywall_baseurl(),
-            "pos_id": self.get_setting("pos_id"),
-            "second_key": self.get_setting("second_key"),
-            "oauth_id": self.get_setting("oauth_id"),
-            "oauth_secret": self.get_setting("oauth_secret"),
+            "api_url": cls.get_paywall_baseurl(),
+            "pos_id": pos.pos_id,
+            "second_key": pos.second_key,
+            "oauth_id": pos.oauth_id,
+            "oauth_secret": pos.oauth_secret,
+            "token_store": cls.get_token_store(),
+            "pool_size": cls.get_backend_setting("pool_size"),
+            "timeout": cls.get_timeout(),
+            "instruments": cls.get_instruments(),
+            "retry_policy": cls.get_retry_policy(),
+            "circuit_breaker": cls.get_circuit_breaker(),
+            "token_refresh_fraction": cls.get_backend_setting("token_refresh_fraction"),
         }
 
+    @classmethod
+    def create_client(cls, pos: PosConfig) -> "Client":
+        client_class = cls.get_backend_setting("CLIENT_CLASS") or cls.client_class
+        if isinstance(client_class, str):
+            client_class = import_string(client_class)
+        return client_class(**cls.get_backend_client_params(pos))
+
+    @classmethod
+    def create_async_client(cls, pos: PosConfig) -> "AsyncClient":
+        return import_string(cls.async_client_class)(
+            **cls.get_backend_client_params(pos)
+        )
+
+    @classmethod
+    def get_backend_client(cls, pos: Optional[str] = None) -> "Client":
+        """
+        Client for calls not related to any Payment, like payment methods.
+        Default POS is used unless ``pos`` name is given.
+        """
+        registry = cls.get_pos_registry()
+        return registry.get_client(registry.get(pos) if pos else registry.default)
+
+    @classmethod
+    def get_paymethods_cache(cls) -> TTLCache:
+        return get_ttl_cache(
+            "paymethods",
+            ttl=cls.get_backend_setting("paymethods_ttl", 600),
+            stale_ttl=cls.get_backend_setting("paymethods_stale_ttl", 3600),
+            cache_alias=cls.get_backend_setting("paymethods_cache", "default"),
+        )
+
+    @classmethod
+    def get_paymethods(
+        cls, lang: Optional[str] = None, pos: Optional[str] = None
+    ) -> "PaymethodsResponse":
+        """
+        Payment methods of the POS, cached per POS and language.
+        Default POS is used unless ``pos`` name is given.
+        The returned dict is shared, do not modify it.
+        """
+        registry = cls.get_pos_registry()
+        config = registry.get(pos) if pos else registry.default
+        key = (cls.get_paywall_baseurl(), config.name, config.pos_id, lang)
+        return cls.get_paymethods_cache().get(
+            key, lambda: dict(registry.get_client(config).get_paymethods(lang=lang))
+        )
+
+    @classmethod
+    def get_enabled_paymethods(
+        cls,
+        lang: Optional[str] = None,
+        amount: Optional[Decimal] = None,
+        pos: Optional[str] = None,
+    ) -> List["PayByLinkData"]:
+        """
+        Pay-by-link methods currently enabled, only those accepting ``amount``
+        if it is given.
+        """
+        methods = []
+        for method in cls.get_paymethods(lang, pos=pos).get("payByLinks", []):
+            if method.get("status") != "ENABLED":
+                continue
+            if amount is not None and not (
+                method.get("minAmount", amount)
+                <= amount
+                <= method.get("maxAmount", amount)
+            ):
+                continue
+            methods.append(method)
+        return methods
+
+    @classmethod
+    def get_shop_info_cache(cls) -> TTLCache:
+        # Shared entries are always checked, so invalidation is seen at once
+        # by all processes.
+        return get_ttl_cache(
+            "shop_info",
+            ttl=cls.get_backend_setting("shop_info_ttl", 60),
+            stale_ttl=cls.get_backend_setting("shop_info_stale_ttl", 600),
+            cache_alias=cls.get_backend_setting("shop_info_cache", "default"),
+            local_ttl=0,
+        )
+
+    @classmethod
+    def get_shop_info(cls, shop_id: Optional[str] = None) -> dict:
+        """
+        Shop info with balance, cached. ``shop_id`` setting is used by default.
+        The returned dict may be shared, do not modify it.
+        """
+        shop_id = shop_id or cls.get_backend_setting("shop_id")
+        return cls.get_shop_info_cache().get(
+            (cls.get_paywall_baseurl(), shop_id),
+            lambda: dict(cls.get_backend_client().get_shop_info(shop_id)),
+        )
+
+    @classmethod
+    def invalidate_shop_info(cls, shop_id: Optional[str] = None) -> None:
+        """
+        Forget cached shop info after its balance changed, e.g. after a payout.
+        Refunds invalidate it on their own.
+        """
+        shop_id = shop_id or cls.get_backend_setting("shop_id")
+        cls.get_shop_info_cache().invalidate((cls.get_paywall_baseurl(), shop_id))
+
+    @classmethod
+    def get_timeout(cls):
+        from .sessions import DEFAULT_TIMEOUT
+
+        connect_timeout = cls.get_backend_setting("connect_timeout")
+        read_timeout = cls.get_backend_setting("read_timeout")
+        if connect_timeout is None and read_timeout is None:
+            return None
+        return (
+            connect_timeout if connect_timeout is not None else DEFAULT_TIMEOUT[0],
+            read_timeout if read_timeout is not None else DEFAULT_TIMEOUT[1],
+        )
+
+    @classmethod
+    def get_retry_policy(cls) -> Optional[RetryPolicy]:
+        retries = cls.get_backend_setting("retries", 2)
+        if not retries:
+            return None
+        return RetryPolicy(
+            retries=retries,
+            backoff=cls.get_backend_setting("retry_backoff", 0.2),
+            max_backoff=cls.get_backend_setting("retry_max_backoff", 5.0),
+        )
+
+    @classmethod
+    def get_circuit_breaker(cls) -> Optional[CircuitBreaker]:
+        if not cls.get_backend_setting("circuit_breaker", True):
+            return None
+        return get_circuit_breaker(
+            cls.get_paywall_baseurl(),
+            failure_threshold=cls.get_backend_setting("circuit_failure_threshold", 5),
+            reset_timeout=cls.get_backend_setting("circuit_reset_timeout", 30.0),
+        )
+
+    @classmethod
+    def get_instruments(cls) -> List[Instrumentation]:
+        options = cls.get_backend_setting("instrumentation_options") or {}
+        return [
+            get_instrumentation(path, **options.get(path, {}))
+            for path in cls.get_backend_setting("instrumentation") or ()
+        ]
+
+    @classmethod
+    def get_token_store(cls) -> "BaseTokenStore":
+        from .tokens import get_token_store
+
+        return get_token_store(
+            cls.get_backend_setting("token_backend"),
+            **(cls.get_backend_setting("token_backend_options") or {}),
+        )
+
+    def get_signature_verifier(
+        self, notification: Optional[dict] = None
+    ) -> SignatureVerifier:
+        """
+        Verifier of POS named in the notification, or of Payment's POS.
+        """
+        registry = self.get_pos_registry()
+        pos = registry.for_notification(notification) if notification else None
+        return registry.get_verifier(pos or self.get_pos())
+
+    @classmethod
+    def get_notification_verifier(cls, notification: dict) -> SignatureVerifier:
+        """
+        Verifier for a notification whose Payment is not loaded. Refund
+        notifications name no POS, so their Payment is looked up if needed.
+        """
+        registry = cls.get_pos_registry()
+        pos = registry.for_notification(notification)
+        if pos is None and len(registry) > 1:
+            Payment = swapper.load_model("getpaid", "Payment")
+            payment = Payment.objects.filter(**payment_lookup(notification)).first()
+            if payment is not None:
+                pos = registry.resolve(payment)
+        return registry.get_verifier(pos or registry.default)
+
     def prepare_form_data(self, post_data):
-        pos_id = self.get_setting("pos_id")
-        second_key = self.get_setting("second_key")
         algorithm = self.get_setting("algorithm", "SHA-256").upper()
-        hasher = getattr(hashlib, algorithm.replace("-", "").lower())
-        encoded = urlencode(OrderedDict(sorted(post_data.items())))
-        prepared = f"{encoded}&{second_key}".encode("ascii")
-        signature = hasher(prepared).hexdigest()
-        post_data[
-            "OpenPayu-Signature"
-        ] = f"signature={signature};algorithm={algorithm};sender={pos_id}"
+        post_data["OpenPayu-Signature"] = self.get_signature_verifier().sign_form(
+            post_data, algorithm
+        )
         return post_data
 
     # Helper methods
@@ -186,7 +488,23 @@ class PaymentProcessor(BaseProcessor):
         if method == bm.REST:
             try:
                 results = self.prepare_lock(request=request, **kwargs)
-                response = http.HttpResponseRedirect(results["url"])
+                # An order found after a lost response has no redirect URI;
+                # its outcome comes with a notification.
+                response = http.HttpResponseRedirect(
+                    results["url"]
+                    or self.get_return_redirect_url(
+                        payment=self.payment, request=request, success=False
+                    )
+                )
+            except OutcomeUnknown as exc:
+                # PayU may hold the order, so the payment is not failed;
+                # a notification or the poller settles it.
+                logger.warning(exc, extra=getattr(exc, "context", None))
+                return http.HttpResponseRedirect(
+                    self.get_return_redirect_url(
+                        payment=self.payment, request=request, success=False
+                    )
+                )
             except LockFailure as exc:
                 logger.error(exc, extra=getattr(exc, "context", None))
                 self.payment.fail()
@@ -203,103 +521,150 @@ class PaymentProcessor(BaseProcessor):
             data = self.get_paywall_context(
                 request=request, camelize_keys=True, **kwargs
             )
-            data["merchantPosId"] = self.get_setting("pos_id")
+            data["merchantPosId"] = self.get_pos().pos_id
 
             url = self.get_main_url()
             form = self.get_form(data)
+            from django.template.response import TemplateResponse
+
             return TemplateResponse(
                 request=request,
                 template=self.get_template_names(view=view),
                 context={"form": form, "paywall_url": url},
             )
 
-    def handle_paywall_callback(self, request, **kwargs):
-        logger.error("PayU handle_paywall_callback 1")
+    def handle_paywall_callback(self, request, notification=None, **kwargs):
+        """
+        Verify signature of PayU notification and apply it to the Payment.
+
+        :param notification: Already decoded request body. If not given,
+            it is decoded here, after the signature is verified.
+        """
+        error_response = self.verify_callback(
+            request, self.get_signature_verifier(notification)
+        )
+        if error_response is not None:
+            return error_response
+
+        if notification is None:
+            notification = json.loads(request.body)
+        if self.get_setting("log_notifications", False):
+            logger.info(f"PayU.Msg[sign:ok] {notification}")
+        self.apply_notification(notification)
+        return HttpResponse("OK")
+
+    @classmethod
+    def verify_callback(
+        cls, request, verifier: SignatureVerifier
+    ) -> Optional[HttpResponse]:
+        """
+        Check signature of PayU notification without loading the Payment.
+
+        :return: Error response to send back to PayU, ``None`` if signature is valid.
+        """
+        log_body = cls.get_backend_setting("log_notifications", False)
         payu_header_raw = request.headers.get(
             "Openpayu-Signature"
         ) or request.headers.get("X-Openpayu-Signature", "")
 
         if not payu_header_raw:
             logger.warning("PayU callback: no signature")
-            logger.warning("PayU callback: no signature, msg: {}".format(
-                request.body.decode()
-            ))
-
+            if log_body:
+                logger.warning(f"PayU callback: no signature, msg: {request.body!r}")
             return HttpResponse("NO SIGNATURE", status=400)
-        payu_header = {
-            k: v for k, v in [i.split("=") for i in payu_header_raw.split(";")]
-        }
-        algo_name = payu_header.get("algorithm", "MD5")
-        signature = payu_header.get("signature")
-        second_key = self.get_setting("second_key")
-        algorithm = getattr(hashlib, algo_name.replace("-", "").lower())
-
-        logger.info("PayU handle_paywall_callback 2")
-        body = request.body.decode()
-        logger.info(f"PayU.Msg {body}")
-        expected_signature = algorithm(
-            f"{body}{second_key}".encode("utf-8")
-        ).hexdigest()
-
-        if expected_signature == signature:
-            data = json.loads(body)
-            logger.info(f"PayU.Msg[sign:ok] {data}")
-
-            if "order" in data:
-                order_data = data.get("order")
-                status = order_data.get("status")
-                if status == OrderStatus.COMPLETED:
-                    if can_proceed(self.payment.confirm_payment):
-                        self.payment.confirm_payment()
-                        if can_proceed(self.payment.mark_as_paid):
-                            self.payment.mark_as_paid()
-                    else:
-                        logger.warning(
-                            "Cannot confirm payment",
-                            extra={
-                                "payment_id": self.payment.id,
-                                "payment_status": self.payment.status,
-                            },
-                        )
-                elif status == OrderStatus.CANCELED:
+
+        if not verifier.verify(request.body, payu_header_raw):
+            logger.error(f"Received bad PayU signature! Header: '{payu_header_raw}'")
+            return HttpResponse(
+                "BAD SIGNATURE", status=422
+            )  # https://httpstatuses.com/422
+        return None
+
+    def apply_notification(self, data: dict):
+        """
+        Run Payment transitions for decoded, verified PayU notification
+        and save the Payment.
+        """
+        from .base import from_cents
+        from .types import OrderStatus, RefundStatus
+
+        if "order" in data:
+            order_data = data.get("order")
+            status = order_data.get("status")
+            if status == OrderStatus.COMPLETED:
+                if can_proceed(self.payment.confirm_payment):
+                    self.payment.confirm_payment()
+                    if can_proceed(self.payment.mark_as_paid):
+                        self.payment.mark_as_paid()
+                else:
+                    self._log_skipped_transition("Cannot confirm payment")
+            elif status == OrderStatus.CANCELED:
+                if can_proceed(self.payment.fail):
                     self.payment.fail()
-                elif status == OrderStatus.WAITING_FOR_CONFIRMATION:
-                    if can_proceed(self.payment.confirm_lock):
-                        self.payment.confirm_lock()
-                    else:
-                        logger.warning(
-                            "Already locked",
-                            extra={
-                                "payment_id": self.payment.id,
-                                "payment_status": self.payment.status,
-                            },
-                        )
-            elif "refund" in data:
-                refund_data = data.get("refund")
-                status = refund_data.get("status")
-                if status == RefundStatus.FINALIZED:
-                    amount = refund_data.get("amount") / 100
+                else:
+                    self._log_skipped_transition("Cannot fail payment")
+            elif status == OrderStatus.WAITING_FOR_CONFIRMATION:
+                if can_proceed(self.payment.confirm_lock):
+                    self.payment.confirm_lock()
+                else:
+                    self._log_skipped_transition("Already locked")
+        elif "refund" in data:
+            refund_data = data.get("refund")
+            status = refund_data.get("status")
+            self.invalidate_shop_info()
+            if status == RefundStatus.FINALIZED:
+                if can_proceed(self.payment.confirm_refund):
+                    amount = from_cents(refund_data.get("amount"))
                     self.payment.confirm_refund(amount)
                     if can_proceed(self.payment.mark_as_refunded):
                         self.payment.mark_as_refunded()
-                elif status == RefundStatus.CANCELED:
+                else:
+                    self._log_skipped_transition("Cannot confirm refund")
+            elif status == RefundStatus.CANCELED:
+                if can_proceed(self.payment.cancel_refund):
                     self.payment.cancel_refund()
                     if can_proceed(self.payment.mark_as_paid):
                         self.payment.mark_as_paid()
-            self.payment.save()
-            return HttpResponse("OK")
-        else:
-            logger.error(
-                f"Received bad signature for payment {self.payment.id}! "
-                f"Got '{signature}', expected '{expected_signature}'"
-            )
-            return HttpResponse(
-                "BAD SIGNATURE", status=422
-            )  # https://httpstatuses.com/422
+                else:
+                    self._log_skipped_transition("Cannot cancel refund")
+        self.payment.save()
+
+    def _log_skipped_transition(self, message: str) -> None:
+        """
+        Log a notification not applicable in Payment's current status,
+        e.g. a repeated one. It is acknowledged, so PayU stops sending it.
+        """
+        logger.warning(
+            message,
+            extra={
+                "payment_id": self.payment.id,
+                "payment_status": self.payment.status,
+            },
+        )
+
+    def get_async_client(self) -> "AsyncClient":
+        """
+        :class:`~getpaid_payu.async_client.AsyncClient` of Payment's POS,
+        shared by all processors in the process like the sync client.
+        """
+        return self.get_pos_registry().get_async_client(self.get_pos())
 
     def fetch_payment_status(self) -> PaymentStatusResponse:
         response = self.client.get_order_info(self.payment.external_id)
-        results = {"raw_response": self.client.last_response}
+        return self.get_status_report(response)
+
+    async def afetch_payment_status(self) -> PaymentStatusResponse:
+        client = self.get_async_client()
+        response = await client.get_order_info(self.payment.external_id)
+        return self.get_status_report(response)
+
+    def get_status_report(self, response: "ApiResponse") -> PaymentStatusResponse:
+        """
+        Propose a Payment callback based on ``get_order_info`` response.
+        """
+        from .types import OrderStatus
+
+        results = {"raw_response": response.raw}
         order_data = response.get("orders", [None])[0]
 
         status = order_data.get("status")
@@ -320,20 +685,35 @@ class PaymentProcessor(BaseProcessor):
         return urljoin(baseurl, "/api/v2_1/orders")
 
     def prepare_lock(self, request=None, **kwargs):
-        results = {}
         params = self.get_paywall_context(request=request, **kwargs)
         # logger.info("PayU requested: {}".format(params))
         response = self.client.new_order(**params)
-        results["raw_response"] = self.client.last_response
+        return self._lock_results(response)
+
+    async def aprepare_lock(self, request=None, **kwargs):
+        """
+        Async variant of :meth:`prepare_lock`. Payment is not saved.
+        """
+        params = await sync_to_async(self.get_paywall_context)(
+            request=request, **kwargs
+        )
+        client = self.get_async_client()
+        response = await client.new_order(**params)
+        return self._lock_results(response)
+
+    def _lock_results(self, response: "ApiResponse"):
+        results = {"raw_response": response.raw}
         results["url"] = response.get("redirectUri")
         self.payment.confirm_prepared()
         self.payment.external_id = results["ext_order_id"] = response.get("orderId", "")
         return results
 
     def charge(self, **kwargs):
+        from .types import ResponseStatus
+
         response = self.client.capture(self.payment.external_id)
         result = {
-            "raw_response": self.client.last_response,
+            "raw_response": response.raw,
             "status_desc": response.get("status", {}).get("statusDesc"),
         }
         if response.get("status", {}).get("statusCode") == ResponseStatus.SUCCESS:
@@ -341,7 +721,24 @@ class PaymentProcessor(BaseProcessor):
 
         return result
 
+    def start_refund(
+        self, amount: Optional[Decimal] = None, refund: Optional[dict] = None, **kwargs
+    ) -> Decimal:
+        """
+        :param refund: Record of a refund already made in PayU, e.g. by
+            :class:`~getpaid_payu.refunds.BulkRefunder`; PayU is not called again
+        """
+        if refund is None:
+            response = self.client.refund(
+                self.payment.external_id, amount=amount, **kwargs
+            )
+            self.invalidate_shop_info()
+            refund = response.get("refund", {})
+        return refund.get("amount", amount)
+
     def release_lock(self):
+        from .types import ResponseStatus
+
         response = self.client.cancel_order(self.payment.external_id)
         status = response.get("status", {}).get("statusCode")
         if status == ResponseStatus.SUCCESS:
@@ -0,0 +1,242 @@
+"""
+Reconciliation of local payments with PayU order statuses.
+
+:class:`Reconciler` streams PayU payments from the database in chunks,
+fetches their orders concurrently and reports payments whose status does not
+match the order's, e.g. because a ``COMPLETED`` notification was lost.
+Optionally it fixes them with the same transitions as ``fetch_payment_status``.
+Progress is saved to a checkpoint file after every chunk, so an interrupted
+run resumes where it stopped.
+"""
+import csv
+import json
+import logging
+import os
+from collections import Counter
+from itertools import islice
+from typing import IO, Dict, Iterator, List, Optional
+
+import swapper
+from django.db import transaction
+from getpaid.types import PaymentStatus as ps
+
+from .concurrency import RateLimiter, bounded_map
+from .poller import apply_status_report
+from .types import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+#: Local statuses in agreement with each PayU order status
+CONSISTENT_STATUSES = {
+    remote.value: {local.value for local in locals_}
+    for remote, locals_ in (
+        (OrderStatus.NEW, (ps.NEW, ps.PREPARED)),
+        (OrderStatus.PENDING, (ps.NEW, ps.PREPARED)),
+        (OrderStatus.WAITING_FOR_CONFIRMATION, (ps.PRE_AUTH, ps.IN_CHARGE)),
+        (OrderStatus.COMPLETED, (ps.PARTIAL, ps.PAID, ps.REFUND_STARTED, ps.REFUNDED),),
+        (OrderStatus.CANCELED, (ps.FAILED, ps.REFUNDED)),
+    )
+}
+
+REPORT_FIELDS = [
+    "payment_id",
+    "external_id",
+    "created_on",
+    "local_status",
+    "remote_status",
+    "callback",
+    "applied",
+    "error",
+]
+
+
+class ReportWriter:
+    """
+    Write report rows as CSV (``format="csv"``) or JSON Lines (``"jsonl"``).
+    """
+
+    def __init__(self, stream: IO[str], format: str = "csv", header: bool = True):
+        self.stream = stream
+        self.format = format
+        if format == "csv":
+            self.writer = csv.DictWriter(stream, fieldnames=REPORT_FIELDS)
+            if header:
+                self.writer.writeheader()
+        elif format != "jsonl":
+            raise ValueError(f"Unknown report format: {format}")
+
+    def write(self, row: Dict) -> None:
+        if self.format == "csv":
+            self.writer.writerow(row)
+        else:
+            self.stream.write(json.dumps(row, default=str) + "\n")
+        self.stream.flush()
+
+
+class Reconciler:
+    """
+    :param backend: Payment backend to reconcile
+    :param filters: Lookups narrowing checked payments, e.g. a date range
+    :param chunk_size: Payments loaded from database and checked at once
+    :param max_workers: Maximum number of concurrent PayU calls
+    :param rate: Limit of PayU calls per second
+    :param apply: Whether to fix mismatched payments
+    :param checkpoint: Path of file where progress is saved
+    """
+
+    def __init__(
+        self,
+        backend: str = "getpaid_payu",
+        filters: Optional[Dict] = None,
+        chunk_size: int = 500,
+        max_workers: int = 10,
+        rate: Optional[float] = None,
+        apply: bool = False,
+        checkpoint: Optional[str] = None,
+    ):
+        self.backend = backend
+        self.filters = filters or {}
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate, burst=max_workers) if rate else None
+        self.apply = apply
+        self.checkpoint = checkpoint
+
+    def get_queryset(self):
+        Payment = swapper.load_model("getpaid", "Payment")
+        return (
+            Payment.objects.filter(backend=self.backend, **self.filters)
+            .exclude(external_id="")
+            .order_by("pk")
+        )
+
+    # Checkpoints
+
+    def _checkpoint_key(self) -> str:
+        return json.dumps(
+            {"backend": self.backend, "filters": self.filters},
+            sort_keys=True,
+            default=str,
+        )
+
+    def load_checkpoint(self) -> Optional[Dict]:
+        """
+        Return saved progress of the same reconciliation, if any.
+        """
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return None
+        with open(self.checkpoint) as f:
+            data = json.load(f)
+        if data.get("key") != self._checkpoint_key():
+            logger.warning(
+                f"Ignoring checkpoint {self.checkpoint} of another reconciliation"
+            )
+            return None
+        return data
+
+    def save_checkpoint(self, last_pk, stats: Counter) -> None:
+        if not self.checkpoint:
+            return
+        temporary = f"{self.checkpoint}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(
+                {
+                    "key": self._checkpoint_key(),
+                    "last_pk": str(last_pk),
+                    "stats": stats,
+                },
+                f,
+            )
+        os.replace(temporary, self.checkpoint)
+
+    def clear_checkpoint(self) -> None:
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    # Reconciliation
+
+    def iter_chunks(self, after=None) -> Iterator[List]:
+        """
+        Yield payments in chunks, streaming them from the database.
+        """
+        queryset = self.get_queryset()
+        if after is not None:
+            queryset = queryset.filter(pk__gt=after)
+        payments = queryset.iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(payments, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def fetch(self, payment):
+        return payment.processor.client.get_order_info(payment.external_id)
+
+    @staticmethod
+    def is_consistent(local_status: str, remote_status: str) -> bool:
+        consistent = CONSISTENT_STATUSES.get(remote_status)
+        return consistent is None or local_status in consistent
+
+    def check_chunk(self, chunk: List, stats: Counter) -> Iterator[Dict]:
+        """
+        Yield report rows of mismatched payments and those that could not
+        be checked, fixing the former if ``apply`` is set.
+        """
+        for payment in chunk:
+            payment.processor  # build processor and client outside worker threads
+
+        for payment, response, exception in bounded_map(
+            self.fetch, chunk, self.max_workers, self.rate_limiter
+        ):
+            stats["checked"] += 1
+            row = {
+                "payment_id": payment.pk,
+                "external_id": payment.external_id,
+                "created_on": payment.created_on.isoformat(),
+                "local_status": payment.status,
+                "remote_status": "",
+                "callback": "",
+                "applied": False,
+                "error": "",
+            }
+            try:
+                if exception is not None:
+                    raise exception
+                report = payment.processor.get_status_report(response)
+                row["remote_status"] = response["orders"][0].get("status", "")
+            except Exception as e:
+                stats["failed"] += 1
+                row["error"] = str(e) or type(e).__name__
+                yield row
+                continue
+            if self.is_consistent(payment.status, row["remote_status"]):
+                continue
+            stats["mismatched"] += 1
+            row["callback"] = report.get("callback") or ""
+            if self.apply and row["callback"]:
+                row["applied"] = self.fix(payment, report)
+                stats["fixed"] += row["applied"]
+            yield row
+
+    def fix(self, payment, report) -> bool:
+        """
+        Apply status report to the locked Payment row, unless it changed
+        since it was checked.
+        """
+        with transaction.atomic():
+            locked = type(payment).objects.select_for_update().get(pk=payment.pk)
+            if locked.status != payment.status:
+                return False
+            apply_status_report(locked, report)
+        return bool(report.get("saved"))
+
+    def run(self, writer: ReportWriter) -> Counter:
+        progress = self.load_checkpoint()
+        stats = Counter(progress["stats"] if progress else {})
+        after = progress["last_pk"] if progress else None
+        for chunk in self.iter_chunks(after):
+            for row in self.check_chunk(chunk, stats):
+                writer.write(row)
+            self.save_checkpoint(chunk[-1].pk, stats)
+        self.clear_checkpoint()
+        return stats
@@ -0,0 +1,282 @@
+"""
+Refunding many PayU payments at once, e.g. after an event was cancelled.
+
+:class:`BulkRefunder` streams payments from a queryset or from a list of
+their ids, refunds them concurrently within a rate limit and records the
+outcome for every payment in a progress file. Each refund carries an
+``extRefundId`` derived from the payment, so a refund repeated after a crash or
+a lost response is recognized instead of being made twice.
+"""
+import json
+import logging
+import os
+from collections import Counter
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import swapper
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import QuerySet
+from django_fsm import can_proceed
+from getpaid.exceptions import GetPaidException, RefundFailure
+from getpaid.types import PaymentStatus as ps
+
+from .concurrency import RateLimiter, bounded_map
+
+logger = logging.getLogger(__name__)
+
+
+class BulkRefunder:
+    """
+    :param backend: Payment backend of refunded payments
+    :param chunk_size: Payments loaded from database at once
+    :param max_workers: Maximum number of concurrent PayU calls
+    :param rate: Limit of PayU calls per second
+    :param description: Refund description passed to PayU
+    :param prefix: Prefix of ``extRefundId``, telling apart refund batches
+        of the same payments
+    :param progress: Path of JSON Lines file recording outcome of every payment
+    :param dry_run: Only report payments that would be refunded
+    """
+
+    refundable_statuses = (ps.PAID, ps.PARTIAL)
+
+    def __init__(
+        self,
+        backend: str = "getpaid_payu",
+        chunk_size: int = 500,
+        max_workers: int = 10,
+        rate: Optional[float] = None,
+        description: Optional[str] = None,
+        prefix: str = "refund",
+        progress: Optional[str] = None,
+        dry_run: bool = False,
+    ):
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate, burst=max_workers) if rate else None
+        self.description = description
+        self.prefix = prefix
+        self.progress = progress
+        self.dry_run = dry_run
+
+    def get_queryset(self):
+        Payment = swapper.load_model("getpaid", "Payment")
+        return Payment.objects.filter(
+            backend=self.backend, status__in=self.refundable_statuses
+        ).exclude(external_id="")
+
+    def get_ext_refund_id(self, payment) -> str:
+        return f"{self.prefix}-{payment.pk}"
+
+    # Progress
+
+    def load_progress(self) -> Set[str]:
+        """
+        Return ids of payments refunded according to the progress file.
+        """
+        done = set()
+        if not self.progress or not os.path.exists(self.progress):
+            return done
+        with open(self.progress) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:  # line cut short by an interruption
+                    continue
+                if row.get("status") == "refunded":
+                    done.add(row["payment_id"])
+        return done
+
+    def open_progress(self) -> Optional[IO[str]]:
+        if not self.progress:
+            return None
+        return open(self.progress, "a")
+
+    def record(self, stream: Optional[IO[str]], row: Dict) -> None:
+        if row["status"] == "failed":
+            logger.warning(
+                f"Refund of payment {row['payment_id']} failed: {row['error']}"
+            )
+        if stream is not None:
+            stream.write(json.dumps(row, default=str) + "\n")
+            stream.flush()
+
+    # Refunding
+
+    def iter_chunks(
+        self, payments: Optional[Iterable] = None
+    ) -> Iterator[List[Tuple[str, Optional[object]]]]:
+        """
+        Yield ``(payment_id, payment)`` pairs in chunks, streaming payments
+        from the database. ``payments`` may be a queryset or an iterable of
+        payment ids; ``payment`` is ``None`` for ids not found.
+        """
+        if payments is None:
+            payments = self.get_queryset()
+        if isinstance(payments, QuerySet):
+            iterator = payments.order_by("pk").iterator(chunk_size=self.chunk_size)
+            while True:
+                chunk = list(islice(iterator, self.chunk_size))
+                if not chunk:
+                    return
+                yield [(str(payment.pk), payment) for payment in chunk]
+
+        Payment = swapper.load_model("getpaid", "Payment")
+        ids = (str(pk).strip() for pk in payments)
+        ids = (pk for pk in ids if pk)
+        while True:
+            chunk_ids = list(islice(ids, self.chunk_size))
+            if not chunk_ids:
+                return
+            pks = [self._normalize_pk(Payment, pk) for pk in chunk_ids]
+            found = {
+                str(payment.pk): payment
+                for payment in Payment.objects.filter(pk__in=[pk for pk in pks if pk])
+            }
+            yield [(pk or raw, found.get(pk)) for raw, pk in zip(chunk_ids, pks)]
+
+    @staticmethod
+    def _normalize_pk(model, pk: str) -> Optional[str]:
+        try:
+            return str(model._meta.pk.to_python(pk))
+        except ValidationError:
+            return None
+
+    def skip_reason(self, payment, done: Set[str]) -> Optional[str]:
+        if payment is None:
+            return "not found"
+        if str(payment.pk) in done:
+            return "already refunded"
+        if payment.backend != self.backend or not payment.external_id:
+            return "not a PayU payment"
+        if payment.status not in self.refundable_statuses:
+            return f"status is {payment.status}"
+        return None
+
+    def issue(self, payment) -> Dict:
+        """
+        Refund the payment in full and return PayU's refund record.
+        """
+        client = payment.processor.client
+        ext_refund_id = self.get_ext_refund_id(payment)
+        try:
+            return client.refund(
+                payment.external_id,
+                description=self.description,
+                ext_refund_id=ext_refund_id,
+            )["refund"]
+        except RefundFailure:
+            # PayU rejects an extRefundId it has seen, e.g. when an earlier
+            # attempt succeeded but its response was lost.
+            refund = self.find_refund(client, payment.external_id, ext_refund_id)
+            if refund is None:
+                raise
+            return refund
+
+    @staticmethod
+    def find_refund(client, order_id: str, ext_refund_id: str) -> Optional[Dict]:
+        try:
+            refunds = client.get_refunds(order_id).get("refunds", [])
+        except GetPaidException:
+            return None
+        for refund in refunds:
+            if refund.get("extRefundId") == ext_refund_id:
+                return refund
+        return None
+
+    def mark_refund_started(self, payment, refund: Dict) -> bool:
+        """
+        Run ``start_refund`` transition of the payment, locked, unless it
+        changed meanwhile. The refund was already made, so it is passed to
+        the processor instead of calling PayU again.
+        """
+        with transaction.atomic():
+            payment = (
+                type(payment)
+                .objects.select_for_update()
+                .filter(pk=payment.pk, status__in=self.refundable_statuses)
+                .first()
+            )
+            if payment is None or not can_proceed(payment.start_refund):
+                return False
+            payment.start_refund(amount=refund.get("amount") or None, refund=refund)
+            payment.save()
+        return True
+
+    def refund_chunk(
+        self, chunk: List, done: Set[str], stats: Counter
+    ) -> Iterator[Dict]:
+        """
+        Yield progress rows of the chunk's payments, refunding those that
+        can be refunded.
+        """
+        todo = []
+        for payment_id, payment in chunk:
+            row = {
+                "payment_id": payment_id,
+                "external_id": getattr(payment, "external_id", ""),
+                "ext_refund_id": "",
+                "refund_id": "",
+                "amount": "",
+                "status": "skipped",
+                "error": self.skip_reason(payment, done) or "",
+            }
+            if row["error"]:
+                stats["skipped"] += 1
+                yield row
+            elif self.dry_run:
+                stats["refundable"] += 1
+                yield dict(row, status="refundable")
+            else:
+                payment.processor  # build processor and client outside worker threads
+                todo.append((payment, row))
+        if not todo:
+            return
+
+        refunded = False
+        for (payment, row), refund, exception in bounded_map(
+            lambda item: self.issue(item[0]), todo, self.max_workers, self.rate_limiter
+        ):
+            row["ext_refund_id"] = self.get_ext_refund_id(payment)
+            if exception is not None:
+                stats["failed"] += 1
+                row["status"] = "failed"
+                row["error"] = str(exception) or type(exception).__name__
+                yield row
+                continue
+            refunded = True
+            stats["refunded"] += 1
+            row["status"] = "refunded"
+            row["refund_id"] = refund.get("refundId", "")
+            row["amount"] = refund.get("amount", "")
+            try:
+                if not self.mark_refund_started(payment, refund):
+                    row["error"] = "payment status changed meanwhile"
+            except Exception as e:  # refund was made, keep going with the others
+                logger.exception(f"Cannot mark refund of payment {payment.pk}")
+                row["error"] = str(e) or type(e).__name__
+            yield row
+        if refunded:
+            todo[0][0].processor.invalidate_shop_info()
+
+    def run(self, payments: Optional[Iterable] = None) -> Counter:
+        """
+        Refund given payments, or all refundable ones by default.
+        Payments recorded as refunded in the progress file are skipped,
+        so an interrupted run can be simply started again.
+        """
+        done = self.load_progress()
+        stats = Counter()
+        stream = self.open_progress()
+        try:
+            for chunk in self.iter_chunks(payments):
+                for row in self.refund_chunk(chunk, done, stats):
+                    self.record(stream, row)
+                logger.info(f"Bulk refund progress: {dict(stats)}")
+        finally:
+            if stream is not None:
+                stream.close()
+        return stats
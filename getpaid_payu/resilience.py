@@ -0,0 +1,167 @@
+"""
+Retries and circuit breaking of PayU API calls.
+
+:class:`RetryPolicy` decides which failed attempts are repeated and how long
+to wait before that. :class:`CircuitBreaker` stops calling PayU for a while
+after consecutive failed calls, so that workers fail fast instead of piling
+up on timeouts while PayU is down.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from getpaid.exceptions import CommunicationError
+
+logger = logging.getLogger(__name__)
+
+#: Statuses worth retrying: throttling and server-side errors
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """
+    PayU was not called because the circuit breaker is open.
+    """
+
+
+class OutcomeUnknown(CommunicationError):
+    """
+    A request failed and it could not be checked whether PayU carried it out.
+    Unlike the usual failure it does not mean the operation did not happen.
+    """
+
+
+class RetryPolicy:
+    """
+    Retry transient failures with exponential backoff and full jitter.
+
+    :param retries: Retries after the first attempt
+    :param backoff: Upper bound of the first delay in seconds, doubled
+        with every retry
+    :param max_backoff: Upper bound of any delay, including ``Retry-After``
+    :param statuses: Response statuses treated as transient
+    """
+
+    def __init__(
+        self,
+        retries: int = 2,
+        backoff: float = 0.2,
+        max_backoff: float = 5.0,
+        statuses: Tuple[int, ...] = TRANSIENT_STATUSES,
+        random: Callable[[], float] = random.random,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.random = random
+
+    def is_transient(self, status_code: Optional[int]) -> bool:
+        """
+        Tell whether an attempt failed for a reason that may go away.
+        ``None`` stands for connection errors and timeouts.
+        """
+        return status_code is None or status_code in self.statuses
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """
+        Seconds to wait before retry number ``attempt + 1``.
+        """
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.max_backoff)
+            except ValueError:
+                pass
+        return self.random() * min(self.max_backoff, self.backoff * 2 ** attempt)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failures circuit breaker, safe to share between threads.
+
+    After ``failure_threshold`` failed calls in a row the circuit opens and
+    calls are refused for ``reset_timeout`` seconds. Then a single trial call
+    is let through: its success closes the circuit, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self._opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return self.CLOSED
+            if self.clock() - self._opened_at < self.reset_timeout:
+                return self.OPEN
+            return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """
+        Tell whether a call may be made now.
+        """
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return True
+            now = self.clock()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            # A trial that never reported back does not block the circuit forever.
+            if (
+                self._trial_started is None
+                or now - self._trial_started >= self.reset_timeout
+            ):
+                self._trial_started = now
+                return True
+            return False
+
+    def record(self, success: bool) -> None:
+        """
+        Report the outcome of an allowed call.
+        """
+        with self._lock:
+            if success:
+                self.failures = 0
+                self._opened_at = self._trial_started = None
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(
+                        f"PayU circuit breaker opened after {self.failures} failures"
+                    )
+                self._opened_at = self.clock()
+                self._trial_started = None
+
+
+_breakers: Dict[Tuple, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(key: Hashable, **options) -> CircuitBreaker:
+    """
+    Return process-wide breaker for given key (e.g. API URL), creating it
+    on first use, so that all clients talking to one API share its state.
+    """
+    key = (key, tuple(sorted(options.items())))
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(**options)
+        return _breakers[key]
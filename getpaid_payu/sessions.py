@@ -0,0 +1,75 @@
+"""
+Pooled HTTP sessions shared by PayU clients.
+
+Reusing a :class:`requests.Session` keeps TCP/TLS connections alive between
+API calls, so only the first request to PayU pays for the handshake.
+"""
+import asyncio
+import threading
+import weakref
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 10
+#: (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+_sessions: Dict[int, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def create_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Build a session keeping up to ``pool_size`` connections per host.
+    Cookies are ignored so that concurrent calls cannot affect each other.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_session(pool_size: int = DEFAULT_POOL_SIZE) -> requests.Session:
+    """
+    Return process-wide session for given pool size, creating it on first use.
+    """
+    with _sessions_lock:
+        if pool_size not in _sessions:
+            _sessions[pool_size] = create_session(pool_size)
+        return _sessions[pool_size]
+
+
+_async_sessions = weakref.WeakKeyDictionary()
+
+
+def create_async_session(pool_size: int = DEFAULT_POOL_SIZE):
+    """
+    Build ``httpx.AsyncClient`` keeping up to ``pool_size`` connections alive.
+    Like :func:`create_session` it ignores cookies.
+    Requires ``httpx`` (``pip install django-getpaid-payu[async]``).
+    """
+    import httpx
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=pool_size, max_keepalive_connections=pool_size
+        ),
+        cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+    )
+
+
+def get_async_session(pool_size: int = DEFAULT_POOL_SIZE):
+    """
+    Return session shared within the running event loop. Connections cannot
+    be shared between loops, so each loop gets its own pool.
+    """
+    loop = asyncio.get_running_loop()
+    sessions = _async_sessions.setdefault(loop, {})
+    if pool_size not in sessions:
+        sessions[pool_size] = create_async_session(pool_size)
+    return sessions[pool_size]
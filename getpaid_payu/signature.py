@@ -0,0 +1,92 @@
+"""
+Signing of PayU forms and verification of PayU notifications.
+"""
+import hashlib
+import hmac
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict
+
+from django.utils.http import urlencode
+
+#: Hash constructors of algorithms used by PayU, by name without dashes
+HASHERS = {
+    "MD5": hashlib.md5,
+    "SHA": hashlib.sha1,
+    "SHA1": hashlib.sha1,
+    "SHA256": hashlib.sha256,
+    "SHA384": hashlib.sha384,
+    "SHA512": hashlib.sha512,
+}
+
+
+def get_hasher(algorithm: str) -> Callable:
+    """
+    Return hash constructor for PayU algorithm name, e.g. ``SHA-256``.
+
+    :raises ValueError: for algorithms PayU does not use
+    """
+    try:
+        return HASHERS[algorithm.replace("-", "").upper()]
+    except KeyError:
+        raise ValueError(f"Unsupported algorithm: {algorithm}") from None
+
+
+def parse_signature_header(header: str) -> Dict[str, str]:
+    """
+    Parse ``OpenPayu-Signature`` header into a dict.
+    """
+    parsed = {}
+    for part in header.split(";"):
+        name, _, value = part.partition("=")
+        parsed[name.strip()] = value.strip()
+    return parsed
+
+
+class SignatureVerifier:
+    """
+    Signs and verifies PayU messages with POS's ``second_key``.
+
+    Hashes are computed from raw bytes followed by the key, without building
+    intermediate strings, and compared in constant time.
+    """
+
+    def __init__(self, second_key: str, pos_id=None):
+        self.key = str(second_key).encode("utf-8")
+        self.pos_id = pos_id
+
+    def digest(self, data: bytes, algorithm: str = "MD5") -> str:
+        hasher = get_hasher(algorithm)(data)
+        hasher.update(self.key)
+        return hasher.hexdigest()
+
+    def verify(self, body: bytes, header: str) -> bool:
+        """
+        Check ``OpenPayu-Signature`` header of a notification against its body.
+        """
+        parsed = parse_signature_header(header)
+        signature = parsed.get("signature")
+        if not signature:
+            return False
+        try:
+            expected = self.digest(body, parsed.get("algorithm") or "MD5")
+            signature = signature.encode("ascii")
+        except ValueError:  # including UnicodeEncodeError
+            return False
+        return hmac.compare_digest(expected.encode("ascii"), signature)
+
+    def sign_form(self, data: dict, algorithm: str = "SHA-256") -> str:
+        """
+        Return ``OpenPayu-Signature`` value for POST form data.
+        """
+        encoded = urlencode(OrderedDict(sorted(data.items())))
+        signature = self.digest(f"{encoded}&".encode("ascii"), algorithm)
+        return f"signature={signature};algorithm={algorithm};sender={self.pos_id}"
+
+
+@lru_cache(maxsize=32)
+def get_verifier(second_key: str, pos_id=None) -> SignatureVerifier:
+    """
+    Return verifier shared by all users of given configuration.
+    """
+    return SignatureVerifier(second_key, pos_id)
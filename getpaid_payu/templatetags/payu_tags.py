@@ -0,0 +1,33 @@
+import logging
+
+from django import template
+from getpaid.exceptions import GetPaidException
+
+from getpaid_payu.processor import PaymentProcessor
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+@register.simple_tag
+def payu_paymethods(lang=None, amount=None, pos=None):
+    """
+    Enabled PayU payment methods, from cache whenever possible::
+
+        {% load payu_tags %}
+        {% payu_paymethods lang="pl" amount=order.total as methods %}
+        {% for method in methods %}
+            <img src="{{ method.brandImageUrl }}" alt="{{ method.name }}">
+        {% endfor %}
+
+    Methods of the default POS are given unless ``pos`` name is passed.
+    Empty if they cannot be fetched, so the page renders while PayU is down.
+    """
+    try:
+        return PaymentProcessor.get_enabled_paymethods(
+            lang=lang, amount=amount, pos=pos
+        )
+    except GetPaidException as e:
+        logger.warning(f"Cannot get PayU payment methods: {e}")
+        return []
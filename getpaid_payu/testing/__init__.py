@@ -0,0 +1,7 @@
+"""
+Tools for load testing the plugin against a simulated PayU.
+
+They are not part of the built distribution; use them from a source checkout.
+Add ``"getpaid_payu.testing"`` to ``INSTALLED_APPS`` for ``payu_loadtest``.
+"""
+default_app_config = "getpaid_payu.testing.apps.PayUTestingAppConfig"
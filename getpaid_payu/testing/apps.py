@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class PayUTestingAppConfig(AppConfig):
+    name = "getpaid_payu.testing"
+    label = "getpaid_payu_testing"
+    verbose_name = "PayU load testing"
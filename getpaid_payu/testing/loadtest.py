@@ -0,0 +1,247 @@
+"""
+End-to-end load test of checkout and notification handling.
+
+:class:`LoadTest` creates payments through ``prepare_transaction()`` against
+:mod:`getpaid_payu.testing.simulator` (or any PayU-compatible API) and then replays
+PayU's notification sequences for them concurrently to
+:class:`~getpaid_payu.views.CallbackView`. Every phase reports throughput,
+latency percentiles, database queries and time spent waiting for row locks.
+Run it with ``manage.py payu_loadtest`` against a disposable database.
+"""
+import json
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+import swapper
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from ..concurrency import bounded_map
+from ..processor import PaymentProcessor
+from ..signature import get_verifier
+from ..types import OrderStatus
+from ..views import CallbackView
+
+DEFAULT_SEQUENCE = (OrderStatus.PENDING, OrderStatus.COMPLETED)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of sorted ``values``.
+    """
+    if not values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(values)), 1)
+    return values[rank - 1]
+
+
+class PhaseStats:
+    """
+    Measurements of one load test phase.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies = []
+        self.queries = []
+        self.lock_waits = []
+        self.errors = Counter()
+        self.elapsed = 0.0
+        self.results = []
+        self._lock = threading.Lock()
+
+    def add(self, latency: float, queries: int, lock_wait: float, error=None):
+        with self._lock:
+            self.latencies.append(latency)
+            self.queries.append(queries)
+            self.lock_waits.append(lock_wait)
+            if error is not None:
+                self.errors[error] += 1
+
+    def summary(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "count": count,
+            "errors": sum(self.errors.values()),
+            "elapsed": self.elapsed,
+            "throughput": count / self.elapsed if self.elapsed else 0.0,
+            "p50": percentile(latencies, 0.5),
+            "p90": percentile(latencies, 0.9),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+            "queries": sum(self.queries) / count if count else 0.0,
+            "lock_wait": sum(self.lock_waits),
+            "lock_wait_max": max(self.lock_waits, default=0.0),
+        }
+
+
+@contextmanager
+def measure_queries():
+    """
+    Count queries of current thread's connection and time spent in
+    ``SELECT ... FOR UPDATE``, which is where row lock waits happen.
+    """
+    result = {"queries": 0, "lock_wait": 0.0}
+
+    def timed(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if "FOR UPDATE" in sql:
+                result["lock_wait"] += time.perf_counter() - start
+
+    with connection.execute_wrapper(timed):
+        with CaptureQueriesContext(connection) as captured:
+            yield result
+    result["queries"] = len(captured.captured_queries)
+
+
+class LoadTest:
+    """
+    :param api_url: URL of PayU-compatible API (e.g. the simulator)
+    :param orders: Number of payments to create
+    :param workers: Number of concurrent checkouts and notifications
+    :param sequence: Order statuses notified for every payment, in order
+    :param repeat: Deliveries of each notification, like PayU's retries
+    :param order_factory: Callable returning a saved Order,
+        ``Order.objects.create`` by default
+    :param currency: Currency of created payments
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        orders: int = 100,
+        workers: int = 10,
+        sequence: Iterable[str] = DEFAULT_SEQUENCE,
+        repeat: int = 1,
+        order_factory: Optional[Callable] = None,
+        currency: str = "PLN",
+        backend: str = "getpaid_payu",
+    ):
+        self.api_url = api_url
+        self.orders = orders
+        self.workers = workers
+        self.sequence = [OrderStatus(status) for status in sequence]
+        self.repeat = repeat
+        self.order_factory = (
+            order_factory or swapper.load_model("getpaid", "Order").objects.create
+        )
+        self.currency = currency
+        self.backend = backend
+        self.rf = RequestFactory()
+        self.verifier = get_verifier(
+            PaymentProcessor.get_backend_setting("second_key"),
+            PaymentProcessor.get_backend_setting("pos_id"),
+        )
+        self.view = CallbackView.as_view()
+
+    def get_backend_settings(self) -> dict:
+        """
+        Return all backends' settings with this one pointed at ``api_url``.
+        """
+        all_settings = dict(getattr(settings, "GETPAID_BACKEND_SETTINGS", {}))
+        backend_settings = dict(all_settings.get(self.backend, {}))
+        backend_settings.update(
+            sandbox_url=self.api_url, production_url=self.api_url, paywall_method="REST"
+        )
+        all_settings[self.backend] = backend_settings
+        return all_settings
+
+    def run_phase(self, name: str, func: Callable, items: Iterable) -> PhaseStats:
+        stats = PhaseStats(name)
+
+        def measured(item):
+            start = time.perf_counter()
+            error = None
+            try:
+                with measure_queries() as measured_queries:
+                    try:
+                        result = func(item)
+                    except Exception as e:
+                        error = type(e).__name__
+                        result = None
+                stats.add(
+                    time.perf_counter() - start,
+                    measured_queries["queries"],
+                    measured_queries["lock_wait"],
+                    error,
+                )
+                return result
+            finally:
+                # Pool threads exit without Django closing their connections.
+                connection.close()
+
+        start = time.perf_counter()
+        for item, result, exception in bounded_map(measured, items, self.workers):
+            if result is not None:
+                stats.results.append(result)
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    def checkout(self, index: int):
+        Payment = swapper.load_model("getpaid", "Payment")
+        order = self.order_factory()
+        payment = Payment.objects.create(
+            order=order,
+            amount_required=order.get_total_amount(),
+            currency=self.currency,
+            description=order.get_description(),
+            backend=self.backend,
+        )
+        request = self.rf.get("/", REMOTE_ADDR="127.0.0.1")
+        response = payment.prepare_transaction(request)
+        if response.status_code != 302 or not payment.external_id:
+            raise RuntimeError("Checkout failed")
+        return payment
+
+    def notifications(self, payments: List) -> Iterable[bytes]:
+        """
+        Yield encoded notifications, grouped by status so that each step
+        of the sequence is replayed for all payments at once.
+        """
+        for status in self.sequence:
+            for payment in payments:
+                body = json.dumps(
+                    {
+                        "order": {
+                            "orderId": payment.external_id,
+                            "extOrderId": payment.get_unique_id(),
+                            "currencyCode": payment.currency,
+                            "totalAmount": str(int(payment.amount_required * 100)),
+                            "status": status.value,
+                        }
+                    }
+                ).encode("utf-8")
+                for _ in range(self.repeat):
+                    yield body
+
+    def notify(self, body: bytes):
+        signature = self.verifier.digest(body, "MD5")
+        request = self.rf.post(
+            "/",
+            data=body,
+            content_type="application/json",
+            HTTP_OPENPAYU_SIGNATURE=f"sender=checkout;signature={signature};"
+            f"algorithm=MD5",
+        )
+        response = self.view(request)
+        if response.status_code != 200:
+            raise RuntimeError(f"Callback answered {response.status_code}")
+        return response.status_code
+
+    def run(self) -> List[PhaseStats]:
+        with override_settings(GETPAID_BACKEND_SETTINGS=self.get_backend_settings()):
+            checkout = self.run_phase("checkout", self.checkout, range(self.orders))
+            callbacks = self.run_phase(
+                "notifications", self.notify, self.notifications(checkout.results)
+            )
+        return [checkout, callbacks]
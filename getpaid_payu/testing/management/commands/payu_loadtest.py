@@ -0,0 +1,103 @@
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+from getpaid_payu.processor import PaymentProcessor
+from getpaid_payu.testing.loadtest import DEFAULT_SEQUENCE, LoadTest
+from getpaid_payu.testing.simulator import PayUSimulator, serve_in_thread
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test checkout and PayU notification handling. "
+        "Creates real payments, use a disposable database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=100)
+        parser.add_argument(
+            "--workers", type=int, default=10, help="Concurrent requests."
+        )
+        parser.add_argument(
+            "--sequence",
+            default=",".join(status.value for status in DEFAULT_SEQUENCE),
+            help="Comma separated order statuses notified for every payment.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=1,
+            help="Deliveries of each notification, like PayU's retries.",
+        )
+        parser.add_argument(
+            "--order-factory",
+            default=None,
+            metavar="DOTTED_PATH",
+            help="Callable returning a saved Order, e.g. a factory_boy factory. "
+            "By default Order.objects.create() is used.",
+        )
+        parser.add_argument("--currency", default="PLN")
+        parser.add_argument(
+            "--api-url",
+            default=None,
+            help="PayU-compatible API to use instead of built-in simulator.",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0,
+            metavar="SECONDS",
+            help="Latency of built-in simulator.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0,
+            help="Error rate of built-in simulator.",
+        )
+
+    def handle(self, *args, **options):
+        server = simulator = None
+        api_url = options["api_url"]
+        if api_url is None:
+            simulator = PayUSimulator(
+                second_key=PaymentProcessor.get_backend_setting("second_key"),
+                latency=options["latency"],
+                error_rate=options["error_rate"],
+            )
+            server = serve_in_thread(simulator)
+            api_url = f"http://127.0.0.1:{server.server_port}/"
+
+        order_factory = options["order_factory"]
+        load_test = LoadTest(
+            api_url=api_url,
+            orders=options["orders"],
+            workers=options["workers"],
+            sequence=options["sequence"].split(","),
+            repeat=options["repeat"],
+            order_factory=import_string(order_factory) if order_factory else None,
+            currency=options["currency"],
+        )
+        try:
+            phases = load_test.run()
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+                simulator.close()
+
+        self.stdout.write(
+            f"{'phase':<14} {'count':>6} {'errors':>6} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+            f"{'queries':>7} {'lock ms':>8}"
+        )
+        for phase in phases:
+            s = phase.summary()
+            self.stdout.write(
+                f"{phase.name:<14} {s['count']:>6} {s['errors']:>6} "
+                f"{s['throughput']:>8.1f} {s['p50'] * 1000:>8.2f} "
+                f"{s['p90'] * 1000:>8.2f} {s['p99'] * 1000:>8.2f} "
+                f"{s['max'] * 1000:>8.2f} {s['queries']:>7.1f} "
+                f"{s['lock_wait'] * 1000:>8.2f}"
+            )
+            for error, count in phase.errors.items():
+                self.stdout.write(f"  {error}: {count}")
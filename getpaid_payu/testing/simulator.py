@@ -0,0 +1,633 @@
+"""
+PayU-compatible REST API simulator for local load testing.
+
+Runs PayU's OAuth, order, refund and shop endpoints on in-memory state with
+configurable latency and error rates, and sends signed notifications back
+to ``notifyUrl`` of each order at a controllable rate. Point the plugin at
+it with ``sandbox_url`` (or ``production_url``) backend setting::
+
+    python -m getpaid_payu.testing.simulator --port 8765 --notify-rate 200
+
+    GETPAID_BACKEND_SETTINGS = {
+        "getpaid_payu": {
+            # ...
+            "sandbox_url": "http://127.0.0.1:8765/",
+        },
+    }
+
+Only the standard library and ``requests`` are needed. Django is not set up,
+so the simulator can run next to the project under test.
+"""
+import argparse
+import heapq
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from socketserver import ThreadingMixIn
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+from ..signature import SignatureVerifier
+from ..types import OrderStatus, RefundStatus
+
+logger = logging.getLogger(__name__)
+
+ORDER_URL = re.compile(r"^/api/v2_1/orders/(?P<order_id>[^/]+)$")
+EXT_ORDER_URL = re.compile(r"^/api/v2_1/orders/ext/(?P<ext_order_id>[^/]+)$")
+ORDER_STATUS_URL = re.compile(r"^/api/v2_1/orders/(?P<order_id>[^/]+)/status$")
+TRANSACTIONS_URL = re.compile(r"^/api/v2_1/orders/(?P<order_id>[^/]+)/transactions$")
+REFUNDS_URL = re.compile(r"^/api/v2_1/orders/(?P<order_id>[^/]+)/refunds$")
+SHOP_URL = re.compile(r"^/api/v2_1/shops/(?P<shop_id>[^/]+)$")
+
+STATUS_REASONS = {
+    200: "OK",
+    201: "Created",
+    302: "Found",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _success(description: str = "Request processing successful") -> dict:
+    return {"statusCode": "SUCCESS", "statusDesc": description}
+
+
+class Notifier:
+    """
+    Sends signed notifications when they are due, at most ``rate`` per second,
+    retrying failed deliveries like PayU does.
+
+    :param rate: Maximum notifications sent per second, ``None`` for no limit
+    :param workers: Number of notifications delivered concurrently
+    :param max_attempts: Deliveries of a notification before giving up
+    :param retry_delay: Seconds before the first retry, doubled for each next one
+    """
+
+    def __init__(
+        self,
+        verifier: SignatureVerifier,
+        rate: Optional[float] = None,
+        workers: int = 10,
+        max_attempts: int = 3,
+        retry_delay: float = 1.0,
+        timeout: float = 10.0,
+    ):
+        self.verifier = verifier
+        self.rate = rate
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.stats = Counter()
+        self.session = requests.Session()
+        self._queue = []
+        self._sequence = 0
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._running = True
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def schedule(self, url: str, data: dict, delay: float = 0, attempt: int = 1):
+        with self._condition:
+            self._sequence += 1
+            due = time.monotonic() + delay
+            heapq.heappush(self._queue, (due, self._sequence, url, data, attempt))
+            self._pending += 1
+            self._condition.notify()
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of notifications not delivered nor given up yet.
+        """
+        with self._condition:
+            return self._pending
+
+    def _record(self, event: str):
+        with self._condition:
+            self.stats[event] += 1
+
+    def _dispatch(self):
+        next_slot = time.monotonic()
+        while self._running:
+            with self._condition:
+                while self._running and (
+                    not self._queue or self._queue[0][0] > time.monotonic()
+                ):
+                    timeout = None
+                    if self._queue:
+                        timeout = self._queue[0][0] - time.monotonic()
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, _, url, data, attempt = heapq.heappop(self._queue)
+            if self.rate:
+                now = time.monotonic()
+                if next_slot > now:
+                    time.sleep(next_slot - now)
+                next_slot = max(now, next_slot) + 1 / self.rate
+            self._executor.submit(self._deliver, url, data, attempt)
+
+    def _deliver(self, url: str, data: dict, attempt: int):
+        body = json.dumps(data).encode("utf-8")
+        signature = self.verifier.digest(body, "MD5")
+        headers = {
+            "Content-Type": "application/json",
+            "OpenPayu-Signature": (
+                f"sender=checkout;signature={signature};algorithm=MD5;content=DOCUMENT"
+            ),
+        }
+        try:
+            response = self.session.post(
+                url, data=body, headers=headers, timeout=self.timeout
+            )
+            delivered = response.status_code == 200
+        except requests.RequestException:
+            delivered = False
+        if delivered:
+            self._record("delivered")
+        elif attempt < self.max_attempts:
+            self._record("retried")
+            self.schedule(
+                url, data, self.retry_delay * 2 ** (attempt - 1), attempt=attempt + 1
+            )
+        else:
+            self._record("failed")
+            logger.warning(f"Notification to {url} failed {attempt} times")
+        with self._condition:
+            self._pending -= 1
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until all scheduled notifications are delivered or given up.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+class PayUSimulator:
+    """
+    WSGI application imitating PayU REST API.
+
+    :param second_key: Key used to sign notifications
+    :param client_id: Accepted OAuth client id, ``None`` accepts any
+    :param client_secret: Accepted OAuth client secret, ``None`` accepts any
+    :param latency: Seconds added to every API response
+    :param latency_jitter: Maximal random seconds added on top of ``latency``
+    :param error_rate: Fraction of API calls answered with ``500``
+    :param notify_url: Notification URL for orders not giving ``notifyUrl``
+    :param notify_rate: Maximum notifications sent per second
+    :param notify_delay: Seconds between order status change and its notification
+    :param auto_capture: Complete paid orders, otherwise leave them
+        ``WAITING_FOR_CONFIRMATION`` until captured
+    :param cancel_rate: Fraction of orders canceled instead of paid
+    :param seed: Seed for random latency, errors and cancellations
+    """
+
+    paywall_url = "https://merch-prod.snd.payu.com/pay/"
+
+    def __init__(
+        self,
+        second_key: str,
+        client_id: Optional[str] = None,
+        client_secret: Optional[str] = None,
+        latency: float = 0,
+        latency_jitter: float = 0,
+        error_rate: float = 0,
+        notify_url: Optional[str] = None,
+        notify_rate: Optional[float] = None,
+        notify_delay: float = 0,
+        notify_workers: int = 10,
+        auto_capture: bool = True,
+        cancel_rate: float = 0,
+        seed: Optional[int] = None,
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.notify_url = notify_url
+        self.notify_delay = notify_delay
+        self.auto_capture = auto_capture
+        self.cancel_rate = cancel_rate
+        self.random = random.Random(seed)
+        self.notifier = Notifier(
+            SignatureVerifier(second_key), rate=notify_rate, workers=notify_workers
+        )
+        self.orders = {}
+        self.ext_orders = {}  #: extOrderId -> orderId
+        self.tokens = set()
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    # WSGI
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        path = environ.get("PATH_INFO", "/")
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length) if length else b""
+        with self._lock:
+            self.stats["requests"] += 1
+            failing = self.random.random() < self.error_rate
+            delay = self.latency + self.random.random() * self.latency_jitter
+        if delay:
+            time.sleep(delay)
+        if failing:
+            with self._lock:
+                self.stats["errors"] += 1
+            status, data = 500, {"status": {"statusCode": "ERROR_INTERNAL"}}
+        else:
+            status, data = self.dispatch(method, path, environ, body)
+        payload = json.dumps(data).encode("utf-8")
+        headers = [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(payload))),
+        ]
+        if status == 302:
+            headers.append(("Location", data["redirectUri"]))
+        start_response(f"{status} {STATUS_REASONS[status]}", headers)
+        return [payload]
+
+    def dispatch(
+        self, method: str, path: str, environ, body: bytes
+    ) -> Tuple[int, dict]:
+        if path == "/pl/standard/user/oauth/authorize":
+            if method != "POST":
+                return 405, {}
+            return self.authorize(parse_qs(body.decode("utf-8")))
+        if not self.is_authorized(environ.get("HTTP_AUTHORIZATION", "")):
+            return 401, {"error": "invalid_token"}
+
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"status": {"statusCode": "ERROR_SYNTAX"}}
+        if path == "/api/v2_1/orders" and method == "POST":
+            return self.create_order(data)
+        match = EXT_ORDER_URL.match(path)
+        if match and method == "GET":
+            return self.order_by_ext_id(match["ext_order_id"])
+        match = ORDER_URL.match(path)
+        if match and method == "GET":
+            return self.order_info(match["order_id"])
+        if match and method == "DELETE":
+            return self.cancel_order(match["order_id"])
+        match = ORDER_STATUS_URL.match(path)
+        if match and method == "PUT":
+            return self.update_status(match["order_id"], data)
+        match = TRANSACTIONS_URL.match(path)
+        if match and method == "GET":
+            return self.order_transactions(match["order_id"])
+        match = REFUNDS_URL.match(path)
+        if match and method == "POST":
+            return self.create_refund(match["order_id"], data)
+        if match and method == "GET":
+            return self.refunds(match["order_id"])
+        match = SHOP_URL.match(path)
+        if match and method == "GET":
+            return self.shop_info(match["shop_id"])
+        return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+
+    # API
+
+    def authorize(self, form: dict) -> Tuple[int, dict]:
+        client_id = form.get("client_id", [None])[0]
+        client_secret = form.get("client_secret", [None])[0]
+        if (self.client_id is not None and client_id != str(self.client_id)) or (
+            self.client_secret is not None and client_secret != self.client_secret
+        ):
+            return 401, {"error": "invalid_client"}
+        token = str(uuid.uuid4())
+        with self._lock:
+            self.tokens.add(f"Bearer {token}")
+        return (
+            200,
+            {
+                "access_token": token,
+                "token_type": "bearer",
+                "expires_in": 43199,
+                "grant_type": "client_credentials",
+            },
+        )
+
+    def is_authorized(self, header: str) -> bool:
+        with self._lock:
+            return header in self.tokens
+
+    def create_order(self, data: dict) -> Tuple[int, dict]:
+        order_id = (
+            f"{uuid.uuid4().hex[:10].upper()}{time.strftime('%y%m%d')}GUEST000P01"
+        )
+        order = {
+            "orderId": order_id,
+            "extOrderId": data.get("extOrderId"),
+            "orderCreateDate": _now(),
+            "notifyUrl": data.get("notifyUrl") or self.notify_url,
+            "customerIp": data.get("customerIp"),
+            "merchantPosId": data.get("merchantPosId"),
+            "description": data.get("description"),
+            "currencyCode": data.get("currencyCode"),
+            "totalAmount": data.get("totalAmount"),
+            "products": data.get("products", []),
+            "status": OrderStatus.NEW.value,
+        }
+        if data.get("buyer"):
+            order["buyer"] = data["buyer"]
+        with self._lock:
+            if order["extOrderId"] in self.ext_orders:
+                return 400, {"status": {"statusCode": "ERROR_ORDER_NOT_UNIQUE"}}
+            if order["extOrderId"]:
+                self.ext_orders[order["extOrderId"]] = order_id
+            self.orders[order_id] = {"order": order, "refunds": []}
+            self.stats["orders"] += 1
+            canceled = self.random.random() < self.cancel_rate
+        self.set_status(order_id, OrderStatus.PENDING)
+        if canceled:
+            self.set_status(order_id, OrderStatus.CANCELED)
+        elif self.auto_capture:
+            self.set_status(order_id, OrderStatus.COMPLETED)
+        else:
+            self.set_status(order_id, OrderStatus.WAITING_FOR_CONFIRMATION)
+        return (
+            302,
+            {
+                "status": _success(),
+                "redirectUri": f"{self.paywall_url}?orderId={order_id}",
+                "orderId": order_id,
+                "extOrderId": order["extOrderId"],
+            },
+        )
+
+    def set_status(self, order_id: str, status: OrderStatus):
+        with self._lock:
+            order = self.orders[order_id]["order"]
+            order["status"] = status.value
+            notification = {
+                "order": dict(order),
+                "localReceiptDateTime": _now(),
+                "properties": [{"name": "PAYMENT_ID", "value": order_id[:9]}],
+            }
+        self.notify(order.get("notifyUrl"), notification)
+
+    def notify(self, url: Optional[str], notification: dict):
+        if url:
+            self.notifier.schedule(url, notification, self.notify_delay)
+
+    def order_info(self, order_id: str) -> Tuple[int, dict]:
+        with self._lock:
+            entry = self.orders.get(order_id)
+            if entry is None:
+                return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+            return 200, {"orders": [dict(entry["order"])], "status": _success()}
+
+    def order_by_ext_id(self, ext_order_id: str) -> Tuple[int, dict]:
+        with self._lock:
+            order_id = self.ext_orders.get(ext_order_id)
+        if order_id is None:
+            return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+        return self.order_info(order_id)
+
+    def order_transactions(self, order_id: str) -> Tuple[int, dict]:
+        with self._lock:
+            entry = self.orders.get(order_id)
+            if entry is None:
+                return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+            status = entry["order"]["status"]
+        if status in (OrderStatus.NEW, OrderStatus.PENDING):
+            return 200, {"transactions": []}
+        declined = status == OrderStatus.CANCELED
+        transaction = {
+            "payMethod": {"value": "c"},
+            "paymentFlow": "CARD",
+            "card": {
+                "cardData": {
+                    "cardNumberMasked": "543402******4014",
+                    "cardScheme": "MC",
+                    "cardProfile": "CONSUMER",
+                    "cardClassification": "DEBIT",
+                    "cardResponseCode": "051" if declined else "000",
+                    "firstTransactionId": f"{order_id[:10]}0001",
+                },
+            },
+            "resultCode": "AUT_ERROR_FUNDS" if declined else "AUT_ERROR_NO",
+        }
+        return 200, {"transactions": [transaction]}
+
+    def cancel_order(self, order_id: str) -> Tuple[int, dict]:
+        with self._lock:
+            entry = self.orders.get(order_id)
+        if entry is None:
+            return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+        self.set_status(order_id, OrderStatus.CANCELED)
+        return (
+            200,
+            {
+                "orderId": order_id,
+                "extOrderId": entry["order"]["extOrderId"],
+                "status": _success(),
+            },
+        )
+
+    def update_status(self, order_id: str, data: dict) -> Tuple[int, dict]:
+        with self._lock:
+            entry = self.orders.get(order_id)
+        if entry is None:
+            return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+        if entry["order"]["status"] != OrderStatus.WAITING_FOR_CONFIRMATION.value:
+            return 400, {"status": {"statusCode": "ERROR_ORDER_NOT_UNIQUE"}}
+        self.set_status(order_id, OrderStatus(data.get("orderStatus", "COMPLETED")))
+        return 200, {"status": _success("Status was updated")}
+
+    def create_refund(self, order_id: str, data: dict) -> Tuple[int, dict]:
+        with self._lock:
+            entry = self.orders.get(order_id)
+        if entry is None:
+            return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+        request = data.get("refund", {})
+        ext_refund_id = request.get("extRefundId")
+        refund = {
+            "refundId": str(self.random.randrange(10 ** 9, 10 ** 10)),
+            "extRefundId": ext_refund_id,
+            "amount": request.get("amount") or entry["order"]["totalAmount"],
+            "currencyCode": entry["order"]["currencyCode"],
+            "description": request.get("description"),
+            "creationDateTime": _now(),
+            "status": RefundStatus.PENDING.value,
+            "statusDateTime": _now(),
+        }
+        with self._lock:
+            if ext_refund_id is not None and any(
+                other["extRefundId"] == ext_refund_id for other in entry["refunds"]
+            ):
+                return (
+                    400,
+                    {
+                        "status": {
+                            "statusCode": "ERROR_VALUE_INVALID",
+                            "statusDesc": "Refund with given extRefundId already exists",
+                        }
+                    },
+                )
+            entry["refunds"].append(refund)
+            self.stats["refunds"] += 1
+        finalized = dict(refund, status=RefundStatus.FINALIZED.value)
+        self.notify(
+            entry["order"].get("notifyUrl"),
+            {
+                "orderId": order_id,
+                "extOrderId": entry["order"]["extOrderId"],
+                "refund": finalized,
+            },
+        )
+        return 200, {"orderId": order_id, "refund": refund, "status": _success()}
+
+    def refunds(self, order_id: str) -> Tuple[int, dict]:
+        with self._lock:
+            entry = self.orders.get(order_id)
+            if entry is None:
+                return 404, {"status": {"statusCode": "DATA_NOT_FOUND"}}
+            return 200, {"refunds": list(entry["refunds"])}
+
+    def shop_info(self, shop_id: str) -> Tuple[int, dict]:
+        return (
+            200,
+            {
+                "shopId": shop_id,
+                "name": "Simulated shop",
+                "currencyCode": "PLN",
+                "balance": {"currencyCode": "PLN", "total": "0", "available": "0"},
+            },
+        )
+
+    def close(self):
+        self.notifier.close()
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(simulator: PayUSimulator, host: str = "127.0.0.1", port: int = 8765):
+    """
+    Return threaded HTTP server for the simulator, not started yet.
+    Use ``port=0`` to pick a free port (see ``server.server_port``).
+    """
+    return make_server(
+        host,
+        port,
+        simulator,
+        server_class=ThreadingWSGIServer,
+        handler_class=QuietHandler,
+    )
+
+
+def serve_in_thread(simulator: PayUSimulator, host: str = "127.0.0.1", port: int = 0):
+    """
+    Start the simulator in a background thread and return its server.
+    Call ``server.shutdown()`` to stop it.
+    """
+    server = serve(simulator, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m getpaid_payu.testing.simulator",
+        description=__doc__.split("\n\n")[0],
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--second-key", default="b6ca15b0d1020e8094d9b5f8d163db54")
+    parser.add_argument("--client-id", default=None)
+    parser.add_argument("--client-secret", default=None)
+    parser.add_argument("--latency", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--latency-jitter", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument(
+        "--notify-url", default=None, help="Used for orders without notifyUrl."
+    )
+    parser.add_argument(
+        "--notify-rate", type=float, default=None, help="Notifications per second."
+    )
+    parser.add_argument("--notify-delay", type=float, default=0, metavar="SECONDS")
+    parser.add_argument("--notify-workers", type=int, default=10)
+    parser.add_argument(
+        "--no-auto-capture",
+        dest="auto_capture",
+        action="store_false",
+        help="Leave paid orders WAITING_FOR_CONFIRMATION until captured.",
+    )
+    parser.add_argument("--cancel-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = PayUSimulator(
+        second_key=args.second_key,
+        client_id=args.client_id,
+        client_secret=args.client_secret,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        notify_url=args.notify_url,
+        notify_rate=args.notify_rate,
+        notify_delay=args.notify_delay,
+        notify_workers=args.notify_workers,
+        auto_capture=args.auto_capture,
+        cancel_rate=args.cancel_rate,
+        seed=args.seed,
+    )
+    server = serve(simulator, args.host, args.port)
+    logger.info(f"PayU simulator listening on http://{args.host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        simulator.close()
+        logger.info(f"Simulator stats: {dict(simulator.stats)}")
+        logger.info(f"Notification stats: {dict(simulator.notifier.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+OAuth token storage shared by :class:`~getpaid_payu.client.Client` instances.
+
+PayU tokens are valid for several hours, so there is no point in authorizing
+every time a client is created. Tokens are kept in a store keyed by
+``(api_url, oauth_id)`` and refreshed lazily, only when they are about to expire.
+
+Expiry is tracked on the monotonic clock, so it is cheap to check on every call
+and not affected by wall-clock adjustments. Stores sharing tokens between
+processes convert it to a Unix timestamp and back.
+"""
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, NamedTuple, Optional, Tuple
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+#: Tokens are refreshed when they expire in less than this many seconds.
+EXPIRY_MARGIN = 5
+#: Part of token lifetime after which it is refreshed.
+DEFAULT_REFRESH_FRACTION = 0.9
+
+
+class Token(NamedTuple):
+    value: str  #: Ready to use ``Authorization`` header value
+    expires_at: float  #: Expiry time on :func:`time.monotonic` clock
+    refresh_at: float  #: Time after which the token is refreshed, same clock
+
+    @classmethod
+    def create(
+        cls,
+        value: str,
+        expires_in: float,
+        refresh_fraction: float = DEFAULT_REFRESH_FRACTION,
+    ) -> "Token":
+        """
+        Build a token valid for ``expires_in`` seconds from now, refreshed
+        after ``refresh_fraction`` of that time, but not later than
+        :data:`EXPIRY_MARGIN` seconds before it expires.
+        """
+        now = time.monotonic()
+        refresh_in = min(expires_in * refresh_fraction, expires_in - EXPIRY_MARGIN)
+        return cls(
+            value=value, expires_at=now + expires_in, refresh_at=now + refresh_in
+        )
+
+    @classmethod
+    def from_timestamps(
+        cls, value: str, expires_at: float, refresh_at: Optional[float] = None
+    ) -> "Token":
+        """
+        Build a token from Unix timestamps, e.g. read from a shared cache.
+        Entries cached before refresh time was stored lack ``refresh_at``.
+        """
+        offset = time.monotonic() - time.time()
+        if refresh_at is None:
+            refresh_at = expires_at - EXPIRY_MARGIN
+        return cls(
+            value=value, expires_at=expires_at + offset, refresh_at=refresh_at + offset
+        )
+
+    def to_timestamps(self) -> Tuple[float, float]:
+        """
+        Return Unix timestamps of expiry and refresh time.
+        """
+        offset = time.time() - time.monotonic()
+        return self.expires_at + offset, self.refresh_at + offset
+
+    def expires_in(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def is_expiring(self) -> bool:
+        return self.refresh_at <= time.monotonic()
+
+
+class BaseTokenStore(ABC):
+    """
+    Interface of token storage backends.
+
+    :meth:`refresh_lock` must guarantee that only one caller at a time
+    refreshes the token for a given key (single-flight refresh).
+    """
+
+    def __init__(self):
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def record(self, event: str) -> None:
+        """
+        Count a token event: ``hit``, ``miss`` or ``refresh``.
+        """
+        with self._stats_lock:
+            self._stats[event] += 1
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Token]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: Hashable, token: Token) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def refresh_lock(self, key: Hashable):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class LocalTokenStore(BaseTokenStore):
+    """
+    Process-wide, thread-safe in-memory token store.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._tokens: Dict[Hashable, Token] = {}
+        self._locks: Dict[Hashable, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Token]:
+        return self._tokens.get(key)
+
+    def set(self, key: Hashable, token: Token) -> None:
+        self._tokens[key] = token
+
+    def delete(self, key: Hashable) -> None:
+        self._tokens.pop(key, None)
+
+    @contextmanager
+    def refresh_lock(self, key: Hashable) -> Iterator[None]:
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
+
+    def clear(self) -> None:
+        self._tokens.clear()
+
+
+class DjangoCacheTokenStore(LocalTokenStore):
+    """
+    Token store backed by Django's cache framework, so that all workers
+    and nodes using the same cache share one token.
+
+    Refresh is guarded by a lock kept in the cache itself: the worker that
+    manages to ``add()`` the lock key authorizes, the others wait until the
+    new token shows up (or the lock times out and they try on their own).
+    Tokens are also kept in process memory to spare cache round-trips.
+    """
+
+    key_prefix = "getpaid_payu:token:"
+
+    def __init__(
+        self,
+        cache_alias: str = "default",
+        lock_timeout: float = 10,
+        poll_interval: float = 0.05,
+    ):
+        super().__init__()
+        self.cache_alias = cache_alias
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _cache_key(self, key: Hashable, suffix: str = "") -> str:
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return f"{self.key_prefix}{digest}{suffix}"
+
+    def get(self, key: Hashable) -> Optional[Token]:
+        token = super().get(key)
+        if token is not None and not token.is_expiring():
+            return token
+        cached = self.cache.get(self._cache_key(key))
+        if cached is None:
+            return None
+        token = Token.from_timestamps(*cached)
+        super().set(key, token)
+        return token
+
+    def set(self, key: Hashable, token: Token) -> None:
+        super().set(key, token)
+        self.cache.set(
+            self._cache_key(key),
+            (token.value, *token.to_timestamps()),
+            timeout=max(int(token.expires_in()), 1),
+        )
+
+    def delete(self, key: Hashable) -> None:
+        super().delete(key)
+        self.cache.delete(self._cache_key(key))
+
+    @contextmanager
+    def refresh_lock(self, key: Hashable) -> Iterator[None]:
+        with super().refresh_lock(key):
+            lock_key = self._cache_key(key, ":lock")
+            deadline = time.monotonic() + self.lock_timeout
+            acquired = self.cache.add(lock_key, 1, timeout=self.lock_timeout)
+            while not acquired and time.monotonic() < deadline:
+                token = self.get(key)
+                if token is not None and not token.is_expiring():
+                    break
+                time.sleep(self.poll_interval)
+                acquired = self.cache.add(lock_key, 1, timeout=self.lock_timeout)
+            try:
+                yield
+            finally:
+                if acquired:
+                    self.cache.delete(lock_key)
+
+    def clear(self) -> None:
+        """
+        Forget tokens kept in process memory. Shared entries expire on their own.
+        """
+        super().clear()
+
+
+#: Store used by clients that were not given one explicitly.
+default_token_store = LocalTokenStore()
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_token_store(backend: Optional[str] = None, **options) -> BaseTokenStore:
+    """
+    Return a process-wide instance of given token store class (dotted path),
+    creating it on first use. Without ``backend`` the default store is returned.
+    """
+    if not backend:
+        return default_token_store
+    key = (backend, tuple(sorted(options.items())))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = import_string(backend)(**options)
+        return _stores[key]
@@ -1,4 +1,5 @@
 from datetime import datetime
+from decimal import Decimal
 from enum import Enum, auto, unique
 from typing import Any, List, Optional, Union
 
@@ -268,6 +269,10 @@ class RefundResponse(TypedDict):
     status: OrderStatusObj
 
 
+class RefundsResponse(TypedDict):
+    refunds: List[RefundRecord]
+
+
 class BaseResponse(TypedDict):
     orderId: Union[str, int]
     extOrderId: Union[str, int]
@@ -294,3 +299,31 @@ class ChargeResponse(TypedDict):
 class RetrieveOrderInfoResponse(TypedDict):
     orders: List[OrderData]
     status: OrderStatusObj
+
+
+class PayByLinkData(TypedDict):
+    value: str
+    name: str
+    brandImageUrl: str
+    status: str  #: ``ENABLED``, ``DISABLED`` or ``TEMPORARY_DISABLED``
+    minAmount: Decimal
+    maxAmount: Decimal
+
+
+class PaymethodsResponse(TypedDict):
+    cardTokens: List[dict]
+    pexTokens: List[dict]
+    payByLinks: List[PayByLinkData]
+    status: OrderStatusObj
+
+
+class TransactionData(TypedDict):
+    payMethod: PayMethodData
+    paymentFlow: str
+    card: Optional[dict]
+    bankAccount: Optional[dict]
+    resultCode: Optional[str]
+
+
+class OrderTransactionsResponse(TypedDict):
+    transactions: List[TransactionData]
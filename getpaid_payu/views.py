@@ -2,37 +2,75 @@ import json
 import logging
 
 import swapper
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import get_object_or_404
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
 
+from .models import PayUNotification
+from .notifications import is_well_formed, notification_key, payment_lookup
 from .processor import PaymentProcessor
 
 logger = logging.getLogger(__name__)
 
 
-
 @method_decorator(csrf_exempt, name='dispatch')
 class CallbackView(View):
     """
     Dedicated callback view, since payNow does not support dynamic callback urls.
+
+    The notification is decoded once here and passed on to the processor,
+    which verifies its signature against the raw request body.
+    Notifications that were already applied are acknowledged right away;
+    the others are applied with the Payment row locked, or only stored
+    for a worker when ``callback_mode`` is ``"queue"``.
     """
 
     def post(self, request, *args, **kwargs):
-        json_data = json.loads(request.body)
+        try:
+            notification = json.loads(request.body)
+        except ValueError:
+            return HttpResponseBadRequest("MALFORMED NOTIFICATION")
+        if not is_well_formed(notification):
+            return HttpResponseBadRequest("MALFORMED NOTIFICATION")
 
-        # external_id = json_data.get("paymentId")
-        external_id = json_data.get('order', {}).get("extOrderId")
+        deduplicator = PaymentProcessor.get_deduplicator()
+        key = notification_key(notification)
+        if deduplicator is not None and deduplicator.is_applied(key):
+            logger.debug(f"PayU notification {key} already applied")
+            return HttpResponse("OK")
+
+        if PaymentProcessor.get_backend_setting("callback_mode", "sync") == "queue":
+            return self.enqueue(request, key, notification)
 
-        logger.info(f"external_id: {external_id}; json_data: {json_data}")
         Payment = swapper.load_model("getpaid", "Payment")
-        query_kwargs = {
-            Payment.UNIQUE_ID_FIELD: external_id,
-            # 'backend': PaymentProcessor.slug
-            # backend is equal to slug or module name! (may be different)
-        }
-        payment = get_object_or_404(
-            Payment, **query_kwargs
-        )
-        return payment.handle_paywall_callback(request, *args, **kwargs)
+        query_kwargs = payment_lookup(notification)
+        logger.info(f"PayU notification {key} for {query_kwargs}")
+        with transaction.atomic():
+            payment = get_object_or_404(
+                Payment.objects.select_for_update(), **query_kwargs
+            )
+            # a concurrent delivery may have been applied while we waited
+            if deduplicator is not None and deduplicator.is_applied(key):
+                logger.debug(f"PayU notification {key} already applied")
+                return HttpResponse("OK")
+            response = payment.handle_paywall_callback(
+                request, *args, notification=notification, **kwargs
+            )
+            if deduplicator is not None and response.status_code == 200:
+                transaction.on_commit(lambda: deduplicator.mark_applied(key))
+        return response
+
+    def enqueue(self, request, key, notification):
+        """
+        Store verified notification for ``payu_process_notifications``.
+        """
+        verifier = PaymentProcessor.get_notification_verifier(notification)
+        error_response = PaymentProcessor.verify_callback(request, verifier)
+        if error_response is not None:
+            return error_response
+        PayUNotification.objects.create(key=key or "", body=request.body.decode())
+        logger.info(f"PayU notification {key} queued")
+        return HttpResponse("OK")
@@ -0,0 +1,115 @@
+"""
+Warming up PayU clients when the application starts.
+
+The first call of a fresh process pays for OAuth authorization, DNS lookup and
+TLS handshake. With ``warm_up`` backend setting enabled, the app config starts
+:func:`start_warm_up`, which does all that in a background thread for every
+configured POS, so the first checkout after a deploy does not wait for it.
+:func:`is_ready` and :func:`get_status` tell a health check when it is done.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from getpaid.exceptions import GetPaidException
+
+logger = logging.getLogger(__name__)
+
+_status = {"state": "idle", "errors": {}, "duration": None}
+_done = threading.Event()
+_lock = threading.Lock()
+
+
+def warm_up(
+    processor_class=None,
+    connections: Optional[int] = None,
+    paymethods: Optional[bool] = None,
+) -> Dict[str, str]:
+    """
+    Authorize clients of all POS and open their pooled connections,
+    optionally fetching payment methods into cache as well.
+    Settings ``warm_up_connections`` and ``warm_up_paymethods`` are used
+    by default.
+
+    :return: Error messages by POS name, empty if all went well
+    """
+    if processor_class is None:
+        from .processor import PaymentProcessor as processor_class
+    if connections is None:
+        connections = processor_class.get_backend_setting("warm_up_connections", 1)
+    if paymethods is None:
+        paymethods = processor_class.get_backend_setting("warm_up_paymethods", False)
+
+    registry = processor_class.get_pos_registry()
+    errors = {}
+    for pos in registry:
+        try:
+            registry.get_client(pos).warm_up(connections)
+        except Exception as e:
+            logger.warning(f"Warm-up of PayU POS {pos.name} failed: {e!r}")
+            errors[pos.name] = str(e) or type(e).__name__
+    if paymethods and registry.default.name not in errors:
+        try:
+            processor_class.get_paymethods()
+        except GetPaidException as e:
+            logger.warning(f"Prefetching PayU payment methods failed: {e!r}")
+            errors["paymethods"] = str(e) or type(e).__name__
+    return errors
+
+
+def start_warm_up(processor_class=None, **options) -> Optional[threading.Thread]:
+    """
+    Run :func:`warm_up` in a daemon thread, unless it is running already.
+    Forking servers should call it in each worker, e.g. in ``post_fork`` hook.
+    """
+    with _lock:
+        if _status["state"] == "running":
+            return None
+        _done.clear()
+        _status.update(state="running", errors={}, duration=None)
+
+    def run():
+        start = time.monotonic()
+        try:
+            errors = warm_up(processor_class, **options)
+        except Exception as e:
+            logger.exception("PayU warm-up failed")
+            errors = {"warm_up": str(e) or type(e).__name__}
+        _status.update(
+            state="failed" if errors else "ready",
+            errors=errors,
+            duration=time.monotonic() - start,
+        )
+        _done.set()
+        logger.info(f"PayU warm-up finished: {_status}")
+
+    thread = threading.Thread(target=run, name="payu-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    """
+    Tell whether the process can serve PayU calls without waiting for warm-up,
+    i.e. it is not running. Failed warm-up does not keep the process from
+    serving, clients just set themselves up on the first call.
+    """
+    return _status["state"] != "running"
+
+
+def wait(timeout: Optional[float] = None) -> bool:
+    """
+    Wait for a started warm-up to finish and return :func:`is_ready`.
+    """
+    if _status["state"] == "running":
+        _done.wait(timeout)
+    return is_ready()
+
+
+def get_status() -> dict:
+    """
+    State (``idle``, ``running``, ``ready`` or ``failed``), error messages
+    by POS name and duration of the last warm-up, e.g. for a health check.
+    """
+    return dict(_status, errors=dict(_status["errors"]))
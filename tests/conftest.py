@@ -1,7 +1,10 @@
 import pytest
+from django.core.cache import cache
 from pytest_factoryboy import register
 
+from getpaid_payu import caching, pos, resilience
 from getpaid_payu.client import Client
+from getpaid_payu.tokens import default_token_store
 
 from .factories import OrderFactory, PaymentFactory, PaywallEntryFactory
 
@@ -10,6 +13,41 @@ register(OrderFactory)
 register(PaywallEntryFactory)
 
 
+@pytest.fixture(autouse=True)
+def clear_token_store():
+    default_token_store.clear()
+    yield
+    default_token_store.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_ttl_caches():
+    caching._caches.clear()
+    yield
+    caching._caches.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_circuit_breakers():
+    resilience._breakers.clear()
+    yield
+    resilience._breakers.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_pos_registries():
+    pos._registries.clear()
+    yield
+    pos._registries.clear()
+
+
 @pytest.fixture
 def getpaid_client(requests_mock):
     requests_mock.post(
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
     "django_fsm",
     "getpaid",
     "getpaid_payu",
+    "getpaid_payu.testing",
     "orders",
     "paywall",
 ]
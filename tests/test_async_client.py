@@ -0,0 +1,235 @@
+import asyncio
+import json
+import threading
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+from getpaid.exceptions import CommunicationError, LockFailure
+from pytest import raises
+
+from getpaid_payu.resilience import OutcomeUnknown, RetryPolicy
+from getpaid_payu.tokens import LocalTokenStore
+from getpaid_payu.types import Currency
+
+httpx = pytest.importorskip("httpx")
+
+from getpaid_payu.async_client import AsyncClient  # noqa: E402 isort:skip
+
+AUTH_RESPONSE = {
+    "access_token": "7524f96e-2d22-45da-bc64-778a61cbfc26",
+    "token_type": "bearer",
+    "expires_in": 43199,
+    "grant_type": "client_credentials",
+}
+
+
+def make_client(routes, calls, token_store=None):
+    def handler(request):
+        calls.append(request)
+        route = routes[(request.method, request.url.path)]
+        if isinstance(route, list):  # consecutive responses
+            route = route.pop(0)
+        status, payload = route
+        return httpx.Response(status, json=payload)
+
+    return AsyncClient(
+        api_url="https://example.com/",
+        pos_id=300746,
+        second_key="b6ca15b0d1020e8094d9b5f8d163db54",
+        oauth_id=300746,
+        oauth_secret="2ee86a66e5d97e3fadc400c9f19b065d",
+        session=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        token_store=token_store,
+    )
+
+
+def test_new_order():
+    my_order_id = f"{uuid.uuid4()}"
+    calls = []
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("POST", "/api/v2_1/orders"): (
+                302,
+                {
+                    "status": {"statusCode": "SUCCESS"},
+                    "redirectUri": "https://paywall.example.com/url",
+                    "orderId": "WZHF5FFDRJ140731GUEST000P01",
+                    "extOrderId": my_order_id,
+                },
+            ),
+        },
+        calls,
+    )
+    result = asyncio.run(
+        client.new_order(amount=20, currency=Currency.PLN, order_id=my_order_id)
+    )
+    assert result["redirectUri"] == "https://paywall.example.com/url"
+    sent = json.loads(calls[-1].content)
+    assert sent["totalAmount"] == "2000"
+    assert calls[-1].headers["Authorization"] == (
+        "Bearer 7524f96e-2d22-45da-bc64-778a61cbfc26"
+    )
+
+
+def test_new_order_failure():
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("POST", "/api/v2_1/orders"): (500, {}),
+            ("GET", "/api/v2_1/orders/ext/1"): (404, {}),
+        },
+        [],
+    )
+    with raises(LockFailure):
+        asyncio.run(client.new_order(amount=20, currency=Currency.PLN, order_id="1"))
+
+
+def test_get_order_info_normalizes_amounts():
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("GET", f"/api/v2_1/orders/{ext_order_id}"): (
+                200,
+                {"orders": [{"totalAmount": "2000"}]},
+            ),
+        },
+        [],
+    )
+    result = asyncio.run(client.get_order_info(ext_order_id))
+    assert result == {"orders": [{"totalAmount": Decimal("20")}]}
+
+
+def test_get_order_info_failure():
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("GET", f"/api/v2_1/orders/{ext_order_id}"): (404, {}),
+        },
+        [],
+    )
+    with raises(CommunicationError):
+        asyncio.run(client.get_order_info(ext_order_id))
+
+
+def test_concurrent_calls_authorize_once():
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    calls = []
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("GET", f"/api/v2_1/orders/{ext_order_id}"): (200, {"orders": []}),
+        },
+        calls,
+    )
+
+    async def burst():
+        await asyncio.gather(*[client.get_order_info(ext_order_id) for _ in range(20)])
+
+    asyncio.run(burst())
+    auth_calls = [c for c in calls if c.url.path.endswith("/authorize")]
+    assert len(auth_calls) == 1
+
+
+def test_refresh_takes_store_lock_off_the_loop():
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    locked = []
+
+    class Store(LocalTokenStore):
+        @contextmanager
+        def refresh_lock(self, key):
+            locked.append(threading.current_thread())
+            with super().refresh_lock(key):
+                yield
+
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("GET", f"/api/v2_1/orders/{ext_order_id}"): (200, {"orders": []}),
+        },
+        [],
+        token_store=Store(),
+    )
+
+    async def burst():
+        await asyncio.gather(*[client.get_order_info(ext_order_id) for _ in range(5)])
+
+    asyncio.run(burst())
+    assert len(locked) == 1
+    assert locked[0] is not threading.main_thread()
+
+
+def test_retry_and_token_refresh():
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    calls = []
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("GET", f"/api/v2_1/orders/{ext_order_id}"): [
+                (401, {}),
+                (503, {}),
+                (200, {"orders": [{"status": "PENDING"}]}),
+            ],
+        },
+        calls,
+    )
+    client.retry_policy = RetryPolicy(backoff=0)
+
+    result = asyncio.run(client.get_order_info(ext_order_id))
+
+    assert result["orders"][0]["status"] == "PENDING"
+    assert [c.url.path.rsplit("/", 1)[-1] for c in calls] == [
+        "authorize",
+        ext_order_id,
+        "authorize",
+        ext_order_id,
+        ext_order_id,
+    ]
+
+
+def test_new_order_lookup():
+    calls = []
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("POST", "/api/v2_1/orders"): (500, {}),
+            ("GET", "/api/v2_1/orders/ext/1"): (200, {"orders": [{"orderId": "A"}]}),
+        },
+        calls,
+    )
+    client.retry_policy = RetryPolicy(backoff=0)
+
+    response = asyncio.run(
+        client.new_order(amount=20, currency=Currency.PLN, order_id="1")
+    )
+    assert response["orderId"] == "A"
+    assert [c.method for c in calls] == ["POST", "POST", "GET"]
+
+
+def test_new_order_outcome_unknown():
+    calls = []
+    client = make_client(
+        {
+            ("POST", "/pl/standard/user/oauth/authorize"): (200, AUTH_RESPONSE),
+            ("POST", "/api/v2_1/orders"): (500, {}),
+            ("GET", "/api/v2_1/orders/ext/1"): (503, {}),
+        },
+        calls,
+    )
+    client.retry_policy = RetryPolicy(backoff=0)
+
+    with raises(OutcomeUnknown):
+        asyncio.run(client.new_order(amount=20, currency=Currency.PLN, order_id="1"))
+    assert [c.method for c in calls] == ["POST", "POST", "GET", "GET", "GET"]
+
+
+@pytest.mark.django_db
+def test_processor_async_client(payment_factory):
+    client = payment_factory().processor.get_async_client()
+    assert isinstance(client, AsyncClient)
+    assert client.token_store is payment_factory().processor.client.token_store
+    assert payment_factory().processor.get_async_client() is client
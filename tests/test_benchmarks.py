@@ -0,0 +1,23 @@
+from importlib import import_module
+
+import pytest
+
+from benchmarks import MODULES, compare
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize("module_name", MODULES)
+def test_benchmarks_run(module_name):
+    module = import_module(f"benchmarks.{module_name}")
+    for func in module.get_benchmarks().values():
+        func()
+
+
+def test_compare():
+    baselines = {
+        "calibration": 1.0,
+        "results": {"fast": 1.0, "slow": 1.0, "slow_legacy": 1.0},
+    }
+    results = {"fast": 2.2, "slow": 2.6, "slow_legacy": 5.0, "new": 1.0}
+    assert compare(results, 2.0, baselines, tolerance=0.25) == {"slow": (2.6, 2.0)}
@@ -0,0 +1,120 @@
+import pytest
+
+from getpaid_payu.caching import TTLCache, get_ttl_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Fetcher:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return f"value {self.calls}"
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def deferred():
+    """
+    Background refreshes, run only when the test says so.
+    """
+    return []
+
+
+@pytest.fixture
+def ttl_cache(clock, deferred):
+    return TTLCache("test", ttl=10, stale_ttl=20, clock=clock, submit=deferred.append)
+
+
+def test_value_is_fetched_once(ttl_cache):
+    fetch = Fetcher()
+    assert ttl_cache.get("key", fetch) == "value 1"
+    assert ttl_cache.get("key", fetch) == "value 1"
+    assert fetch.calls == 1
+    assert ttl_cache.stats == {"miss": 1, "refresh": 1, "hit": 1}
+
+
+def test_stale_value_is_served_while_refreshed(ttl_cache, clock, deferred):
+    fetch = Fetcher()
+    ttl_cache.get("key", fetch)
+    clock.now += 15
+
+    assert ttl_cache.get("key", fetch) == "value 1"
+    assert ttl_cache.get("key", fetch) == "value 1"
+    assert len(deferred) == 1  # single refresh
+
+    deferred.pop()()
+    assert ttl_cache.get("key", fetch) == "value 2"
+    assert fetch.calls == 2
+
+
+def test_expired_value_is_fetched(ttl_cache, clock):
+    fetch = Fetcher()
+    ttl_cache.get("key", fetch)
+    clock.now += 30
+    assert ttl_cache.get("key", fetch) == "value 2"
+
+
+def test_failed_refresh_keeps_stale_value(ttl_cache, clock, deferred):
+    ttl_cache.get("key", Fetcher())
+    clock.now += 15
+
+    def broken():
+        raise RuntimeError("PayU is down")
+
+    ttl_cache.get("key", broken)
+    deferred.pop()()
+
+    assert ttl_cache.get("key", broken) == "value 1"
+    assert ttl_cache.stats["error"] == 1
+    assert len(deferred) == 1  # retried by the next read
+
+
+def test_values_are_shared_through_django_cache(clock):
+    first = TTLCache("test", ttl=10, clock=clock)
+    second = TTLCache("test", ttl=10, clock=clock)
+    fetch = Fetcher()
+
+    first.get("key", fetch)
+    assert second.get("key", fetch) == "value 1"
+    assert fetch.calls == 1
+
+
+def test_invalidation(clock):
+    first = TTLCache("test", ttl=10, local_ttl=1, clock=clock)
+    second = TTLCache("test", ttl=10, local_ttl=1, clock=clock)
+    fetch = Fetcher()
+    first.get("key", fetch)
+    second.get("key", fetch)
+
+    first.invalidate("key")
+
+    assert first.get("key", fetch) == "value 2"
+    first.invalidate("key")
+    assert second.get("key", fetch) == "value 1"  # trusted for local_ttl
+    clock.now += 1
+    assert second.get("key", fetch) == "value 3"
+
+
+def test_local_only_cache(clock):
+    ttl_cache = TTLCache("test", ttl=10, cache_alias=None, clock=clock)
+    fetch = Fetcher()
+    ttl_cache.get("key", fetch)
+    assert ttl_cache.get("key", fetch) == "value 1"
+
+
+def test_caches_are_shared():
+    assert get_ttl_cache("a", ttl=1) is get_ttl_cache("a", ttl=1)
+    assert get_ttl_cache("a", ttl=1) is not get_ttl_cache("a", ttl=2)
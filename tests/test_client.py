@@ -1,7 +1,10 @@
+import json
+import threading
 import uuid
 from decimal import Decimal
 
 import pytest
+import requests
 import swapper
 from django.urls import reverse_lazy
 from getpaid.exceptions import (
@@ -13,6 +16,8 @@ from getpaid.exceptions import (
 )
 from pytest import raises
 
+from getpaid_payu.client import Client
+from getpaid_payu.tokens import BaseTokenStore, Token
 from getpaid_payu.types import Currency
 
 pytestmark = pytest.mark.django_db
@@ -97,6 +102,7 @@ def test_new_order_failure(response_status, getpaid_client, requests_mock):
     requests_mock.post(
         "/api/v2_1/orders", text="FAILURE", status_code=response_status,
     )
+    requests_mock.get(f"/api/v2_1/orders/ext/{my_order_id}", status_code=404, json={})
     with raises(LockFailure):
         getpaid_client.new_order(amount=20, currency=Currency.PLN, order_id=my_order_id)
 
@@ -182,3 +188,175 @@ def test_get_shop_info_failure(response_status, getpaid_client, requests_mock):
     )
     with raises(CommunicationError):
         getpaid_client.get_shop_info(shop_id=getpaid_client.pos_id)
+
+
+def test_client_does_not_authorize_on_init(requests_mock):
+    auth = requests_mock.post("/pl/standard/user/oauth/authorize", json={})
+    Client(
+        api_url="https://example.com/",
+        pos_id=300746,
+        second_key="b6ca15b0d1020e8094d9b5f8d163db54",
+        oauth_id=300746,
+        oauth_secret="2ee86a66e5d97e3fadc400c9f19b065d",
+    )
+    assert auth.call_count == 0
+
+
+def test_token_shared_between_clients(getpaid_client, requests_mock):
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    requests_mock.get(f"/api/v2_1/orders/{ext_order_id}", json={"orders": []})
+    other_client = Client(
+        api_url=getpaid_client.api_url,
+        pos_id=getpaid_client.pos_id,
+        second_key=getpaid_client.second_key,
+        oauth_id=getpaid_client.oauth_id,
+        oauth_secret=getpaid_client.oauth_secret,
+    )
+    getpaid_client.get_order_info(ext_order_id)
+    other_client.get_order_info(ext_order_id)
+    auth_calls = [
+        r for r in requests_mock.request_history if r.path.endswith("/authorize")
+    ]
+    assert len(auth_calls) == 1
+
+
+def test_token_store_must_implement_clear():
+    class Store(BaseTokenStore):
+        get = set = delete = refresh_lock = None
+
+    with pytest.raises(TypeError):
+        Store()
+
+
+def test_expiring_token_is_refreshed(getpaid_client, requests_mock):
+    getpaid_client.token_store.set(
+        getpaid_client._token_key, Token.create(value="Bearer old", expires_in=1),
+    )
+    assert getpaid_client.token == "Bearer 7524f96e-2d22-45da-bc64-778a61cbfc26"
+
+
+def test_concurrent_refresh_is_single_flight(getpaid_client, requests_mock):
+    threads = [
+        threading.Thread(target=lambda: getpaid_client._get_token()) for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    auth_calls = [
+        r for r in requests_mock.request_history if r.path.endswith("/authorize")
+    ]
+    assert len(auth_calls) == 1
+
+
+def test_clients_share_pooled_session(getpaid_client):
+    other_client = Client(
+        api_url=getpaid_client.api_url,
+        pos_id=getpaid_client.pos_id,
+        second_key=getpaid_client.second_key,
+        oauth_id=getpaid_client.oauth_id,
+        oauth_secret=getpaid_client.oauth_secret,
+    )
+    assert other_client.session is getpaid_client.session
+
+
+def test_timeout_is_passed_to_requests(getpaid_client, requests_mock):
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    requests_mock.get(f"/api/v2_1/orders/{ext_order_id}", json={"orders": []})
+    getpaid_client.timeout = (1, 2)
+    getpaid_client.get_order_info(ext_order_id)
+    assert requests_mock.last_request.timeout == (1, 2)
+
+
+def test_connection_error_raises_lock_failure(getpaid_client, requests_mock):
+    requests_mock.post("/api/v2_1/orders", exc=requests.exceptions.ConnectTimeout)
+    with raises(LockFailure):
+        getpaid_client.new_order(amount=20, currency=Currency.PLN, order_id="1")
+
+
+def test_centify_does_not_modify_input(getpaid_client):
+    data = {"products": [{"unitPrice": Decimal("1")}]}
+    getpaid_client._centify(data)
+    assert data == {"products": [{"unitPrice": Decimal("1")}]}
+
+
+def test_decoded_response_is_normalized(getpaid_client):
+    body = {
+        "orders": [{"totalAmount": "2000", "products": [{"unitPrice": "1000"}]}],
+        "status": {"statusCode": "SUCCESS"},
+    }
+    request = getpaid_client._order_info_request("WZHF5FFDRJ140731GUEST000P01")
+    decoded = getpaid_client._decode(request, json.dumps(body).encode())
+    assert decoded == getpaid_client._normalize(body)
+
+
+def test_call_returns_response_details(getpaid_client, requests_mock):
+    ext_order_id = "WZHF5FFDRJ140731GUEST000P01"
+    requests_mock.get(
+        f"/api/v2_1/orders/{ext_order_id}",
+        json={"orders": []},
+        headers={"Correlation-Id": "abc"},
+    )
+    result = getpaid_client.get_order_info(ext_order_id)
+    assert result == {"orders": []}
+    assert result.status_code == 200
+    assert result.headers["Correlation-Id"] == "abc"
+    assert result.elapsed >= 0
+    assert result.raw.status_code == 200
+
+
+def test_shared_client_returns_own_results_per_thread(getpaid_client, requests_mock):
+    for i in range(10):
+        requests_mock.get(f"/api/v2_1/orders/{i}", json={"orders": [{"extOrderId": i}]})
+    results = {}
+
+    def fetch(order_id):
+        results[order_id] = getpaid_client.get_order_info(order_id)
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for order_id, result in results.items():
+        assert result["orders"][0]["extOrderId"] == order_id
+        assert result.raw.url.endswith(f"/orders/{order_id}")
+
+
+def test_get_order_transactions(getpaid_client, requests_mock):
+    order_id = "WZHF5FFDRJ140731GUEST000P01"
+    requests_mock.get(
+        f"/api/v2_1/orders/{order_id}/transactions",
+        json={
+            "transactions": [
+                {
+                    "payMethod": {"value": "c"},
+                    "paymentFlow": "CARD",
+                    "card": {"cardData": {"cardNumberMasked": "543402******4014"}},
+                    "resultCode": "AUT_ERROR_NO",
+                }
+            ]
+        },
+    )
+    response = getpaid_client.get_order_transactions(order_id)
+    assert response["transactions"][0]["paymentFlow"] == "CARD"
+
+
+def test_iter_order_transactions(getpaid_client, requests_mock):
+    for order_id in ("A", "B"):
+        requests_mock.get(
+            f"/api/v2_1/orders/{order_id}/transactions",
+            json={"transactions": [{"paymentFlow": order_id}]},
+        )
+    requests_mock.get("/api/v2_1/orders/C/transactions", status_code=404)
+
+    results = getpaid_client.iter_order_transactions(iter("ABC"), workers=2, rate=1000)
+
+    flows = {}
+    for order_id, response, exception in results:
+        flows[order_id] = (
+            response["transactions"][0]["paymentFlow"] if response else exception
+        )
+    assert flows["A"] == "A"
+    assert flows["B"] == "B"
+    assert isinstance(flows["C"], CommunicationError)
@@ -0,0 +1,40 @@
+from getpaid_payu.concurrency import RateLimiter, bounded_map
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_rate_limiter_spaces_calls():
+    time = FakeTime()
+    limiter = RateLimiter(rate=2, clock=time.clock, sleep=lambda seconds: None)
+    assert [limiter.acquire() for _ in range(4)] == [0, 0.5, 1.0, 1.5]
+
+
+def test_rate_limiter_allows_bursts():
+    time = FakeTime()
+    limiter = RateLimiter(rate=10, burst=3, clock=time.clock, sleep=time.sleep)
+    assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire() == 0.1
+    time.now = 10
+    assert [limiter.acquire() for _ in range(3)] == [0, 0, 0]
+
+
+def test_bounded_map_with_rate_limiter():
+    calls = []
+
+    class Limiter:
+        def acquire(self):
+            calls.append("acquire")
+
+    results = list(bounded_map(str, range(5), max_workers=2, rate_limiter=Limiter()))
+
+    assert sorted(result for item, result, exc in results) == list("01234")
+    assert len(calls) == 5
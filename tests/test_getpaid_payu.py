@@ -5,12 +5,15 @@ import uuid
 import pytest
 import swapper
 from django.template.response import TemplateResponse
+from django.urls import reverse
 from django_fsm import can_proceed
 from getpaid.types import BackendMethod as bm
 from getpaid.types import ConfirmationMethod as cm
 from getpaid.types import PaymentStatus as ps
 
+from getpaid_payu.notifications import NotificationDeduplicator, notification_key
 from getpaid_payu.types import OrderStatus
+from getpaid_payu.views import CallbackView
 
 pytestmark = pytest.mark.django_db
 
@@ -202,3 +205,199 @@ def test_push_flow(
     )
     payment.handle_paywall_callback(request)
     assert payment.status == our_status
+
+
+def _signed_request(rf, data, second_key, algorithm="MD5"):
+    encoded = json.dumps(data, default=str)
+    sig = hashlib.new(
+        algorithm.replace("-", "").lower(), f"{encoded}{second_key}".encode("utf-8")
+    ).hexdigest()
+    compiled = f"sender=checkout;signature={sig};algorithm={algorithm};content=DOCUMENT"
+    return rf.post(
+        reverse("getpaid:payu:callback"),
+        content_type="application/json",
+        data=encoded,
+        HTTP_X_OPENPAYU_SIGNATURE=compiled,
+    )
+
+
+def test_push_flow_uses_decoded_notification(
+    payment_factory, settings, rf, getpaid_client, monkeypatch
+):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    payment = payment_factory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    data = {"order": {"extOrderId": f"{payment.id}", "status": OrderStatus.CANCELED}}
+    request = _signed_request(rf, data, getpaid_client.second_key, "SHA-256")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("notification decoded twice")
+
+    monkeypatch.setattr(json, "loads", fail)
+    response = payment.handle_paywall_callback(request, notification=data)
+    assert response.status_code == 200
+    assert payment.status == ps.FAILED
+
+
+def test_push_flow_bad_signature(payment_factory, settings, rf, getpaid_client):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    payment = payment_factory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    data = {"order": {"extOrderId": f"{payment.id}", "status": OrderStatus.CANCELED}}
+    request = _signed_request(rf, data, "wrong key")
+    response = payment.handle_paywall_callback(request)
+    assert response.status_code == 422
+    assert payment.status == ps.PREPARED
+
+
+def test_push_refund_amount(payment_factory, settings, rf, getpaid_client):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    payment = payment_factory(external_id=uuid.uuid4(), status=ps.REFUND_STARTED)
+    payment.amount_paid = payment.amount_required
+    data = {
+        "orderId": "LDLW5N7MF4140324GUEST000P01",
+        "refund": {
+            "refundId": "912128",
+            "amount": f"{int(payment.amount_paid * 100)}",
+            "currencyCode": payment.currency,
+            "status": "FINALIZED",
+        },
+    }
+    request = _signed_request(rf, data, getpaid_client.second_key)
+    response = payment.handle_paywall_callback(request)
+    assert response.status_code == 200
+    assert payment.amount_refunded == payment.amount_paid
+    assert payment.status == ps.REFUNDED
+
+
+def test_callback_view(payment_factory, settings, rf, getpaid_client):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    payment = payment_factory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    payment.save()
+    data = {
+        "order": {
+            "extOrderId": payment.get_unique_id(),
+            "status": OrderStatus.CANCELED,
+        }
+    }
+    request = _signed_request(rf, data, getpaid_client.second_key)
+    response = CallbackView.as_view()(request)
+    assert response.status_code == 200
+    assert Payment.objects.get(pk=payment.pk).status == ps.FAILED
+
+
+def test_callback_view_skips_applied_notification(
+    payment_factory,
+    settings,
+    rf,
+    getpaid_client,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    payment = payment_factory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    payment.save()
+    data = {
+        "order": {
+            "orderId": "LDLW5N7MF4140324GUEST000P01",
+            "extOrderId": payment.get_unique_id(),
+            "status": OrderStatus.CANCELED,
+        }
+    }
+    request = _signed_request(rf, data, getpaid_client.second_key)
+    with django_capture_on_commit_callbacks(execute=True):
+        assert CallbackView.as_view()(request).status_code == 200
+    with django_assert_num_queries(0):
+        assert CallbackView.as_view()(request).status_code == 200
+
+
+def test_callback_view_rechecks_notification_under_lock(
+    payment_factory, settings, rf, getpaid_client, monkeypatch
+):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    payment = payment_factory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    payment.save()
+    data = {
+        "order": {
+            "orderId": "LDLW5N7MF4140324GUEST000P01",
+            "extOrderId": payment.get_unique_id(),
+            "status": OrderStatus.CANCELED,
+        }
+    }
+    # a concurrent delivery gets applied while this one waits for the lock
+    answers = iter([False, True])
+    monkeypatch.setattr(
+        NotificationDeduplicator, "is_applied", lambda self, key: next(answers)
+    )
+
+    request = _signed_request(rf, data, getpaid_client.second_key)
+    assert CallbackView.as_view()(request).status_code == 200
+    assert Payment.objects.get(pk=payment.pk).status == ps.PREPARED
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"order": {"status": OrderStatus.CANCELED}},
+        {"refund": {"status": "FINALIZED", "refundId": "9", "amount": "100"}},
+        {"refund": {"status": "CANCELED", "refundId": "9"}},
+    ],
+)
+def test_repeated_notification_is_acknowledged(
+    data, payment_factory, settings, rf, getpaid_client
+):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"][
+        "deduplicate_notifications"
+    ] = False
+    payment = payment_factory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    payment.fail()
+    payment.save()
+    if "order" in data:
+        data["order"]["extOrderId"] = payment.get_unique_id()
+    else:
+        data["orderId"] = str(payment.external_id)
+
+    request = _signed_request(rf, data, getpaid_client.second_key)
+    assert CallbackView.as_view()(request).status_code == 200
+    assert Payment.objects.get(pk=payment.pk).status == ps.FAILED
+
+
+@pytest.mark.parametrize(
+    "data,key",
+    [
+        ({"order": {"orderId": "A1", "status": "COMPLETED"}}, "A1:COMPLETED"),
+        (
+            {"orderId": "A1", "refund": {"refundId": "9", "status": "FINALIZED"}},
+            "A1:FINALIZED:9",
+        ),
+        ({"order": {"status": "COMPLETED"}}, None),
+    ],
+)
+def test_notification_key(data, key):
+    assert notification_key(data) == key
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b"not json", b"[]", b"null", b'"order"', b'{"order": "x"}', b'{"refund": []}'],
+)
+def test_callback_view_rejects_malformed_notification(rf, body):
+    request = rf.post(
+        reverse("getpaid:payu:callback"), data=body, content_type="application/json"
+    )
+    response = CallbackView.as_view()(request)
+    assert response.status_code == 400
+    assert response.content == b"MALFORMED NOTIFICATION"
+
+
+def test_deduplicator():
+    deduplicator = NotificationDeduplicator()
+    assert not deduplicator.is_applied("A1:COMPLETED")
+    deduplicator.mark_applied("A1:COMPLETED")
+    assert deduplicator.is_applied("A1:COMPLETED")
+    assert not deduplicator.is_applied(None)
@@ -0,0 +1,67 @@
+"""
+Import time regression tests, run in fresh interpreters with ``-X importtime``.
+"""
+import json
+import os
+import subprocess
+import sys
+
+#: Loaded on first use of a client, never at startup
+HTTP_STACK = [
+    "getpaid_payu.base",
+    "getpaid_payu.client",
+    "getpaid_payu.sessions",
+    "getpaid_payu.tokens",
+    "getpaid_payu.types",
+    "pendulum",
+]
+
+
+def run(code: str):
+    """
+    Run ``code`` printing a JSON value and return it with names of imported
+    getpaid_payu modules. Import time is measured by ``benchmarks.bench_import``.
+    """
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        name = line.rsplit("|", 1)[-1].strip()
+        if name.startswith("getpaid_payu"):
+            imported.add(name)
+    return json.loads(result.stdout), imported
+
+
+def loaded(modules) -> str:
+    return (
+        "import json, sys; "
+        f"print(json.dumps([m for m in {modules!r} if m in sys.modules]))"
+    )
+
+
+def test_package_import_does_not_load_processor():
+    modules, _ = run(f"import getpaid_payu; {loaded(['getpaid_payu.processor'])}")
+    assert modules == []
+
+
+def test_django_setup_does_not_load_http_stack():
+    modules, imported = run(f"import django; django.setup(); {loaded(HTTP_STACK)}")
+
+    assert modules == []
+    assert "getpaid_payu.processor" in imported
+
+
+def test_accepted_currencies():
+    from getpaid_payu.processor import PaymentProcessor
+    from getpaid_payu.types import Currency
+
+    assert PaymentProcessor.accepted_currencies == [c.value for c in Currency]
@@ -0,0 +1,168 @@
+import re
+import uuid
+from decimal import Decimal
+
+import pytest
+import requests
+from getpaid.exceptions import LockFailure
+
+from getpaid_payu.client import Client
+from getpaid_payu.instrumentation import (
+    CallInfo,
+    Instrumentation,
+    StatsDInstrumentation,
+    get_instrumentation,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+class Recorder(Instrumentation):
+    def __init__(self):
+        self.before = []
+        self.after = []
+
+    def before_request(self, call):
+        self.before.append(call.endpoint)
+
+    def after_request(self, call):
+        self.after.append(call)
+
+
+class Broken(Instrumentation):
+    def after_request(self, call):
+        raise RuntimeError("broken")
+
+
+@pytest.fixture
+def client(getpaid_client):
+    getpaid_client.instruments = [Recorder()]
+    return getpaid_client
+
+
+ORDER_LOOKUP = re.compile("/api/v2_1/orders/ext/")
+
+
+def new_order(client):
+    return client.new_order(
+        amount=Decimal("10"), currency="PLN", order_id=str(uuid.uuid4())
+    )
+
+
+def test_calls_are_reported(client, requests_mock):
+    requests_mock.post("/api/v2_1/orders", json={"orderId": "A1"})
+    recorder = client.instruments[0]
+
+    new_order(client)
+    new_order(client)
+
+    assert recorder.before == ["new_order", "authorize", "new_order"]
+    authorize, first, second = recorder.after
+    assert authorize.endpoint == "authorize"
+    assert authorize.status_code == 200
+    assert first.endpoint == "new_order"
+    assert first.token_refresh
+    assert first.duration >= authorize.duration
+    assert not second.token_refresh
+    assert second.status == "200"
+
+
+def test_failed_call_is_reported(client, requests_mock):
+    requests_mock.post("/api/v2_1/orders", status_code=500, json={})
+    requests_mock.get(ORDER_LOOKUP, status_code=404, json={})
+
+    with pytest.raises(LockFailure):
+        new_order(client)
+
+    call = client.instruments[0].after[-1]
+    assert call.status_code == 500
+    assert isinstance(call.exception, LockFailure)
+
+
+def test_connection_error_is_reported(client, requests_mock):
+    requests_mock.post("/api/v2_1/orders", exc=requests.ConnectionError)
+    requests_mock.get(ORDER_LOOKUP, status_code=404, json={})
+
+    with pytest.raises(LockFailure):
+        new_order(client)
+
+    call = client.instruments[0].after[-1]
+    assert call.status == "error"
+    assert call.duration is not None
+
+
+def test_broken_instrumentation_is_ignored(client, requests_mock):
+    requests_mock.post("/api/v2_1/orders", json={"orderId": "A1"})
+    client.instruments.insert(0, Broken())
+
+    assert new_order(client)["orderId"] == "A1"
+    assert len(client.instruments[1].after) == 2
+
+
+def test_statsd_instrumentation():
+    class FakeStatsD:
+        def __init__(self):
+            self.sent = []
+
+        def timing(self, key, value):
+            self.sent.append(("timing", key))
+
+        def incr(self, key, count=1):
+            self.sent.append(("incr", key, count))
+
+    statsd = FakeStatsD()
+    call = CallInfo("order_info", "GET", "https://example.com/")
+    call.status_code = 200
+    call.duration = 0.1
+    call.token_refresh = True
+
+    StatsDInstrumentation(client=statsd).after_request(call)
+
+    assert statsd.sent == [
+        ("timing", "payu.order_info.duration"),
+        ("incr", "payu.order_info.status.200", 1),
+        ("incr", "payu.order_info.token_refresh", 1),
+    ]
+
+
+def test_prometheus_instrumentation():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    from getpaid_payu.instrumentation import PrometheusInstrumentation
+
+    registry = prometheus_client.CollectorRegistry()
+    instrumentation = PrometheusInstrumentation(registry=registry)
+    call = CallInfo("order_info", "GET", "https://example.com/")
+    call.status_code = 200
+    call.duration = 0.1
+    call.retries = 2
+
+    instrumentation.after_request(call)
+
+    labels = {"endpoint": "order_info", "status": "200"}
+    assert registry.get_sample_value("payu_requests_total", labels) == 1
+    assert (
+        registry.get_sample_value(
+            "payu_request_retries_total", {"endpoint": "order_info"}
+        )
+        == 2
+    )
+
+
+def test_processor_instruments(payment_factory, settings):
+    path = "getpaid_payu.instrumentation.LoggingInstrumentation"
+    settings.GETPAID_BACKEND_SETTINGS = {
+        "getpaid_payu": {
+            "pos_id": 300746,
+            "second_key": "b6ca15b0d1020e8094d9b5f8d163db54",
+            "oauth_id": 300746,
+            "oauth_secret": "2ee86a66e5d97e3fadc400c9f19b065d",
+            "instrumentation": [path],
+            "instrumentation_options": {path: {"level": 10}},
+        }
+    }
+    payment = payment_factory()
+
+    (instrument,) = payment.processor.client.instruments
+
+    assert instrument is get_instrumentation(path, level=10)
+    assert instrument.level == 10
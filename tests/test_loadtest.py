@@ -0,0 +1,71 @@
+import pytest
+import swapper
+from django.core.management import call_command
+from getpaid.types import PaymentStatus as ps
+
+from getpaid_payu.testing.loadtest import LoadTest, PhaseStats, percentile
+from getpaid_payu.testing.simulator import PayUSimulator, serve_in_thread
+
+Payment = swapper.load_model("getpaid", "Payment")
+
+
+@pytest.fixture
+def simulator_url(settings):
+    simulator = PayUSimulator(
+        second_key=settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"]["second_key"]
+    )
+    server = serve_in_thread(simulator)
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+    simulator.close()
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.5) == 0
+
+
+def test_phase_summary():
+    stats = PhaseStats("test")
+    stats.add(0.1, 2, 0.01)
+    stats.add(0.3, 4, 0.0, error="RuntimeError")
+    stats.elapsed = 0.5
+    summary = stats.summary()
+    assert summary["count"] == 2
+    assert summary["errors"] == 1
+    assert summary["throughput"] == 4
+    assert summary["queries"] == 3
+    assert summary["lock_wait"] == pytest.approx(0.01)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_load_test(simulator_url, order_factory):
+    checkout, notifications = LoadTest(
+        api_url=simulator_url,
+        orders=3,
+        workers=1,
+        repeat=2,
+        order_factory=order_factory,
+    ).run()
+
+    assert checkout.summary()["count"] == 3
+    assert not checkout.errors
+    assert notifications.summary()["count"] == 12
+    assert not notifications.errors
+    assert set(Payment.objects.values_list("status", flat=True)) == {ps.PAID}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_loadtest_command(capsys):
+    call_command(
+        "payu_loadtest",
+        "--orders=2",
+        "--workers=1",
+        "--order-factory=tests.factories.OrderFactory",
+    )
+    checkout, notifications = capsys.readouterr().out.splitlines()[1:]
+    assert checkout.split()[:3] == ["checkout", "2", "0"]
+    assert notifications.split()[:3] == ["notifications", "4", "0"]
@@ -0,0 +1,165 @@
+import datetime
+import uuid
+
+import pytest
+import swapper
+from django.core.management import call_command
+from django.utils import timezone
+from getpaid.types import ConfirmationMethod as cm
+from getpaid.types import PaymentStatus as ps
+
+from getpaid_payu.models import NotificationStatus, PayUNotification
+from getpaid_payu.outbox import NotificationWorker
+from getpaid_payu.types import OrderStatus
+from getpaid_payu.views import CallbackView
+
+from .test_getpaid_payu import _prep_conf, _signed_request
+
+pytestmark = pytest.mark.django_db
+
+Payment = swapper.load_model("getpaid", "Payment")
+
+
+@pytest.fixture
+def queue_mode(settings):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"]["callback_mode"] = "queue"
+    return settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"]
+
+
+def make_pending_payment(payment_factory):
+    payment = payment_factory(external_id=uuid.uuid4())
+    payment.confirm_prepared()
+    payment.save()
+    return payment
+
+
+def order_notification(payment, status):
+    return {
+        "order": {
+            "orderId": str(payment.external_id),
+            "extOrderId": payment.get_unique_id(),
+            "status": status,
+        }
+    }
+
+
+def test_callback_view_queues_notification(payment_factory, queue_mode, rf):
+    payment = make_pending_payment(payment_factory)
+    data = order_notification(payment, OrderStatus.CANCELED)
+    request = _signed_request(rf, data, queue_mode["second_key"])
+
+    response = CallbackView.as_view()(request)
+
+    assert response.status_code == 200
+    assert Payment.objects.get(pk=payment.pk).status == ps.PREPARED
+    notification = PayUNotification.objects.get()
+    assert notification.status == NotificationStatus.PENDING
+    assert notification.key == f"{payment.external_id}:CANCELED"
+    assert notification.body == request.body.decode()
+
+
+def test_callback_view_does_not_queue_bad_signature(payment_factory, queue_mode, rf):
+    payment = make_pending_payment(payment_factory)
+    data = order_notification(payment, OrderStatus.CANCELED)
+    request = _signed_request(rf, data, "wrong key")
+
+    response = CallbackView.as_view()(request)
+
+    assert response.status_code == 422
+    assert not PayUNotification.objects.exists()
+
+
+def test_callback_view_does_not_queue_malformed_notification(queue_mode, rf):
+    request = _signed_request(rf, [], queue_mode["second_key"])
+
+    response = CallbackView.as_view()(request)
+
+    assert response.status_code == 400
+    assert not PayUNotification.objects.exists()
+
+
+def test_worker_applies_notifications(payment_factory, queue_mode, rf):
+    canceled, completed = (make_pending_payment(payment_factory) for _ in range(2))
+    for payment, status in (
+        (canceled, OrderStatus.CANCELED),
+        (completed, OrderStatus.COMPLETED),
+    ):
+        data = order_notification(payment, status)
+        CallbackView.as_view()(_signed_request(rf, data, queue_mode["second_key"]))
+
+    stats = NotificationWorker(batch_size=1).run()
+
+    assert stats["processed"] == 2
+    assert stats["applied"] == 2
+    assert Payment.objects.get(pk=canceled.pk).status == ps.FAILED
+    assert Payment.objects.get(pk=completed.pk).status == ps.PAID
+    assert set(PayUNotification.objects.values_list("status", flat=True)) == {
+        NotificationStatus.DONE
+    }
+
+
+def test_worker_retries_failed_notifications(queue_mode, rf):
+    data = {"order": {"extOrderId": str(uuid.uuid4()), "status": OrderStatus.CANCELED}}
+    CallbackView.as_view()(_signed_request(rf, data, queue_mode["second_key"]))
+    worker = NotificationWorker(max_attempts=2)
+
+    assert worker.run()["failed"] == 1
+    notification = PayUNotification.objects.get()
+    assert notification.status == NotificationStatus.PENDING
+    assert notification.attempts == 1
+    assert "DoesNotExist" in notification.last_error
+
+    worker.run()
+    assert PayUNotification.objects.get().status == NotificationStatus.FAILED
+    assert worker.run()["processed"] == 0
+
+
+def test_worker_skips_applied_notifications(payment_factory, queue_mode, rf):
+    payment = make_pending_payment(payment_factory)
+    data = order_notification(payment, OrderStatus.CANCELED)
+    CallbackView.as_view()(_signed_request(rf, data, queue_mode["second_key"]))
+    worker = NotificationWorker()
+    worker.deduplicator.mark_applied(f"{payment.external_id}:CANCELED")
+
+    stats = worker.run()
+
+    assert stats["skipped"] == 1
+    assert PayUNotification.objects.get().status == NotificationStatus.DONE
+    assert Payment.objects.get(pk=payment.pk).status == ps.PREPARED
+
+
+def test_worker_applies_duplicates_once(payment_factory, queue_mode, rf):
+    payment = make_pending_payment(payment_factory)
+    data = order_notification(payment, OrderStatus.CANCELED)
+    for _ in range(2):  # PayU repeats it before the worker runs
+        CallbackView.as_view()(_signed_request(rf, data, queue_mode["second_key"]))
+
+    stats = NotificationWorker().run()
+
+    assert stats["applied"] == 1
+    assert stats["skipped"] == 1
+    assert stats["failed"] == 0
+    assert Payment.objects.get(pk=payment.pk).status == ps.FAILED
+    assert set(PayUNotification.objects.values_list("status", flat=True)) == {
+        NotificationStatus.DONE
+    }
+
+
+def test_worker_claims_abandoned_notifications(payment_factory, queue_mode, rf):
+    payment = make_pending_payment(payment_factory)
+    data = order_notification(payment, OrderStatus.CANCELED)
+    CallbackView.as_view()(_signed_request(rf, data, queue_mode["second_key"]))
+    worker = NotificationWorker(claim_timeout=60)
+    assert len(worker.claim()) == 1
+
+    assert worker.run()["processed"] == 0  # claimed by a worker still running
+    PayUNotification.objects.update(
+        claimed_on=timezone.now() - datetime.timedelta(seconds=61)
+    )
+    assert worker.run()["applied"] == 1
+
+
+def test_process_notifications_command(queue_mode, capsys):
+    call_command("payu_process_notifications")
+    assert "processed: 0, applied: 0" in capsys.readouterr().out
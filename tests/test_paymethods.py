@@ -0,0 +1,118 @@
+from decimal import Decimal
+
+import pytest
+from django.template import Context, Template
+
+from getpaid_payu.processor import PaymentProcessor
+
+pytestmark = pytest.mark.django_db
+
+PAYMETHODS = {
+    "cardTokens": [],
+    "pexTokens": [],
+    "payByLinks": [
+        {
+            "value": "c",
+            "name": "Płatność online kartą płatniczą",
+            "brandImageUrl": "http://static.payu.com/images/mobile/logos/pbl_c.png",
+            "status": "ENABLED",
+            "minAmount": 50,
+            "maxAmount": 100000,
+        },
+        {
+            "value": "blik",
+            "name": "BLIK",
+            "brandImageUrl": "http://static.payu.com/images/mobile/logos/pbl_blik.png",
+            "status": "ENABLED",
+            "minAmount": 100,
+            "maxAmount": 5000,
+        },
+        {
+            "value": "m",
+            "name": "mTransfer",
+            "brandImageUrl": "http://static.payu.com/images/mobile/logos/pbl_m.png",
+            "status": "TEMPORARY_DISABLED",
+        },
+    ],
+    "status": {"statusCode": "SUCCESS"},
+}
+
+
+@pytest.fixture
+def paymethods(getpaid_client, requests_mock):
+    return requests_mock.get(
+        "https://secure.snd.payu.com/api/v2_1/paymethods", json=PAYMETHODS
+    )
+
+
+def test_get_paymethods(getpaid_client, requests_mock):
+    requests_mock.get("/api/v2_1/paymethods?lang=en", json=PAYMETHODS)
+
+    response = getpaid_client.get_paymethods(lang="en")
+
+    assert requests_mock.last_request.qs == {"lang": ["en"]}
+    card = response["payByLinks"][0]
+    assert card["minAmount"] == Decimal("0.5")
+    assert card["maxAmount"] == Decimal("1000")
+
+
+def test_paymethods_are_cached(paymethods, settings):
+    settings.DEBUG = True
+    first = PaymentProcessor.get_paymethods()
+    second = PaymentProcessor.get_paymethods()
+
+    assert first is second
+    assert paymethods.call_count == 1
+    PaymentProcessor.get_paymethods(lang="en")
+    assert paymethods.call_count == 2
+
+
+def test_enabled_paymethods(paymethods, settings):
+    settings.DEBUG = True
+    enabled = PaymentProcessor.get_enabled_paymethods
+    assert [m["value"] for m in enabled()] == ["c", "blik"]
+    assert [m["value"] for m in enabled(amount=Decimal("0.75"))] == ["c"]
+    assert [m["value"] for m in enabled(amount=Decimal("100"))] == ["c"]
+    assert [m["value"] for m in enabled(amount=Decimal("20"))] == ["c", "blik"]
+
+
+def test_paymethods_template_tag(paymethods, settings):
+    settings.DEBUG = True
+    template = Template(
+        "{% load payu_tags %}{% payu_paymethods amount=total as methods %}"
+        "{% for method in methods %}{{ method.value }};{% endfor %}"
+    )
+    assert template.render(Context({"total": Decimal("20")})) == "c;blik;"
+
+
+def test_paymethods_template_tag_without_payu(getpaid_client, requests_mock, settings):
+    settings.DEBUG = True
+    requests_mock.get(
+        "https://secure.snd.payu.com/api/v2_1/paymethods", status_code=404
+    )
+    template = Template(
+        "{% load payu_tags %}{% payu_paymethods as methods %}{{ methods|length }}"
+    )
+    assert template.render(Context()) == "0"
+
+
+def test_paymethods_are_cached_per_pos(paymethods, settings):
+    settings.DEBUG = True
+    conf = dict(settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"])
+    conf["pos"] = {
+        "brand": {
+            "pos_id": 400200,
+            "second_key": "brand-second-key",
+            "oauth_id": 400200,
+            "oauth_secret": "brand-secret",
+        }
+    }
+    settings.GETPAID_BACKEND_SETTINGS = {"getpaid_payu": conf}
+
+    default = PaymentProcessor.get_paymethods()
+    brand = PaymentProcessor.get_paymethods(pos="brand")
+
+    assert default is not brand
+    assert paymethods.call_count == 2
+    assert PaymentProcessor.get_paymethods(pos="brand") is brand
+    assert paymethods.call_count == 2
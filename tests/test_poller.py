@@ -0,0 +1,82 @@
+import uuid
+from collections import Counter
+
+import pytest
+import swapper
+from django.core.management import call_command
+from getpaid.types import PaymentStatus as ps
+
+from getpaid_payu.concurrency import bounded_map
+from getpaid_payu.poller import StatusPoller
+from getpaid_payu.types import OrderStatus
+
+pytestmark = pytest.mark.django_db
+
+Payment = swapper.load_model("getpaid", "Payment")
+
+
+def mock_order_status(requests_mock, payment, status):
+    requests_mock.get(
+        f"/api/v2_1/orders/{payment.external_id}",
+        json={
+            "orders": [{"extOrderId": f"{payment.id}", "status": status}],
+            "status": {"statusCode": "SUCCESS"},
+        },
+    )
+
+
+def make_pending_payments(payment_factory, count):
+    payments = []
+    for _ in range(count):
+        payment = payment_factory(external_id=uuid.uuid4())
+        payment.confirm_prepared()
+        payment.save()
+        payments.append(payment)
+    return payments
+
+
+def test_bounded_map_yields_all_results():
+    results = list(bounded_map(lambda x: 1 / x, [1, 2, 0, 4], max_workers=2))
+    assert sorted(item for item, result, exc in results if exc is None) == [1, 2, 4]
+    assert [item for item, result, exc in results if exc is not None] == [0]
+
+
+def test_poller_applies_statuses(payment_factory, requests_mock, getpaid_client):
+    completed, canceled, waiting = make_pending_payments(payment_factory, 3)
+    mock_order_status(requests_mock, completed, OrderStatus.COMPLETED)
+    mock_order_status(requests_mock, canceled, OrderStatus.CANCELED)
+    mock_order_status(requests_mock, waiting, OrderStatus.PENDING)
+
+    stats = StatusPoller(page_size=2, max_workers=2).run()
+
+    assert stats["polled"] == 3
+    assert stats["updated"] == 2
+    assert Payment.objects.get(pk=completed.pk).status == ps.PARTIAL
+    assert Payment.objects.get(pk=canceled.pk).status == ps.FAILED
+    assert Payment.objects.get(pk=waiting.pk).status == ps.PREPARED
+
+
+def test_poller_backs_off(payment_factory, requests_mock, getpaid_client):
+    (payment,) = make_pending_payments(payment_factory, 1)
+    mock_order_status(requests_mock, payment, OrderStatus.PENDING)
+    poller = StatusPoller()
+
+    assert poller.run()["polled"] == 1
+    assert poller.run() == Counter(skipped=1)
+
+
+def test_poller_counts_failures(payment_factory, requests_mock, getpaid_client):
+    (payment,) = make_pending_payments(payment_factory, 1)
+    requests_mock.get(f"/api/v2_1/orders/{payment.external_id}", status_code=500)
+
+    stats = StatusPoller().run()
+
+    assert stats["failed"] == 1
+    assert Payment.objects.get(pk=payment.pk).status == ps.PREPARED
+
+
+def test_poll_command(payment_factory, requests_mock, getpaid_client, capsys):
+    (payment,) = make_pending_payments(payment_factory, 1)
+    mock_order_status(requests_mock, payment, OrderStatus.COMPLETED)
+    call_command("payu_poll_statuses")
+    assert "polled: 1, updated: 1" in capsys.readouterr().out
@@ -0,0 +1,126 @@
+import uuid
+
+import pytest
+import swapper
+from django.core.exceptions import ImproperlyConfigured
+from getpaid.types import ConfirmationMethod as cm
+from getpaid.types import PaymentStatus as ps
+
+from getpaid_payu.models import PayUNotification
+from getpaid_payu.processor import PaymentProcessor
+from getpaid_payu.types import OrderStatus
+from getpaid_payu.views import CallbackView
+
+from .test_getpaid_payu import _prep_conf, _signed_request
+
+pytestmark = pytest.mark.django_db
+
+Payment = swapper.load_model("getpaid", "Payment")
+
+PLN_POS = {
+    "pos_id": 400100,
+    "second_key": "pln-second-key",
+    "oauth_id": 400100,
+    "oauth_secret": "pln-secret",
+    "currencies": ["pln"],
+}
+BRAND_POS = {
+    "pos_id": 400200,
+    "second_key": "brand-second-key",
+    "oauth_id": 400200,
+    "oauth_secret": "brand-secret",
+}
+
+
+def pick_pos(payment):
+    return "brand" if payment.description == "brand" else None
+
+
+@pytest.fixture
+def multi_pos(settings):
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf(confirm_method=cm.PUSH)
+    conf = settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"]
+    conf["pos"] = {"pln": PLN_POS, "brand": BRAND_POS}
+    return conf
+
+
+def pos_of(payment):
+    return PaymentProcessor(payment).get_pos().name
+
+
+def test_pos_is_resolved_by_currency(multi_pos, payment_factory):
+    assert pos_of(payment_factory(currency="EUR")) == "default"
+    assert pos_of(payment_factory(currency="PLN")) == "pln"
+
+
+def test_pos_is_resolved_by_order_attribute(multi_pos, payment_factory):
+    multi_pos["pos_order_attribute"] = "name"
+
+    assert pos_of(payment_factory(currency="EUR", order__name="brand")) == "brand"
+    assert pos_of(payment_factory(currency="EUR", order__name="")) == "default"
+    with pytest.raises(ImproperlyConfigured):
+        pos_of(payment_factory(order__name="unknown"))
+
+
+def test_pos_is_resolved_by_resolver(multi_pos, payment_factory):
+    multi_pos["pos_resolver"] = "tests.test_pos.pick_pos"
+
+    assert pos_of(payment_factory(currency="PLN", description="brand")) == "brand"
+    assert pos_of(payment_factory(currency="PLN", description="other")) == "pln"
+
+
+def test_client_per_pos(multi_pos, payment_factory):
+    eur = PaymentProcessor(payment_factory(currency="EUR"))
+    pln = PaymentProcessor(payment_factory(currency="PLN"))
+    other_pln = PaymentProcessor(payment_factory(currency="PLN"))
+
+    assert pln.client is other_pln.client
+    assert pln.client is not eur.client
+    assert pln.client.pos_id == 400100
+    assert pln.client.oauth_secret == "pln-secret"
+    assert eur.client is PaymentProcessor.get_backend_client()
+    assert pln.client is PaymentProcessor.get_backend_client("pln")
+
+
+def test_settings_change_resets_clients(multi_pos, payment_factory, settings):
+    client = PaymentProcessor.get_backend_client()
+
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf()
+
+    assert PaymentProcessor.get_backend_client() is not client
+
+
+def test_callback_is_verified_with_key_of_its_pos(multi_pos, payment_factory, rf):
+    payment = payment_factory(external_id=uuid.uuid4(), currency="PLN")
+    payment.confirm_prepared()
+    payment.save()
+    data = {
+        "order": {
+            "extOrderId": payment.get_unique_id(),
+            "merchantPosId": "400100",
+            "status": OrderStatus.CANCELED,
+        }
+    }
+
+    response = CallbackView.as_view()(_signed_request(rf, data, "brand-second-key"))
+    assert response.status_code == 422
+
+    response = CallbackView.as_view()(_signed_request(rf, data, "pln-second-key"))
+    assert response.status_code == 200
+    assert Payment.objects.get(pk=payment.pk).status == ps.FAILED
+
+
+def test_queued_refund_notification_is_verified_with_key_of_its_pos(
+    multi_pos, payment_factory, rf
+):
+    multi_pos["callback_mode"] = "queue"
+    payment = payment_factory(external_id=uuid.uuid4(), currency="PLN")
+    data = {
+        "orderId": str(payment.external_id),
+        "refund": {"refundId": "912128", "amount": "1000", "status": "FINALIZED"},
+    }
+
+    response = CallbackView.as_view()(_signed_request(rf, data, "pln-second-key"))
+
+    assert response.status_code == 200
+    assert PayUNotification.objects.count() == 1
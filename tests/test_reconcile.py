@@ -0,0 +1,141 @@
+import csv
+import io
+import json
+import uuid
+
+import pytest
+import swapper
+from django.core.management import call_command
+from django.utils import timezone
+from getpaid.types import PaymentStatus as ps
+
+from getpaid_payu.reconcile import Reconciler, ReportWriter
+from getpaid_payu.types import OrderStatus
+
+from .test_poller import mock_order_status
+
+pytestmark = pytest.mark.django_db
+
+Payment = swapper.load_model("getpaid", "Payment")
+
+
+@pytest.fixture
+def payments(payment_factory, requests_mock, getpaid_client):
+    """
+    One payment in agreement with PayU, two mismatched and one missing in PayU.
+    """
+    created = {}
+    for name, local, remote in [
+        ("paid", ps.PAID, OrderStatus.COMPLETED),
+        ("missed", ps.PREPARED, OrderStatus.COMPLETED),
+        ("canceled", ps.PREPARED, OrderStatus.CANCELED),
+        ("missing", ps.PREPARED, None),
+    ]:
+        payment = payment_factory(external_id=str(uuid.uuid4()), status=local)
+        if remote is None:
+            requests_mock.get(
+                f"/api/v2_1/orders/{payment.external_id}", status_code=404
+            )
+        else:
+            mock_order_status(requests_mock, payment, remote)
+        created[name] = payment
+    return created
+
+
+def read_csv(stream):
+    stream.seek(0)
+    return {row["payment_id"]: row for row in csv.DictReader(stream)}
+
+
+def test_report(payments):
+    stream = io.StringIO()
+
+    stats = Reconciler(chunk_size=3).run(ReportWriter(stream))
+
+    assert stats == {"checked": 4, "mismatched": 2, "failed": 1}
+    rows = read_csv(stream)
+    assert set(rows) == {
+        str(payments[name].pk) for name in ("missed", "canceled", "missing")
+    }
+    missed = rows[str(payments["missed"].pk)]
+    assert missed["local_status"] == ps.PREPARED
+    assert missed["remote_status"] == "COMPLETED"
+    assert missed["callback"] == "confirm_payment"
+    assert missed["applied"] == "False"
+    assert rows[str(payments["missing"].pk)]["error"]
+    assert Payment.objects.get(pk=payments["missed"].pk).status == ps.PREPARED
+
+
+def test_apply(payments):
+    stats = Reconciler(apply=True).run(ReportWriter(io.StringIO(), "jsonl"))
+
+    assert stats["fixed"] == 2
+    assert Payment.objects.get(pk=payments["missed"].pk).status == ps.PARTIAL
+    assert Payment.objects.get(pk=payments["canceled"].pk).status == ps.FAILED
+    assert Payment.objects.get(pk=payments["paid"].pk).status == ps.PAID
+
+
+def test_fix_skips_payments_changed_meanwhile(payments):
+    payment = payments["missed"]
+    Payment.objects.filter(pk=payment.pk).update(status=ps.FAILED)
+    report = {"callback": "confirm_payment"}
+
+    assert not Reconciler().fix(payment, report)
+    assert Payment.objects.get(pk=payment.pk).status == ps.FAILED
+
+
+def test_resume_from_checkpoint(payments, tmp_path):
+    checkpoint = str(tmp_path / "checkpoint.json")
+
+    class Interrupted(Exception):
+        pass
+
+    class InterruptingWriter(ReportWriter):
+        written = 0
+
+        def write(self, row):
+            super().write(row)
+            self.written += 1
+            if self.written == 2:
+                raise Interrupted
+
+    first = io.StringIO()
+    with pytest.raises(Interrupted):
+        Reconciler(chunk_size=1, checkpoint=checkpoint).run(InterruptingWriter(first))
+    with open(checkpoint) as f:
+        last_pk = json.load(f)["last_pk"]
+
+    second = io.StringIO()
+    stats = Reconciler(chunk_size=1, checkpoint=checkpoint).run(ReportWriter(second))
+
+    # rows of the interrupted chunk are reported again
+    reported = set(read_csv(first)) | set(read_csv(second))
+    assert len(reported) == 3
+    assert all(pk > last_pk for pk in read_csv(second))
+    assert stats["checked"] >= 4
+    assert not (tmp_path / "checkpoint.json").exists()
+
+
+def test_checkpoint_of_other_run_is_ignored(payments, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({"key": "other", "last_pk": "f" * 32}))
+
+    stats = Reconciler(checkpoint=str(checkpoint)).run(ReportWriter(io.StringIO()))
+
+    assert stats["checked"] == 4
+
+
+def test_reconcile_command(payments, tmp_path, capsys):
+    output = tmp_path / "report.jsonl"
+    today = timezone.localdate().isoformat()
+
+    call_command("payu_reconcile", "--since", today, "--output", str(output))
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(rows) == 3
+    assert "checked: 4, mismatched: 2, fixed: 0, failed: 1" in capsys.readouterr().err
+
+
+def test_reconcile_command_checks_yesterday_by_default(payments, capsys):
+    call_command("payu_reconcile")
+    assert "checked: 0" in capsys.readouterr().err
@@ -0,0 +1,130 @@
+import json
+import uuid
+from decimal import Decimal
+
+import pytest
+import swapper
+from django.core.management import CommandError, call_command
+from django_fsm.signals import post_transition
+from getpaid.types import PaymentStatus as ps
+
+from getpaid_payu.refunds import BulkRefunder
+
+pytestmark = pytest.mark.django_db
+
+Payment = swapper.load_model("getpaid", "Payment")
+
+
+def refunds_url(payment):
+    return f"/api/v2_1/orders/{payment.external_id}/refunds"
+
+
+def mock_refund(requests_mock, payment, **kwargs):
+    kwargs.setdefault(
+        "json",
+        {
+            "orderId": payment.external_id,
+            "refund": {
+                "refundId": "912128",
+                "extRefundId": f"refund-{payment.pk}",
+                "amount": 1000,
+                "status": "PENDING",
+            },
+            "status": {"statusCode": "SUCCESS"},
+        },
+    )
+    return requests_mock.post(refunds_url(payment), **kwargs)
+
+
+@pytest.fixture
+def paid(payment_factory, getpaid_client):
+    return [
+        payment_factory(
+            external_id=str(uuid.uuid4()), status=ps.PAID, amount_paid=Decimal("10")
+        )
+        for _ in range(3)
+    ]
+
+
+def test_bulk_refund(paid, payment_factory, requests_mock, tmp_path):
+    ok, failing, repeated = paid
+    unpaid = payment_factory(external_id=str(uuid.uuid4()), status=ps.PREPARED)
+    refund = mock_refund(requests_mock, ok)
+    mock_refund(requests_mock, failing, status_code=400, json={})
+    mock_refund(requests_mock, repeated, status_code=400, json={})
+    requests_mock.get(refunds_url(failing), json={"refunds": []})
+    requests_mock.get(
+        refunds_url(repeated),
+        json={"refunds": [{"refundId": "1", "extRefundId": f"refund-{repeated.pk}"}]},
+    )
+    progress = tmp_path / "progress.jsonl"
+
+    stats = BulkRefunder(chunk_size=2, progress=str(progress)).run()
+
+    assert stats == {"refunded": 2, "failed": 1}
+    assert refund.last_request.json()["refund"]["extRefundId"] == f"refund-{ok.pk}"
+    assert Payment.objects.get(pk=ok.pk).status == ps.REFUND_STARTED
+    assert Payment.objects.get(pk=repeated.pk).status == ps.REFUND_STARTED
+    assert Payment.objects.get(pk=failing.pk).status == ps.PAID
+    assert Payment.objects.get(pk=unpaid.pk).status == ps.PREPARED
+    rows = [json.loads(line) for line in progress.read_text().splitlines()]
+    assert {row["payment_id"]: row["status"] for row in rows} == {
+        str(ok.pk): "refunded",
+        str(failing.pk): "failed",
+        str(repeated.pk): "refunded",
+    }
+
+
+def test_resume_skips_refunded_payments(paid, requests_mock, tmp_path):
+    progress = tmp_path / "progress.jsonl"
+    progress.write_text(
+        json.dumps({"payment_id": str(paid[0].pk), "status": "refunded"})
+        + "\n"
+        + '{"payment_id": "cut'
+    )
+    refunds = [mock_refund(requests_mock, payment) for payment in paid]
+
+    stats = BulkRefunder(progress=str(progress)).run([payment.pk for payment in paid])
+
+    assert stats == {"refunded": 2, "skipped": 1}
+    assert [refund.call_count for refund in refunds] == [0, 1, 1]
+
+
+def test_refund_command(paid, requests_mock, tmp_path, capsys):
+    for payment in paid:
+        mock_refund(requests_mock, payment)
+    ids = tmp_path / "ids.txt"
+    ids.write_text(f"{paid[0].pk}\n\n{uuid.uuid4()}\nnot-an-id\n{paid[1].pk.hex}\n")
+
+    call_command("payu_refund", "--file", str(ids), "--dry-run")
+    assert "refundable: 2, skipped: 2" in capsys.readouterr().out
+    assert Payment.objects.get(pk=paid[0].pk).status == ps.PAID
+
+    call_command("payu_refund", "--file", str(ids), "--rate", "100")
+    assert "refunded: 2, failed: 0, skipped: 2" in capsys.readouterr().out
+    assert Payment.objects.get(pk=paid[1].pk).status == ps.REFUND_STARTED
+    assert Payment.objects.get(pk=paid[2].pk).status == ps.PAID
+
+
+def test_refund_command_requires_payments(capsys):
+    with pytest.raises(CommandError, match="--file or --since"):
+        call_command("payu_refund")
+
+
+def test_bulk_refund_runs_transition(paid, requests_mock):
+    payment = paid[0]
+    refund = mock_refund(requests_mock, payment)
+    transitions = []
+
+    def receiver(sender, instance, name, source, target, **kwargs):
+        transitions.append((instance.pk, name, target))
+
+    post_transition.connect(receiver)
+    try:
+        stats = BulkRefunder().run([payment.pk])
+    finally:
+        post_transition.disconnect(receiver)
+
+    assert stats == {"refunded": 1}
+    assert transitions == [(payment.pk, "start_refund", ps.REFUND_STARTED)]
+    assert refund.call_count == 1  # PayU is not called by the transition
@@ -0,0 +1,347 @@
+from decimal import Decimal
+
+import pytest
+import requests
+from getpaid.exceptions import (
+    ChargeFailure,
+    CommunicationError,
+    CredentialsError,
+    LockFailure,
+)
+from getpaid.types import PaymentStatus as ps
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from getpaid_payu.processor import PaymentProcessor
+from getpaid_payu.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    OutcomeUnknown,
+    RetryPolicy,
+    get_circuit_breaker,
+)
+
+pytestmark = pytest.mark.django_db
+
+ORDER_ID = "WZHF5FFDRJ140731GUEST000P01"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def client(getpaid_client):
+    getpaid_client.retry_policy = RetryPolicy(retries=2, backoff=0)
+    return getpaid_client
+
+
+def new_order(client):
+    return client.new_order(amount=Decimal("10"), currency="PLN", order_id="ext-1")
+
+
+def test_retry_delay_is_jittered_and_capped():
+    policy = RetryPolicy(backoff=0.5, max_backoff=3, random=lambda: 1)
+    assert [policy.delay(attempt) for attempt in range(4)] == [0.5, 1, 2, 3]
+    assert RetryPolicy(random=lambda: 0).delay(3) == 0
+
+
+def test_retry_after_header_is_honoured():
+    policy = RetryPolicy(max_backoff=3, random=lambda: 1)
+    assert policy.delay(0, "2") == 2
+    assert policy.delay(0, "60") == 3
+    assert policy.delay(0, "Wed, 21 Oct 2015 07:28:00 GMT") == 0.2
+
+
+def test_idempotent_call_is_retried(client, requests_mock):
+    order_info = requests_mock.get(
+        f"/api/v2_1/orders/{ORDER_ID}",
+        [
+            {"status_code": 503},
+            {"exc": requests.ConnectionError},
+            {"json": {"orders": [{"status": "COMPLETED"}]}},
+        ],
+    )
+
+    response = client.get_order_info(ORDER_ID)
+
+    assert response["orders"][0]["status"] == "COMPLETED"
+    assert order_info.call_count == 3
+
+
+def test_retries_are_limited(client, requests_mock):
+    order_info = requests_mock.get(f"/api/v2_1/orders/{ORDER_ID}", status_code=500)
+
+    with pytest.raises(CommunicationError):
+        client.get_order_info(ORDER_ID)
+    assert order_info.call_count == 3
+
+
+def test_client_errors_are_not_retried(client, requests_mock):
+    order_info = requests_mock.get(f"/api/v2_1/orders/{ORDER_ID}", status_code=404)
+
+    with pytest.raises(CommunicationError):
+        client.get_order_info(ORDER_ID)
+    assert order_info.call_count == 1
+
+
+def test_new_order_is_retried_when_not_created(client, requests_mock):
+    orders = requests_mock.post(
+        "/api/v2_1/orders",
+        [{"status_code": 502}, {"json": {"orderId": ORDER_ID}, "status_code": 302}],
+    )
+    lookup = requests_mock.get(
+        "/api/v2_1/orders/ext/ext-1",
+        status_code=404,
+        json={"status": {"statusCode": "DATA_NOT_FOUND"}},
+    )
+
+    assert new_order(client)["orderId"] == ORDER_ID
+    assert orders.call_count == 2
+    assert lookup.call_count == 1
+
+
+def test_new_order_is_not_repeated_when_created(client, requests_mock):
+    orders = requests_mock.post("/api/v2_1/orders", exc=requests.ReadTimeout)
+    requests_mock.get(
+        "/api/v2_1/orders/ext/ext-1",
+        json={"orders": [{"orderId": ORDER_ID, "extOrderId": "ext-1"}]},
+    )
+
+    response = new_order(client)
+
+    assert response["orderId"] == ORDER_ID
+    assert response["status"]["statusCode"] == "SUCCESS"
+    assert orders.call_count == 1
+
+
+def test_new_order_is_not_repeated_when_lookup_fails(client, requests_mock):
+    orders = requests_mock.post("/api/v2_1/orders", status_code=500)
+    lookup = requests_mock.get("/api/v2_1/orders/ext/ext-1", status_code=503)
+
+    with pytest.raises(OutcomeUnknown) as excinfo:
+        new_order(client)
+    assert not isinstance(excinfo.value, LockFailure)
+    assert orders.call_count == 1
+    assert lookup.call_count == 3
+
+
+def test_new_order_not_connected_is_not_looked_up(client, requests_mock):
+    orders = requests_mock.post("/api/v2_1/orders", exc=requests.ConnectTimeout)
+    lookup = requests_mock.get("/api/v2_1/orders/ext/ext-1", status_code=404)
+
+    with pytest.raises(LockFailure):
+        new_order(client)
+    assert orders.call_count == 3
+    assert lookup.call_count == 0
+
+
+def test_new_order_refused_connection_is_not_looked_up(client, requests_mock):
+    refused = requests.ConnectionError(
+        MaxRetryError(
+            None, "/api/v2_1/orders", NewConnectionError(None, "Connection refused")
+        )
+    )
+    orders = requests_mock.post("/api/v2_1/orders", exc=refused)
+    lookup = requests_mock.get("/api/v2_1/orders/ext/ext-1", status_code=404)
+
+    with pytest.raises(LockFailure) as excinfo:
+        new_order(client)
+    assert not isinstance(excinfo.value, OutcomeUnknown)
+    assert orders.call_count == 3
+    assert lookup.call_count == 0
+
+
+def test_new_order_reset_connection_is_looked_up(client, requests_mock):
+    orders = requests_mock.post("/api/v2_1/orders", exc=requests.ConnectionError)
+    lookup = requests_mock.get(
+        "/api/v2_1/orders/ext/ext-1",
+        status_code=404,
+        json={"status": {"statusCode": "DATA_NOT_FOUND"}},
+    )
+
+    with pytest.raises(LockFailure):
+        new_order(client)
+    assert orders.call_count == 3
+    assert lookup.call_count == 3
+
+
+def test_unknown_outcome_does_not_fail_payment(payment_factory, monkeypatch):
+    payment = payment_factory(backend="getpaid_payu")
+
+    def prepare_lock(self, request=None, **kwargs):
+        raise OutcomeUnknown("Error creating order: outcome unknown")
+
+    monkeypatch.setattr(PaymentProcessor, "prepare_lock", prepare_lock)
+    monkeypatch.setattr(
+        PaymentProcessor,
+        "get_return_redirect_url",
+        lambda self, payment, request, success: f"/return/?success={success}",
+        raising=False,
+    )
+
+    response = PaymentProcessor(payment).prepare_transaction()
+
+    assert response.url == "/return/?success=False"
+    assert type(payment).objects.get(pk=payment.pk).status == ps.NEW
+
+
+def test_other_calls_are_not_retried(client, requests_mock):
+    capture = requests_mock.put(f"/api/v2_1/orders/{ORDER_ID}/status", status_code=503)
+
+    with pytest.raises(ChargeFailure):
+        client.capture(ORDER_ID)
+    assert capture.call_count == 1
+
+
+def test_expired_token_is_refreshed(getpaid_client, requests_mock):
+    authorize = requests_mock.post(
+        "/pl/standard/user/oauth/authorize",
+        [
+            {"json": {"access_token": "old", "token_type": "bearer", "expires_in": 99}},
+            {"json": {"access_token": "new", "token_type": "bearer", "expires_in": 99}},
+        ],
+    )
+    order_info = requests_mock.get(
+        f"/api/v2_1/orders/{ORDER_ID}",
+        [{"status_code": 401}, {"json": {"orders": []}}],
+    )
+
+    getpaid_client.get_order_info(ORDER_ID)
+
+    assert authorize.call_count == 2
+    assert [r.headers["Authorization"] for r in order_info.request_history] == [
+        "Bearer old",
+        "Bearer new",
+    ]
+    assert getpaid_client.token == "Bearer new"
+
+
+def test_token_is_refreshed_only_once(getpaid_client, requests_mock):
+    order_info = requests_mock.get(f"/api/v2_1/orders/{ORDER_ID}", status_code=401)
+
+    with pytest.raises(CommunicationError):
+        getpaid_client.get_order_info(ORDER_ID)
+    assert order_info.call_count == 2
+
+
+def test_retries_are_reported(client, requests_mock):
+    class Recorder:
+        def before_request(self, call):
+            pass
+
+        def after_request(self, call):
+            self.call = call
+
+    client.instruments = [Recorder()]
+    requests_mock.get(
+        f"/api/v2_1/orders/{ORDER_ID}", [{"status_code": 503}, {"json": {}}]
+    )
+
+    client.get_order_info(ORDER_ID)
+
+    assert client.instruments[0].call.retries == 1
+    assert client.instruments[0].call.status_code == 200
+
+
+def test_circuit_breaker_states():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+
+    breaker.record(False)
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == breaker.CLOSED
+    breaker.record(False)
+    assert breaker.state == breaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # only one trial at a time
+    breaker.record(False)
+    assert breaker.state == breaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == breaker.CLOSED
+    assert breaker.allow()
+
+
+def test_abandoned_trial_does_not_block_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record(False)
+    clock.now = 10
+    assert breaker.allow()
+    clock.now = 20
+    assert breaker.allow()
+
+
+def test_open_circuit_fails_fast(getpaid_client, requests_mock):
+    getpaid_client.circuit_breaker = CircuitBreaker(failure_threshold=2)
+    orders = requests_mock.post("/api/v2_1/orders", exc=requests.ConnectTimeout)
+
+    for _ in range(3):
+        with pytest.raises(LockFailure) as excinfo:
+            new_order(getpaid_client)
+
+    assert orders.call_count == 2
+    assert isinstance(excinfo.value.context["exception"], CircuitOpenError)
+
+
+def test_circuit_trial_reports_escaping_errors(getpaid_client, requests_mock):
+    clock = FakeClock()
+    breaker = getpaid_client.circuit_breaker = CircuitBreaker(
+        failure_threshold=1, reset_timeout=10, clock=clock
+    )
+    breaker.record(False)
+    clock.now = 10
+    getpaid_client.token_store.clear()
+    requests_mock.post("/pl/standard/user/oauth/authorize", status_code=401)
+
+    with pytest.raises(CredentialsError):
+        getpaid_client.get_order_info(ORDER_ID)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 20
+    assert breaker.allow()
+
+
+def test_circuit_breaker_ignores_client_errors(getpaid_client, requests_mock):
+    getpaid_client.circuit_breaker = CircuitBreaker(failure_threshold=1)
+    requests_mock.get(f"/api/v2_1/orders/{ORDER_ID}", status_code=404)
+
+    for _ in range(2):
+        with pytest.raises(CommunicationError):
+            getpaid_client.get_order_info(ORDER_ID)
+    assert getpaid_client.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breakers_are_shared():
+    assert get_circuit_breaker("https://a/") is get_circuit_breaker("https://a/")
+    assert get_circuit_breaker("https://a/") is not get_circuit_breaker("https://b/")
+
+
+def test_processor_settings(payment_factory, settings):
+    payment = payment_factory(backend="getpaid_payu")
+    processor = PaymentProcessor(payment)
+    client = processor.client
+    assert client.retry_policy.retries == 2
+    assert client.circuit_breaker is processor.get_circuit_breaker()
+
+    settings.GETPAID_BACKEND_SETTINGS = {
+        "getpaid_payu": dict(
+            settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"],
+            retries=0,
+            circuit_breaker=False,
+        )
+    }
+    params = PaymentProcessor(payment).get_client_params()
+    assert params["retry_policy"] is None
+    assert params["circuit_breaker"] is None
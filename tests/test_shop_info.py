@@ -0,0 +1,78 @@
+import uuid
+from decimal import Decimal
+
+import pytest
+from getpaid.types import PaymentStatus as ps
+
+from getpaid_payu.processor import PaymentProcessor
+
+from .test_getpaid_payu import _prep_conf, _signed_request
+
+pytestmark = pytest.mark.django_db
+
+SHOP_URL = "https://secure.snd.payu.com/api/v2_1/shops/SHOP1"
+
+
+@pytest.fixture
+def shop_info(getpaid_client, requests_mock, settings):
+    settings.DEBUG = True
+    conf = _prep_conf()
+    conf["getpaid_payu"]["shop_id"] = "SHOP1"
+    settings.GETPAID_BACKEND_SETTINGS = conf
+    return requests_mock.get(
+        SHOP_URL,
+        [
+            {"json": {"shopId": "SHOP1", "balance": {"available": 10000}}},
+            {"json": {"shopId": "SHOP1", "balance": {"available": 5000}}},
+        ],
+    )
+
+
+def test_shop_info_is_cached(shop_info):
+    first = PaymentProcessor.get_shop_info()
+    assert first["balance"]["available"] == Decimal("100")
+    assert PaymentProcessor.get_shop_info("SHOP1") == first
+    assert shop_info.call_count == 1
+
+
+def test_shop_info_is_invalidated(shop_info):
+    PaymentProcessor.get_shop_info()
+    PaymentProcessor.invalidate_shop_info()
+    assert PaymentProcessor.get_shop_info()["balance"]["available"] == Decimal("50")
+
+
+def test_refund_invalidates_shop_info(shop_info, payment_factory, requests_mock):
+    payment = payment_factory(external_id=uuid.uuid4(), status=ps.PAID)
+    payment.amount_paid = payment.amount_required
+    refund = requests_mock.post(
+        f"https://secure.snd.payu.com/api/v2_1/orders/{payment.external_id}/refunds",
+        json={"refund": {"refundId": "912128", "amount": 1000, "status": "PENDING"}},
+    )
+    PaymentProcessor.get_shop_info()
+
+    assert payment.start_refund(Decimal("10")) == Decimal("10")
+
+    assert refund.last_request.json()["refund"]["amount"] == "1000"
+    assert PaymentProcessor.get_shop_info()["balance"]["available"] == Decimal("50")
+
+
+def test_refund_notification_invalidates_shop_info(
+    shop_info, payment_factory, rf, getpaid_client
+):
+    payment = payment_factory(external_id=uuid.uuid4(), status=ps.REFUND_STARTED)
+    payment.amount_paid = payment.amount_required
+    PaymentProcessor.get_shop_info()
+    data = {
+        "orderId": "LDLW5N7MF4140324GUEST000P01",
+        "refund": {
+            "refundId": "912128",
+            "amount": f"{int(payment.amount_paid * 100)}",
+            "status": "FINALIZED",
+        },
+    }
+
+    payment.handle_paywall_callback(
+        _signed_request(rf, data, getpaid_client.second_key)
+    )
+
+    assert PaymentProcessor.get_shop_info()["balance"]["available"] == Decimal("50")
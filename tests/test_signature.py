@@ -0,0 +1,71 @@
+import hashlib
+import json
+
+import pytest
+
+from getpaid_payu.signature import (
+    SignatureVerifier,
+    get_hasher,
+    get_verifier,
+    parse_signature_header,
+)
+
+SECOND_KEY = "b6ca15b0d1020e8094d9b5f8d163db54"
+BODY = json.dumps({"order": {"orderId": "A1", "status": "COMPLETED"}}).encode()
+
+
+def _header(body, algorithm="MD5", key=SECOND_KEY):
+    hasher = hashlib.new(algorithm.replace("-", "").lower())
+    hasher.update(body + key.encode())
+    return f"sender=checkout;signature={hasher.hexdigest()};algorithm={algorithm}"
+
+
+@pytest.mark.parametrize("algorithm", ["MD5", "SHA1", "SHA-256", "SHA-384", "SHA-512"])
+def test_verify(algorithm):
+    verifier = SignatureVerifier(SECOND_KEY)
+    assert verifier.verify(BODY, _header(BODY, algorithm))
+    assert not verifier.verify(BODY + b" ", _header(BODY, algorithm))
+    assert not verifier.verify(BODY, _header(BODY, algorithm, key="other"))
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "",
+        "sender=checkout;algorithm=MD5",
+        "signature=abc;algorithm=UNKNOWN-1",
+        "signature=abc;algorithm=shake_128",
+        "signature=ąćę;algorithm=MD5",
+    ],
+)
+def test_verify_malformed_header(header):
+    assert not SignatureVerifier(SECOND_KEY).verify(BODY, header)
+
+
+def test_parse_signature_header():
+    assert parse_signature_header("signature=a=b; algorithm=MD5") == {
+        "signature": "a=b",
+        "algorithm": "MD5",
+    }
+
+
+def test_sign_form():
+    data = {"totalAmount": "1000", "description": "Zażółć gęślą", "currencyCode": "PLN"}
+    encoded = (
+        "currencyCode=PLN&description=Za%C5%BC%C3%B3%C5%82%C4%87+g%C4%99%C5%9Bl%C4%85"
+        "&totalAmount=1000"
+    )
+    expected = hashlib.sha256(f"{encoded}&{SECOND_KEY}".encode()).hexdigest()
+
+    header = SignatureVerifier(SECOND_KEY, pos_id=300746).sign_form(data)
+
+    assert header == f"signature={expected};algorithm=SHA-256;sender=300746"
+
+
+def test_hashers_and_verifiers_are_cached():
+    assert get_hasher("SHA-256") is get_hasher("SHA-256")
+    assert get_hasher("SHA") is get_hasher("SHA1") is hashlib.sha1
+    assert get_verifier(SECOND_KEY, 1) is get_verifier(SECOND_KEY, 1)
+    for algorithm in ("UNKNOWN-1", "shake_128", "sha3_256"):
+        with pytest.raises(ValueError):
+            get_hasher(algorithm)
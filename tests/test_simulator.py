@@ -0,0 +1,174 @@
+import json
+import threading
+from decimal import Decimal
+from wsgiref.simple_server import make_server
+
+import pytest
+import requests
+from getpaid.exceptions import CredentialsError, RefundFailure
+
+from getpaid_payu.client import Client
+from getpaid_payu.processor import PaymentProcessor
+from getpaid_payu.resilience import OutcomeUnknown
+from getpaid_payu.signature import SignatureVerifier
+from getpaid_payu.testing.simulator import PayUSimulator, QuietHandler, serve_in_thread
+from getpaid_payu.tokens import LocalTokenStore
+from getpaid_payu.types import OrderStatus
+
+SECOND_KEY = "b6ca15b0d1020e8094d9b5f8d163db54"
+
+
+@pytest.fixture
+def receiver():
+    """
+    Local HTTP endpoint collecting notifications.
+    """
+    received = []
+
+    def app(environ, start_response):
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        received.append(
+            (environ["HTTP_OPENPAYU_SIGNATURE"], environ["wsgi.input"].read(length))
+        )
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"OK"]
+
+    server = make_server("127.0.0.1", 0, app, handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.received = received
+    server.url = f"http://127.0.0.1:{server.server_port}/"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def simulator(receiver):
+    simulator = PayUSimulator(
+        second_key=SECOND_KEY,
+        client_id="300746",
+        client_secret="secret",
+        notify_url=receiver.url,
+    )
+    server = serve_in_thread(simulator)
+    simulator.url = f"http://127.0.0.1:{server.server_port}/"
+    yield simulator
+    server.shutdown()
+    server.server_close()
+    simulator.close()
+
+
+def make_client(url, oauth_secret="secret"):
+    return Client(
+        api_url=url,
+        pos_id=300746,
+        second_key=SECOND_KEY,
+        oauth_id=300746,
+        oauth_secret=oauth_secret,
+        token_store=LocalTokenStore(),
+        session=requests.Session(),
+    )
+
+
+def test_order_flow(simulator, receiver):
+    client = make_client(simulator.url)
+
+    response = client.new_order(
+        amount=Decimal("12.34"), currency="PLN", order_id="ext-1"
+    )
+    order_id = response["orderId"]
+    assert response.status_code == 302
+
+    order = client.get_order_info(order_id)["orders"][0]
+    assert order["extOrderId"] == "ext-1"
+    assert order["totalAmount"] == Decimal("12.34")
+    assert order["status"] == OrderStatus.COMPLETED
+
+    refund = client.refund(order_id, amount=Decimal("2"))["refund"]
+    assert refund["amount"] == Decimal("2")
+
+    assert simulator.notifier.wait(timeout=5)
+    verifier = SignatureVerifier(SECOND_KEY)
+    notifications = []
+    for header, body in receiver.received:
+        assert verifier.verify(body, header)
+        notifications.append(json.loads(body))
+    statuses = [n["order"]["status"] for n in notifications if "order" in n]
+    assert sorted(statuses) == ["COMPLETED", "PENDING"]
+    (refund_notification,) = [n for n in notifications if "refund" in n]
+    assert refund_notification["orderId"] == order_id
+    assert refund_notification["refund"]["status"] == "FINALIZED"
+
+
+def test_order_transactions(simulator):
+    client = make_client(simulator.url)
+    order_ids = [
+        client.new_order(amount=10, currency="PLN", order_id=f"tx-{i}")["orderId"]
+        for i in range(5)
+    ]
+
+    results = list(client.iter_order_transactions(order_ids, workers=3, rate=100))
+
+    assert sorted(order_id for order_id, _, _ in results) == sorted(order_ids)
+    for _, response, exception in results:
+        assert exception is None
+        assert response["transactions"][0]["resultCode"] == "AUT_ERROR_NO"
+
+
+def test_refund_is_not_repeated(simulator):
+    client = make_client(simulator.url)
+    order_id = client.new_order(amount=10, currency="PLN", order_id="ext-3")["orderId"]
+
+    client.refund(order_id, ext_refund_id="refund-1")
+    with pytest.raises(RefundFailure):
+        client.refund(order_id, ext_refund_id="refund-1")
+
+    (refund,) = client.get_refunds(order_id)["refunds"]
+    assert refund["extRefundId"] == "refund-1"
+    assert refund["amount"] == Decimal("10")
+
+
+def test_capture(simulator):
+    simulator.auto_capture = False
+    client = make_client(simulator.url)
+    order_id = client.new_order(amount=10, currency="PLN", order_id="ext-2")["orderId"]
+    status = client.get_order_info(order_id)["orders"][0]["status"]
+    assert status == OrderStatus.WAITING_FOR_CONFIRMATION
+
+    client.capture(order_id)
+
+    status = client.get_order_info(order_id)["orders"][0]["status"]
+    assert status == OrderStatus.COMPLETED
+
+
+def test_bad_credentials(simulator):
+    with pytest.raises(CredentialsError):
+        make_client(simulator.url, oauth_secret="wrong").get_shop_info("shop")
+
+
+def test_injected_errors(simulator):
+    client = make_client(simulator.url)
+    client._get_token()
+    simulator.error_rate = 1
+    with pytest.raises(OutcomeUnknown):
+        client.new_order(amount=10, currency="PLN", order_id="ext-3")
+    # the order is looked up, because PayU might have created it anyway
+    assert simulator.stats["errors"] == 2
+
+
+def test_notification_retries(simulator):
+    simulator.notifier.retry_delay = 0.01
+    simulator.notify("http://127.0.0.1:1/", {"order": {}})
+    assert simulator.notifier.wait(timeout=5)
+    assert simulator.notifier.stats["retried"] == 2
+    assert simulator.notifier.stats["failed"] == 1
+
+
+def test_paywall_baseurl_setting(settings):
+    settings.DEBUG = True
+    settings.GETPAID_BACKEND_SETTINGS = {
+        "getpaid_payu": {"sandbox_url": "http://127.0.0.1:8765/"}
+    }
+    assert PaymentProcessor.get_paywall_baseurl() == "http://127.0.0.1:8765/"
+    settings.DEBUG = False
+    assert PaymentProcessor.get_paywall_baseurl() == PaymentProcessor.production_url
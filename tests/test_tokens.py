@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+
+from getpaid_payu.client import Client
+from getpaid_payu.processor import PaymentProcessor
+from getpaid_payu.tokens import DjangoCacheTokenStore, Token, get_token_store
+
+KEY = ("https://example.com/", 300746)
+
+
+@pytest.fixture
+def cache_store():
+    cache.clear()
+    yield DjangoCacheTokenStore()
+    cache.clear()
+
+
+@pytest.fixture
+def authorize(requests_mock):
+    return requests_mock.post(
+        "/pl/standard/user/oauth/authorize",
+        json={
+            "access_token": "7524f96e-2d22-45da-bc64-778a61cbfc26",
+            "token_type": "bearer",
+            "expires_in": 43199,
+            "grant_type": "client_credentials",
+        },
+    )
+
+
+def make_client(token_store):
+    return Client(
+        api_url=KEY[0],
+        pos_id=300746,
+        second_key="b6ca15b0d1020e8094d9b5f8d163db54",
+        oauth_id=KEY[1],
+        oauth_secret="2ee86a66e5d97e3fadc400c9f19b065d",
+        token_store=token_store,
+    )
+
+
+def test_cache_store_roundtrip(cache_store):
+    token = Token.create(value="Bearer abc", expires_in=3600)
+    cache_store.set(KEY, token)
+    other_process = DjangoCacheTokenStore()
+    shared = other_process.get(KEY)
+    assert shared.value == "Bearer abc"
+    assert shared.expires_at == pytest.approx(token.expires_at, abs=0.01)
+    assert shared.refresh_at == pytest.approx(token.refresh_at, abs=0.01)
+    cache_store.delete(KEY)
+    assert DjangoCacheTokenStore().get(KEY) is None
+
+
+def test_cache_store_shared_between_workers(cache_store, authorize):
+    make_client(cache_store).token
+    # a "different worker" with an empty in-process memory
+    make_client(DjangoCacheTokenStore()).token
+    assert authorize.call_count == 1
+
+
+def test_cache_store_single_flight(cache_store, authorize):
+    clients = [make_client(DjangoCacheTokenStore()) for _ in range(5)]
+    threads = [threading.Thread(target=lambda c=c: c.token) for c in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert authorize.call_count == 1
+
+
+def test_token_store_stats(cache_store, authorize):
+    client = make_client(cache_store)
+    client.token
+    client.token
+    assert cache_store.stats == {"miss": 1, "refresh": 1, "hit": 1}
+
+
+def test_get_token_store_reuses_instances():
+    path = "getpaid_payu.tokens.DjangoCacheTokenStore"
+    assert get_token_store(path) is get_token_store(path)
+    assert get_token_store(path, cache_alias="other") is not get_token_store(path)
+
+
+def test_token_is_refreshed_proactively():
+    token = Token.create(value="Bearer abc", expires_in=100, refresh_fraction=0.5)
+    assert token.refresh_at - token.expires_at == pytest.approx(-50)
+    assert not token.is_expiring()
+    assert Token.create("Bearer abc", expires_in=100, refresh_fraction=0).is_expiring()
+    assert Token.create(value="Bearer abc", expires_in=4).is_expiring()
+
+
+def test_token_ignores_wall_clock(monkeypatch):
+    token = Token.create(value="Bearer abc", expires_in=3600)
+    monkeypatch.setattr(time, "time", lambda: 0)
+    assert not token.is_expiring()
+
+
+def test_token_cached_without_refresh_time(cache_store):
+    cache_store.cache.set(
+        cache_store._cache_key(KEY), ("Bearer abc", time.time() + 3600)
+    )
+    token = cache_store.get(KEY)
+    assert token.value == "Bearer abc"
+    assert token.expires_in() == pytest.approx(3600, abs=1)
+    assert not token.is_expiring()
+
+
+def test_refresh_fraction_setting(settings, authorize):
+    settings.GETPAID_BACKEND_SETTINGS = {
+        "getpaid_payu": dict(
+            settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"],
+            token_refresh_fraction=0.5,
+        )
+    }
+    token = PaymentProcessor.get_backend_client()._get_token()
+    assert token.expires_at - token.refresh_at == pytest.approx(43199 / 2, abs=1)
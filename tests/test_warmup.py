@@ -0,0 +1,85 @@
+import pytest
+from django.apps import apps
+
+from getpaid_payu import warmup
+from getpaid_payu.processor import PaymentProcessor
+
+from .test_getpaid_payu import _prep_conf
+from .test_paymethods import PAYMETHODS
+
+API_URL = "https://secure.snd.payu.com/"
+AUTHORIZE_URL = f"{API_URL}pl/standard/user/oauth/authorize"
+
+
+@pytest.fixture(autouse=True)
+def reset_status():
+    warmup._status.update(state="idle", errors={}, duration=None)
+    yield
+    warmup.wait(5)
+
+
+@pytest.fixture
+def payu(settings, requests_mock):
+    settings.DEBUG = True
+    settings.GETPAID_BACKEND_SETTINGS = _prep_conf()
+    settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"]["pos"] = {
+        "eur": {"pos_id": 400100, "oauth_id": 400100, "oauth_secret": "eur"}
+    }
+    requests_mock.head(API_URL, status_code=200)
+    requests_mock.get(f"{API_URL}api/v2_1/paymethods", json=PAYMETHODS)
+    return requests_mock.post(
+        AUTHORIZE_URL,
+        json={"access_token": "token", "token_type": "bearer", "expires_in": 43199},
+    )
+
+
+def test_warm_up(payu, requests_mock):
+    assert warmup.warm_up(connections=2, paymethods=True) == {}
+
+    assert payu.call_count == 2  # one per POS
+    heads = [r for r in requests_mock.request_history if r.method == "HEAD"]
+    assert len(heads) == 4
+    # clients are authorized already
+    PaymentProcessor.get_backend_client().get_paymethods()
+    PaymentProcessor.get_paymethods()
+    assert payu.call_count == 2
+
+
+@pytest.mark.parametrize("connections", [0, -1])
+def test_warm_up_without_connections(payu, requests_mock, connections):
+    assert warmup.warm_up(connections=connections) == {}
+
+    assert payu.call_count == 2
+    assert not [r for r in requests_mock.request_history if r.method == "HEAD"]
+
+
+def test_start_warm_up_reports_failures(payu, requests_mock):
+    requests_mock.post(
+        AUTHORIZE_URL,
+        additional_matcher=lambda request: "client_secret=eur" in request.text,
+        status_code=401,
+    )
+
+    assert warmup.start_warm_up() is not None
+    assert warmup.wait(5)
+
+    status = warmup.get_status()
+    assert status["state"] == "failed"
+    assert list(status["errors"]) == ["eur"]
+
+
+def test_warm_up_is_started_by_app_config(payu, settings):
+    settings.GETPAID_BACKEND_SETTINGS["getpaid_payu"]["warm_up"] = True
+
+    apps.get_app_config("getpaid_payu").ready()
+
+    assert warmup.wait(5)
+    assert warmup.get_status()["state"] == "ready"
+    assert payu.call_count == 2
+
+
+def test_warm_up_is_opt_in(payu):
+    apps.get_app_config("getpaid_payu").ready()
+
+    assert warmup.get_status()["state"] == "idle"
+    assert warmup.is_ready()